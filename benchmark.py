@@ -0,0 +1,1081 @@
+"""Performance benchmarks for wit_anime.
+
+Run ``python benchmark.py <name> --help`` for the options of each benchmark.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from bs4 import BeautifulSoup
+from rich.console import Console
+from rich.table import Table
+
+import wit_anime
+
+console = Console()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Checked-in pages captured from the site (WitAnime markup)
+FIXTURES = ("search.html", "searchpage.html")
+
+# Registry globals and the URLs the site's x6c.js / px9.js produce for them under node
+# (regenerate with ``python benchmark.py registry --capture``)
+REGISTRY_FIXTURE = "registry.json"
+
+# Runs x6c.js and px9.js against a stub DOM: clicks every server link and download
+# button and prints {"embeds": {server id: iframe src}, "downloads": [opened URL]}
+PLAYER_HARNESS = r"""
+const fs = require("fs");
+const fixture = JSON.parse(fs.readFileSync(process.argv[2], "utf8"));
+const listeners = [], frames = [], opened = [];
+const element = (attrs) => ({
+    attrs, style: {}, handlers: {}, parentElement: {classList: {add() {}, remove() {}}},
+    getAttribute(name) { return name in this.attrs ? String(this.attrs[name]) : null; },
+    setAttribute() {},
+    addEventListener(type, handler) { this.handlers[type] = handler; },
+    appendChild(child) { frames.push(child.src); },
+    set innerHTML(value) {},
+});
+const servers = Object.keys(fixture.servers).map((id) => element({"data-server-id": id}));
+const buttons = fixture.downloads.map((name, i) => element({"data-index": i}));
+const container = element({});
+globalThis.window = globalThis;
+globalThis.document = {
+    addEventListener(type, handler) { listeners.push(handler); },
+    getElementById(id) { return id === "iframe-container" ? container : null; },
+    querySelector() { return servers[0] || null; },
+    querySelectorAll(selector) {
+        if (selector === "#episode-servers a") return servers;
+        if (selector === ".download-link") return buttons;
+        return [];
+    },
+    createElement() { return {setAttribute() {}}; },
+};
+window.open = (url) => { opened.push(url); return null; };
+globalThis.setTimeout = () => {};
+Object.assign(window, fixture.globals);
+for (const script of process.argv.slice(3)) {
+    (0, eval)(fs.readFileSync(script, "utf8"));
+}
+listeners.forEach((handler) => handler());
+const click = (target) => {
+    const before = frames.length + opened.length;
+    try {
+        target.handlers.click.call(target, {preventDefault() {}});
+    } catch (e) {}
+    return before !== frames.length + opened.length;
+};
+const result = {embeds: {}, downloads: []};
+servers.forEach((server) => { result.embeds[server.attrs["data-server-id"]] = click(server) ? frames[frames.length - 1] : null; });
+buttons.forEach((button) => { result.downloads.push(click(button) ? opened[opened.length - 1] : null); });
+console.log(JSON.stringify(result));
+"""
+
+
+def read_fixture(name):
+    with open(os.path.join(HERE, name), "rb") as f:
+        return f.read()
+
+
+def synthetic_search_page(count=30, base="https://anime3rb.com", slug="show"):
+    """Search results page in anime3rb markup"""
+    cards = "".join(
+        f'<div class="title-card relative"><a href="{base}/titles/{slug}-{i}"><img src="/p/{i}.jpg"></a>'
+        f'<h2 class="title-name text-lg">{slug.title()} {i} - \u0627\u0644\u062d\u0644\u0642\u0629 {i}</h2>'
+        f'<a class="btn btn-md btn-plain w-full" href="{base}/titles/{slug}-{i}">Watch</a></div>'
+        for i in range(count)
+    )
+    nav = '<a href="/">x</a>' * 50
+    return f"<html><body><nav>{nav}</nav><main>{cards}</main></body></html>".encode()
+
+
+def synthetic_anime_page(count=24, base="https://anime3rb.com", slug="show"):
+    """Anime page listing `count` episodes in anime3rb markup"""
+    episodes = "".join(
+        f'<a href="{base}/episode/{slug}/{i}" class="flex gap-2"><img src="/t/{i}.jpg">'
+        f'<div class="video-data"><span>{i}</span><p class="font-light text-sm">Episode {i} \u0627\u0644\u062d\u0644\u0642\u0629</p></div></a>'
+        for i in range(1, count + 1)
+    )
+    return f"<html><body><div class=\"videos-list\">{episodes}</div></body></html>".encode()
+
+
+def irregular_anime_page():
+    """Anime page with cards the episode parsers must number exactly like the baseline"""
+    card = '<div class="video-data"><span>{0}</span><p class="font-light text-sm">Episode {0}</p></div>'
+    return (
+        "<html><body><div class=\"videos-list\">"
+        + card.format(1)  # Not inside a link: skipped, but still counted
+        + "".join(f'<a href="/episode/show/{i}">{card.format(i)}</a>' for i in (2, 3))
+        # A link inside a linked card: HTML5 parsers re-nest it, the baseline keeps the card
+        + '<a href="/episode/show/4"><div class="video-data"><p class="font-light text-sm">Episode 4</p>'
+          '<a href="/watch/4">Watch</a></div></a>'
+        + "</div></body></html>"
+    ).encode()
+
+
+def synthetic_episode_page(base="https://anime3rb.com", slug="show", num=1):
+    """Episode page with a download section in anime3rb markup"""
+    qualities = (("1080p HEVC", "180.2 MB"), ("1080p", "350.7 MB"), ("720p", "220.1 MB"), ("480p", "110.4 MB"))
+    containers = "".join(
+        f'<div class="flex flex-col rounded-lg gap-1"><label class="text-sm font-light">{quality} [mp4]</label>'
+        f'<a href="{base}/download/{slug}/{num}/{quality.replace(" ", "-")}" class="btn">Download [{size}]</a></div>'
+        for quality, size in qualities
+    )
+    player = "<script>" + "var x = 1;" * 2000 + "</script>"
+    return (
+        f"<html><body>{player}<div class=\"flex flex-col rounded-lg bg-gray-100/70 dark:bg-dark-700/30 p-4\">"
+        f"{containers}</div></body></html>"
+    ).encode()
+
+
+def encode_x6c(url, offsets=(3, 5, 2, 6), pick=1):
+    """Inverse of x6c.js: (resourceRegistry entry, configRegistry entry) that decode to url"""
+    padded = url + "#" * offsets[pick]  # Trimmed off again by slice(0, -offset)
+    data = base64.b64encode(padded.encode()).decode()
+    noisy = "".join(char + ("." if i % 9 == 4 else "") for i, char in enumerate(data))
+    return noisy[::-1], {"k": base64.b64encode(str(pick).encode()).decode(), "d": list(offsets)}
+
+
+def encode_px9(urls, secret=b"w1t-k3y", chunk=11):
+    """Inverse of px9.js: globals (_m, _t, _s, _a and _p{i}) that decode to urls"""
+    def xor(data):
+        return bytes(b ^ secret[i % len(secret)] for i, b in enumerate(data)).hex()
+    
+    values = {"_m": {"r": base64.b64encode(secret).decode()}, "_t": {"l": len(urls)}, "_s": [], "_a": []}
+    for i, url in enumerate(urls):
+        raw = url.encode()
+        pieces = [raw[j:j + chunk] for j in range(0, len(raw), chunk)]
+        positions = list(range(len(pieces)))
+        random.Random(i).shuffle(positions)
+        values[f"_p{i}"] = [xor(pieces[position]) for position in positions]
+        values["_s"].append(xor(json.dumps(positions).encode()))
+        values["_a"].append(f"token-{i}")
+    return values
+
+
+def registry_page(values, servers, downloads, filler=0):
+    """Episode page carrying registry globals, with server links ({id: name}) and download buttons (names)"""
+    servers = "".join(
+        f'<li><a href="#" data-server-id="{key}" onclick="loadIframe(this)"><span class="ser">{name}</span></a></li>'
+        for key, name in servers.items()
+    )
+    links = "".join(f'<a href="#" class="btn download-link" data-index="{i}">{name}</a>' for i, name in enumerate(downloads))
+    x6c = "".join(f"window.{name} = {json.dumps(values[name])};" for name in ("resourceRegistry", "configRegistry"))
+    # One registry as JSON, the other as a JS literal with bare keys and single quotes
+    px9 = "".join(
+        f"var {name} = " + json.dumps(value).replace('"', "'").replace("'r'", "r").replace("'l'", "l") + ";"
+        for name, value in values.items() if name.startswith("_")
+    )
+    return (
+        f"<html><head><script>{'var x = 1;' * filler}</script></head><body>"
+        f'<ul id="episode-servers">{servers}</ul><div id="iframe-container"></div>'
+        f'<div class="downloads">{links}</div>'
+        f"<script>{x6c}</script><script>{px9}</script></body></html>"
+    ).encode()
+
+
+def registry_fixture():
+    """Page built from the checked-in registry globals, and the entries the player scripts decoded them to"""
+    fixture = json.loads(read_fixture(REGISTRY_FIXTURE))
+    player = fixture["player"]
+    expected = [{"name": name, "url": url, "kind": "download", "auth": fixture["globals"]["_a"][i]}
+                for i, (name, url) in enumerate(zip(fixture["downloads"], player["downloads"])) if url]
+    expected += [{"name": name, "url": player["embeds"][key], "kind": "embed", "auth": None}
+                 for key, name in fixture["servers"].items() if player["embeds"][key]]
+    return registry_page(fixture["globals"], fixture["servers"], fixture["downloads"]), expected
+
+
+def capture_registry_fixture(node="node"):
+    """Write REGISTRY_FIXTURE: varied registry globals and what x6c.js / px9.js make of them under node"""
+    import tempfile
+    
+    embeds = [
+        ("yonaplay", "https://yonaplay.org/embed.php?id=48213", (3, 5, 2, 6), 1),
+        ("yonaplay v2", "https://yonaplay.org/embed.php?id=48213&v=2", (4, 7), 0),  # no API key: pattern is anchored
+        ("streamwish", "https://streamwish.to/e/kq9z1x0c3v", (12, 1, 9), 2),
+        ("mp4upload", "https://www.mp4upload.com/embed-7hg2kd0.html", (1,), 0),
+        ("videa", "https://videa.hu/player?v=Qe7sJd%2Bx&start=0", (0, 8), 1),
+        ("empty", "https://dood.example/e/never-shown", (0, 3), 0),  # offset 0: slice(0, -0) is empty
+    ]
+    downloads = [
+        ("FHD - direct", "https://witanime.example/download/show/1/FHD.mp4?token=a%2Fb&exp=1700000000"),
+        ("HD - mediafire", "https://www.mediafire.com/file/k2j3h4/%5BWit%5D_ep01.mp4/file"),
+        ("SD - pixeldrain", "https://pixeldrain.com/u/Ab3dE"),
+    ]
+    resources, configs = {}, {}
+    for key, (_, url, offsets, pick) in enumerate(embeds):
+        resource, configs[str(key)] = encode_x6c(url, offsets, pick)
+        resources[str(key)] = resource.replace("+", "+-") if key % 2 else resource  # more noise x6c.js strips
+    values = {"resourceRegistry": resources, "configRegistry": configs}
+    values.update(encode_px9([url for _, url in downloads], secret=b"\x8fq-K3y\x00", chunk=7))
+    fixture = {
+        "globals": values,
+        "servers": {str(key): name for key, (name, *_) in enumerate(embeds)},
+        "downloads": [name for name, _ in downloads],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        harness, data = os.path.join(tmp, "harness.js"), os.path.join(tmp, "fixture.json")
+        with open(harness, "w") as f:
+            f.write(PLAYER_HARNESS)
+        with open(data, "w") as f:
+            json.dump(fixture, f)
+        result = subprocess.run([node, harness, data, os.path.join(HERE, "x6c.js"), os.path.join(HERE, "px9.js")],
+                                capture_output=True, text=True, check=True)
+    fixture["player"] = json.loads(result.stdout)
+    with open(os.path.join(HERE, REGISTRY_FIXTURE), "w") as f:
+        json.dump(fixture, f, indent=1)
+        f.write("\n")
+    return fixture
+
+
+def synthetic_registry_page(base="https://witanime.example", slug="show", num=1, filler=20000):
+    """Episode page carrying the x6c.js and px9.js registries, and the entries they decode to"""
+    embeds = [
+        ("yonaplay", "https://yonaplay.org/embed.php?id=48213"),
+        ("streamwish", f"https://streamwish.example/e/{slug}{num}"),
+        ("direct", f"{base}/download/{slug}/{num}/embed.mp4"),
+    ]
+    downloads = [
+        ("FHD - direct", f"{base}/download/{slug}/{num}/FHD.mp4"),
+        ("HD - mediafire", f"https://www.mediafire.com/file/{slug}{num}/ep.mp4/file"),
+    ]
+    resources, configs = {}, {}
+    for key, (_, url) in enumerate(embeds):
+        resources[str(key)], configs[str(key)] = encode_x6c(url, pick=key % 4)
+    values = {"resourceRegistry": resources, "configRegistry": configs, **encode_px9([url for _, url in downloads])}
+    servers = {str(key): name for key, (name, _) in enumerate(embeds)}
+    page = registry_page(values, servers, [name for name, _ in downloads], filler)
+    expected = [{"name": name, "url": url, "kind": "download", "auth": f"token-{i}"}
+                for i, (name, url) in enumerate(downloads)]
+    expected += [{"name": name, "url": url + ("&apiKey=" + wit_anime.YONAPLAY_API_KEY if "yonaplay" in url else ""),
+                  "kind": "embed", "auth": None} for name, url in embeds]
+    return page, expected
+
+
+def summarize(title, rows):
+    """Print a table of timing samples: rows is a list of (label, [seconds, ...])"""
+    table = Table(title=title, header_style="bold cyan")
+    table.add_column("Case", style="bold white")
+    table.add_column("Runs", justify="right")
+    table.add_column("First (ms)", justify="right")
+    table.add_column("Median (ms)", justify="right")
+    table.add_column("Min (ms)", justify="right")
+    for label, samples in rows:
+        if not samples:
+            table.add_row(label, "0", "-", "-", "-")
+            continue
+        table.add_row(
+            label,
+            str(len(samples)),
+            f"{samples[0] * 1000:.1f}",
+            f"{statistics.median(samples) * 1000:.1f}",
+            f"{min(samples) * 1000:.1f}",
+        )
+    console.print(table)
+
+
+def bench_resolver(args):
+    """Compare the in-process yt-dlp backend against one subprocess per URL"""
+    app = wit_anime.AnimeScraperUI(use_cache=False)
+    rows = []
+    for backend in ("subprocess", "library"):
+        samples = []
+        for _ in range(args.runs):
+            for url in args.urls:
+                start = time.perf_counter()
+                result = app.resolve_stream_url(url, backend=backend)
+                elapsed = time.perf_counter() - start
+                if not result["success"]:
+                    console.print(f"[red]{backend}: {result['error'].strip()}[/red]")
+                    break
+                samples.append(elapsed)
+        rows.append((backend, samples))
+    summarize("yt-dlp resolution per URL (first run includes cold start)", rows)
+
+
+def baseline_parse(kind, content):
+    """The original full-tree html.parser scraping code, for comparison"""
+    soup = BeautifulSoup(content, 'html.parser')
+    if kind == "search":
+        results = []
+        for title in soup.select('div[class*="title-card"]'):
+            title_element = title.select_one('h2.title-name')
+            url_element = title.select_one('a.btn.btn-md.btn-plain.w-full')
+            if title_element and url_element:
+                results.append({"title": title_element.text.strip(), "url": url_element['href']})
+        return results
+    if kind == "anime":
+        results = []
+        for i, episode in enumerate(soup.select('div.video-data')):
+            episode_url_element = episode.find_parent('a')
+            episode_title_element = episode.select_one('p.font-light.text-sm')
+            if episode_url_element and episode_title_element:
+                results.append({'num': i + 1, 'title': episode_title_element.text.strip(), 'url': episode_url_element['href']})
+        return results
+    download_section = soup.select_one('div.flex.flex-col.rounded-lg.bg-gray-100\\/70.dark\\:bg-dark-700\\/30')
+    if not download_section:
+        download_section = soup.find('div', class_=re.compile(r'.*rounded-lg.*bg-gray-100.*'))
+    if not download_section:
+        return None
+    links = {}
+    for container in download_section.find_all('div', class_=re.compile(r'.*flex.*flex-col.*rounded-lg.*')):
+        label_element = container.find('label', class_=re.compile(r'.*font-light.*'))
+        download_link = container.find('a', href=True)
+        if label_element and download_link:
+            quality_text = label_element.get_text(strip=True)
+            links[wit_anime._quality_from_label(quality_text)] = wit_anime._download_entry(
+                quality_text, download_link['href'], download_link.get_text(strip=True)
+            )
+    return links
+
+
+PARSERS = {
+    "search": wit_anime.parse_search_results,
+    "anime": wit_anime.parse_episodes,
+    "episode": wit_anime.parse_download_links,
+}
+
+
+def bench_parse(args):
+    """Time each HTML parsing backend on the fixtures and synthetic pages; fails if one differs from the baseline"""
+    pages = [(f"{name} (as {kind})", kind, read_fixture(name)) for name in FIXTURES for kind in PARSERS]
+    pages += [
+        ("synthetic search", "search", synthetic_search_page(args.results)),
+        ("synthetic anime", "anime", synthetic_anime_page(args.episodes)),
+        ("irregular anime", "anime", irregular_anime_page()),
+        ("synthetic episode", "episode", synthetic_episode_page()),
+    ]
+    backends = wit_anime.available_parser_backends()
+    mismatches = 0
+    for label, kind, content in pages:
+        expected = baseline_parse(kind, content)
+        rows = []
+        samples = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            baseline_parse(kind, content)
+            samples.append(time.perf_counter() - start)
+        rows.append(("baseline", samples))
+        # Anime pages are also parsed incrementally as they download (iter_episodes)
+        for backend in backends + (["stream"] if kind == "anime" else []):
+            samples = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                if backend == "stream":
+                    result = list(wit_anime.iter_parse_episodes(wit_anime.iter_chunks(content, 4096)))
+                else:
+                    result = PARSERS[kind](content, backend)
+                samples.append(time.perf_counter() - start)
+            if result != expected:
+                console.print(f"[red]{backend} output differs from baseline on {label}[/red]")
+                mismatches += 1
+            rows.append((backend, samples))
+        summarize(f"{label}: {len(content) // 1024} KiB", rows)
+    return 1 if mismatches else 0
+
+
+class ReprintRenderer(wit_anime.MenuRenderer):
+    """The previous behaviour: rebuild the table and reprint the whole screen on every key"""
+    def draw(self, key, build, row_count, selected):
+        output = "\033[H\033[J" + "\n".join(self._capture(build(lambda row: row == selected)))
+        self.console.file.write(output)
+        self.last_bytes = len(output.encode("utf-8"))
+
+
+def bench_render(args):
+    """Bytes written to the terminal per keystroke in the anime menu: full reprint vs incremental"""
+    anime_list = [
+        {"title": f"\u0627\u0644\u062d\u0644\u0642\u0629 {i} - Shingeki no Kyojin Season {i}", "url": f"https://anime3rb.com/titles/{i}"}
+        for i in range(args.rows)
+    ]
+    rows = []
+    for mode in ("full reprint", "incremental"):
+        app = wit_anime.AnimeScraperUI(use_cache=False)
+        app.console = wit_anime.Console(file=io.StringIO(), force_terminal=True, width=args.width, height=args.height)
+        renderer_class = ReprintRenderer if mode == "full reprint" else wit_anime.MenuRenderer
+        app.renderer = renderer_class(app.console)
+        app.print_anime_menu(anime_list, 0)
+        samples = []
+        sizes = []
+        for key in range(args.keys):
+            start = time.perf_counter()
+            app.print_anime_menu(anime_list, (key + 1) % len(anime_list))
+            samples.append(time.perf_counter() - start)
+            sizes.append(app.renderer.last_bytes)
+        rows.append((mode, samples))
+        console.print(f"{mode}: {statistics.mean(sizes):,.0f} bytes per keystroke")
+    summarize(f"Anime menu, {args.rows} rows: draw time per keystroke", rows)
+
+
+class IdlePrefetcher:
+    """Stands in for LinkPrefetcher so browsing the menu sends no requests"""
+    def schedule(self, episodes, selected):
+        pass
+
+    def cancel_pending(self):
+        pass
+
+
+def bench_menu(args):
+    """Handling time per keystroke in the episode menu: cost should not grow with the list length"""
+    import readchar
+    
+    keys = (
+        [("move", readchar.key.DOWN)] * args.keys
+        + [("page", readchar.key.RIGHT)] * args.pages
+        + [("jump", k) for k in ["g"] + list(str(args.episodes * 3 // 4)) + [readchar.key.ENTER]]
+        + [("filter", k) for k in ["/", "1", "2", readchar.key.BACKSPACE, "e", "p", readchar.key.ESC]]
+        + [("page", readchar.key.LEFT)] * args.pages
+        + [("back", "b")]
+    )
+    results = []
+    for count in sorted({max(1, args.episodes // 10), args.episodes}):
+        page = synthetic_anime_page(count)
+        episodes = wit_anime.EpisodeList(wit_anime.iter_parse_episodes(wit_anime.iter_chunks(page)))
+        app = wit_anime.AnimeScraperUI(use_cache=False, use_catalog=False, resolver="subprocess")
+        app.console = Console(file=io.StringIO(), force_terminal=True, width=args.width, height=args.height)
+        app.renderer = wit_anime.MenuRenderer(app.console)
+        app._components["prefetcher"] = IdlePrefetcher()
+        
+        samples = {}
+        pending = iter(keys)
+        last = [None]
+        
+        def readkey():
+            # Time from handing out the previous key until the menu asks for the next one
+            now = time.perf_counter()
+            if last[0] is not None:
+                samples.setdefault(last[0][0], []).append(now - last[0][1])
+            kind, key = next(pending)
+            last[0] = (kind, time.perf_counter())
+            return key
+        
+        original = readchar.readkey
+        readchar.readkey = readkey
+        try:
+            app.episode_menu(episodes)
+        finally:
+            readchar.readkey = original
+        results.append((count, samples))
+    
+    table = Table(title="Episode menu: handling time per key (ms)", header_style="bold cyan")
+    table.add_column("Keys", style="bold white")
+    for count, _ in results:
+        table.add_column(f"{count} episodes p50", justify="right")
+        table.add_column(f"{count} episodes max", justify="right")
+    for kind in ("move", "page", "jump", "filter"):
+        row = [kind]
+        for _, samples in results:
+            values = samples.get(kind, [])
+            row += [f"{statistics.median(values) * 1000:.2f}", f"{max(values) * 1000:.2f}"] if values else ["-", "-"]
+        table.add_row(*row)
+    console.print(table)
+
+
+
+# Runs wit_anime.py as a script and exits the moment the first prompt would be shown
+STARTUP_PROBE = """
+import os, runpy, sys
+import rich.prompt
+rich.prompt.Prompt.ask = classmethod(lambda cls, *args, **kwargs: os._exit(0))
+sys.argv = [{script!r}, "--no-cache"]
+runpy.run_path({script!r}, run_name="__main__")
+"""
+
+
+def time_process(cmd, env=None, input=None):
+    start = time.perf_counter()
+    subprocess.run(cmd, input=input, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def bench_startup(args):
+    """Time from process start to the first search prompt; fails if the median exceeds the budget"""
+    script = os.path.join(HERE, "wit_anime.py")
+    probe = [sys.executable, "-c", STARTUP_PROBE.format(script=script)]
+    
+    # Show which imports dominate, from one run with -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_PROBE.format(script=script)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            imports.append((int(parts[1]), parts[2].rstrip()))
+    table = Table(title="Slowest imports before the first prompt (cumulative)", header_style="bold cyan")
+    table.add_column("Module", style="bold white")
+    table.add_column("ms", justify="right")
+    for micros, module in sorted(imports, reverse=True)[:args.top]:
+        table.add_row(module, f"{micros / 1000:.1f}")
+    console.print(table)
+    
+    interpreter = [time_process([sys.executable, "-c", "pass"]) for _ in range(args.runs)]
+    startup = [time_process(probe) for _ in range(args.runs)]
+    summarize("Startup", [("python -c pass", interpreter), ("wit_anime.py to first prompt", startup)])
+    
+    median_ms = statistics.median(startup) * 1000
+    if median_ms > args.budget:
+        console.print(f"[red]❌ Startup {median_ms:.0f} ms exceeds the {args.budget} ms budget[/red]")
+        return 1
+    console.print(f"[green]✅ Startup {median_ms:.0f} ms is within the {args.budget} ms budget[/green]")
+    return 0
+
+
+class StandInSite:
+    """Local HTTP server standing in for anime3rb and its video CDN.
+
+    /search serves synthetic result cards per query (the checked-in fixtures for
+    the queries 'fixture' and 'fixture-page'), /titles and /episode serve
+    synthetic anime and episode pages, /registry serves episode pages carrying
+    the player's obfuscated server registries, and /download serves a synthetic video
+    with range support. Every response can be delayed by `latency` seconds and
+    all response bodies share a `bandwidth` bytes/second cap. A `slow_fraction`
+    of page responses take `slow_delay` longer and an `error_fraction` answer 503.
+    `video_delays` and `video_rates` give single videos, by the last path segment
+    of their /download URL, a first-byte delay and a bandwidth of their own.
+    """
+    def __init__(self, latency=0.0, bandwidth=None, results=20, episodes=24, video_size=8 * 1024 * 1024,
+                 slow_fraction=0.0, slow_delay=0.0, error_fraction=0.0, video_delays=None, video_rates=None):
+        self.latency = latency
+        self.video_delays = video_delays or {}
+        # Shaped like a link, not a download budget: no second-long burst that would flatter a short probe
+        self.video_buckets = {name: wit_anime.TokenBucket(rate, burst=64 * 1024) for name, rate in (video_rates or {}).items()}
+        self.slow_fraction = slow_fraction
+        self.slow_delay = slow_delay
+        self.error_fraction = error_fraction
+        self.bucket = wit_anime.TokenBucket(bandwidth)
+        self.results = results
+        self.episodes = episodes
+        self.video = bytes(range(256)) * (video_size // 256)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def page(self, path, query):
+        """Body and content type for a page path, or None"""
+        if path == "/search":
+            q = query.get("q", [""])[0]
+            if q == "fixture":
+                return read_fixture("search.html")
+            if q == "fixture-page":
+                return read_fixture("searchpage.html")
+            return synthetic_search_page(self.results, self.base, re.sub(r"\W+", "-", q.lower()) or "show")
+        match = re.fullmatch(r"/titles/([\w-]+)", path)
+        if match:
+            return synthetic_anime_page(self.episodes, self.base, match.group(1))
+        match = re.fullmatch(r"/episode/([\w-]+)/(\d+)", path)
+        if match:
+            return synthetic_episode_page(self.base, match.group(1), int(match.group(2)))
+        match = re.fullmatch(r"/registry/([\w-]+)/(\d+)", path)
+        if match:
+            return synthetic_registry_page(self.base, match.group(1), int(match.group(2)))[0]
+        return None
+
+    def _handler_class(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Headers and body are separate writes
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if site.latency:
+                    time.sleep(site.latency)
+                parts = urlsplit(self.path)
+                if parts.path.startswith("/download/"):
+                    self.send_video()
+                    return
+                if random.random() < site.slow_fraction:
+                    time.sleep(site.slow_delay)
+                body = site.page(parts.path, parse_qs(parts.query))
+                if random.random() < site.error_fraction:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.send_body(body)
+
+            def send_video(self):
+                name = urlsplit(self.path).path.rstrip("/").rpartition("/")[2]
+                if site.video_delays.get(name):
+                    time.sleep(site.video_delays[name])
+                size = len(site.video)
+                start, end = 0, size - 1
+                match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                if match:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), end) if match.group(2) else end
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                self.send_body(memoryview(site.video)[start:end + 1], site.video_buckets.get(name))
+
+            def send_body(self, body, bucket=None):
+                try:
+                    for offset in range(0, len(body), 64 * 1024):
+                        chunk = body[offset:offset + 64 * 1024]
+                        (bucket or site.bucket).consume(len(chunk))
+                        self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+    def close(self):
+        self.server.shutdown()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (includes the in-process stand-in server)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def bench_e2e(args):
+    """Whole pipeline against a local stand-in site: search, episodes, links, stream URL and proxied video"""
+    site = StandInSite(latency=args.latency / 1000, bandwidth=args.bandwidth, results=args.results,
+                       episodes=args.episodes, video_size=args.video_mb * 1024 * 1024,
+                       slow_fraction=args.slow_fraction, slow_delay=args.slow_ms / 1000, error_fraction=args.error_fraction)
+    wit_anime.TRACER.enabled = True
+    app = wit_anime.AnimeScraperUI(use_cache=False, use_catalog=False, resolver=args.resolver, parser=args.parser,
+                                   site_url=site.base)
+    app.console = Console(stderr=True)
+    
+    # Captured pages: fetch + parse cost at real page sizes (WitAnime markup, so no results)
+    for _ in range(args.runs):
+        for query in ("fixture", "fixture-page"):
+            response = app.fetch_page(f"{site.base}/search?q={query}", "search")
+            wit_anime.parse_search_results(response.content, app.parser_backend)
+    
+    # Headless pipeline, as `wit_anime.py resolve --stream` runs it
+    records = []
+    start = time.perf_counter()
+    failures = app.resolve_batch([f"title {i}" for i in range(args.titles)], records.append,
+                                 episodes=args.episode_range, stream=True, workers=args.workers)
+    pipeline = time.perf_counter() - start
+    
+    # Video: read resolved streams end to end through the read-ahead proxy
+    streamed = 0
+    start = time.perf_counter()
+    for record in [r for r in records if "stream_url" in r][:args.videos]:
+        with wit_anime.TRACER.span("video"):
+            local_url = app.preload_stream(record["stream_url"])
+            with urllib.request.urlopen(local_url) as response:
+                streamed += len(response.read())
+    video = time.perf_counter() - start
+    site.close()
+    
+    table = Table(title="Stage latency", header_style="bold cyan")
+    table.add_column("Stage", style="bold white")
+    for column in ("Count", "p50 (ms)", "p99 (ms)", "Max (ms)"):
+        table.add_column(column, justify="right")
+    stages = {}
+    for name, begin, end, *_ in wit_anime.TRACER.spans:
+        stages.setdefault(name, []).append((end - begin) * 1000)
+    for name, values in stages.items():
+        table.add_row(name, str(len(values)), f"{percentile(values, 0.5):.1f}", f"{percentile(values, 0.99):.1f}",
+                      f"{max(values):.1f}")
+    console.print(table)
+    
+    resolved = len(records) - failures
+    peak = peak_rss_mb()
+    console.print(f"Episodes resolved: {resolved} ({failures} failed) in {pipeline:.2f} s, "
+                  f"{resolved / pipeline:.1f} episodes/s with {args.workers} workers")
+    if streamed:
+        console.print(f"Video through proxy: {streamed / 1024 / 1024:.1f} MB at {streamed / 1024 / 1024 / video:.1f} MB/s")
+    stats = getattr(app.http, "stats", None)
+    if stats:
+        console.print(f"Page requests: {stats['requests']}, retries: {stats['retries']}, "
+                      f"hedged: {stats['hedges']} (duplicate won {stats['hedge_wins']})")
+    if peak is not None:
+        console.print(f"Peak RSS: {peak:.1f} MB")
+    return 1 if failures else 0
+
+
+EPISODE_MODES = ("tree", "selectolax", "stream")
+
+
+def measure_episodes(args):
+    """Child process: load one anime page with one parse mode and print the timings as JSON"""
+    app = wit_anime.AnimeScraperUI(use_cache=False, use_catalog=False, site_url=args.base)
+    app.console = Console(stderr=True)
+    # Open the connection before timing, as a warm session would have it
+    app.fetch_page(f"{args.base}/search?q=warm", "search")
+    url = f"{args.base}/titles/show"
+    baseline = peak_rss_mb()
+    first = None
+    count = 0
+    start = time.perf_counter()
+    if args.mode == "stream":
+        for _ in app.iter_episodes(url):
+            count += 1
+            if first is None:
+                first = time.perf_counter() - start
+    else:
+        response = app.fetch_page(url, "anime")
+        count = len(wit_anime.parse_episodes(response.content, "html.parser" if args.mode == "tree" else args.mode))
+        first = time.perf_counter() - start
+    total = time.perf_counter() - start
+    print(json.dumps({"episodes": count, "first_row": first, "total": total, "rss": peak_rss_mb() - baseline}))
+    return 0
+
+
+def bench_episodes(args):
+    """Time to the first episode row, total time and parser memory on a long anime page, per parse mode"""
+    if args.mode:
+        return measure_episodes(args)
+    site = StandInSite(latency=args.latency / 1000, bandwidth=args.bandwidth, episodes=args.episodes)
+    size = len(site.page("/titles/show", {}))
+    rows = []
+    table = Table(title=f"{args.episodes}-episode page ({size / 1024:.0f} KB)", header_style="bold cyan")
+    table.add_column("Mode", style="bold white")
+    for column in ("Episodes", "First row p50 (ms)", "Total p50 (ms)", "Peak RSS growth (MB)"):
+        table.add_column(column, justify="right")
+    try:
+        for mode in EPISODE_MODES:
+            # One process per run so each peak RSS belongs to a single mode
+            runs = []
+            for _ in range(args.runs):
+                result = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "episodes", "--mode", mode, "--base", site.base],
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True
+                )
+                runs.append(json.loads(result.stdout.splitlines()[-1]))
+            rows.append((mode, runs))
+    finally:
+        site.close()
+    for mode, runs in rows:
+        table.add_row(mode, str(runs[0]["episodes"]),
+                      f"{statistics.median(r['first_row'] for r in runs) * 1000:.1f}",
+                      f"{statistics.median(r['total'] for r in runs) * 1000:.1f}",
+                      f"{max(r['rss'] for r in runs):.1f}")
+    console.print(table)
+    counts = {runs[0]["episodes"] for _, runs in rows}
+    if counts != {args.episodes}:
+        console.print(f"[red]❌ Modes disagree on the episode count: {sorted(counts)}[/red]")
+        return 1
+    return 0
+
+
+def bench_registry(args):
+    """Native decoding of the player's server registries vs yt-dlp; fails if a decoded URL is wrong"""
+    if args.capture:
+        fixture = capture_registry_fixture(args.node)
+        console.print(f"[green]✅ Captured {len(fixture['servers'])} servers and {len(fixture['downloads'])} downloads "
+                      f"to {REGISTRY_FIXTURE}[/green]")
+    # Checked against what the player scripts produced under node, not against this file's encoders
+    page, expected = registry_fixture()
+    decoded = wit_anime.parse_server_registry(page)
+    if decoded != expected:
+        console.print(f"[red]❌ Registry decoded differently than x6c.js / px9.js did for {REGISTRY_FIXTURE}:[/red]")
+        for got, want in zip(decoded or [], expected):
+            if got != want:
+                console.print(f"  got {got}\n  want {want}")
+        if decoded is None or len(decoded) != len(expected):
+            console.print(f"  got {len(decoded or [])} entries, want {len(expected)}")
+        return 1
+    console.print(f"[green]✅ {len(decoded)} registry entries decoded as x6c.js / px9.js did for {REGISTRY_FIXTURE}[/green]")
+    
+    page, expected = synthetic_registry_page()
+    samples = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        wit_anime.parse_server_registry(page)
+        samples.append(time.perf_counter() - start)
+    rows = [(f"decode registries ({len(page) // 1024} KiB page)", samples)]
+    
+    # Stream URL for a direct-media registry entry: native vs what yt-dlp would be asked to do
+    site = StandInSite()
+    app = wit_anime.AnimeScraperUI(use_cache=False, use_catalog=False, site_url=site.base)
+    app.console = Console(stderr=True)
+    try:
+        info = app.extract_download_links(f"{site.base}/registry/show/1")
+        url = info["links"]["FHD - direct"]["url"]
+        native = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            result = app.get_streaming_url(url, refresh=True, show_progress=False)
+            native.append(time.perf_counter() - start)
+        assert result == {"success": True, "url": url}, result
+        rows.append(("stream URL: registry (native)", native))
+        for backend in args.backends:
+            samples = []
+            for _ in range(args.ytdlp_runs):
+                start = time.perf_counter()
+                result = app.resolve_with_subprocess(url) if backend == "subprocess" else app.resolver.resolve(url)
+                samples.append(time.perf_counter() - start)
+            rows.append((f"stream URL: yt-dlp {backend}" + ("" if result["success"] else " (failed)"), samples))
+    finally:
+        site.close()
+    summarize("Server registry resolution", rows)
+    return 0
+
+
+# A slow primary CDN for the best-listed quality, faster hosts for the others
+DEFAULT_RACE_SOURCES = ("1080p=1500ms@4M", "1080p-HEVC=300ms@12M", "720p=100ms@2M", "480p=50ms@20M")
+
+
+def parse_source_profile(text):
+    """'1080p=1500ms@2M' -> (name, first-byte delay in seconds, bytes/second or None)"""
+    name, _, spec = text.partition("=")
+    delay, _, rate = spec.partition("@")
+    return name, float(delay.rstrip("ms") or 0) / 1000, wit_anime.parse_rate(rate) if rate else None
+
+
+def bench_race(args):
+    """Time until PRELOAD_BYTES of the chosen stream are in: first-listed quality vs racing every source"""
+    profiles = [parse_source_profile(text) for text in args.source or DEFAULT_RACE_SOURCES]
+    site = StandInSite(video_size=args.video_mb * 1024 * 1024,
+                       video_delays={name: delay for name, delay, _ in profiles},
+                       video_rates={name: rate for name, _, rate in profiles if rate})
+    wit_anime.TRACER.enabled = True
+    app = wit_anime.AnimeScraperUI(use_cache=False, use_catalog=False, resolver=args.resolver, site_url=site.base)
+    app.console = Console(stderr=True)
+    
+    def preload(url):
+        request = urllib.request.Request(url, headers={"Range": f"bytes=0-{wit_anime.PRELOAD_BYTES - 1}"})
+        with urllib.request.urlopen(request) as response:
+            return len(response.read())
+    
+    rows = {"first listed": [], "race": []}
+    winners = []
+    try:
+        # yt-dlp's first extraction pays for its imports; keep that out of both columns
+        warm = app.extract_download_links(f"{site.base}/episode/warm/1")
+        app.get_streaming_url(next(iter(warm["links"].values()))["url"], show_progress=False)
+        for run in range(args.runs):
+            # Separate episodes per mode, so neither finds the other's resolved URLs cached
+            links = app.extract_download_links(f"{site.base}/episode/first/{run + 1}")["links"]
+            start = time.perf_counter()
+            quality = next(q for q in wit_anime.QUALITY_ORDER if q in links)
+            stream = app.get_streaming_url(links[quality]["url"], show_progress=False)
+            preload(stream["url"])
+            rows["first listed"].append(time.perf_counter() - start)
+            
+            links = app.extract_download_links(f"{site.base}/episode/race/{run + 1}")["links"]
+            start = time.perf_counter()
+            ranked = app.race_sources(links)
+            preload(ranked[0]["stream"]["url"])
+            rows["race"].append(time.perf_counter() - start)
+            winners.append(ranked[0]["quality"])
+    finally:
+        site.close()
+    summarize(f"Selection to {wit_anime.PRELOAD_BYTES // (1024 * 1024)} MB preloaded", list(rows.items()))
+    console.print(f"Race winners: {', '.join(sorted(set(winners)))}")
+    return 0
+
+
+def bench_daemon(args):
+    """Fresh `wit_anime.py resolve` processes in-process vs through a resident daemon; fails if their output differs"""
+    import importlib.util
+    import py_compile
+    import shutil
+    import tempfile
+    site = StandInSite(latency=args.latency / 1000, episodes=args.episodes)
+    home = tempfile.mkdtemp(prefix="wit_anime-bench-")
+    env = dict(os.environ, XDG_CACHE_HOME=home)
+    path = os.path.join(home, "wit_anime", "daemon.sock")
+    script = os.path.join(HERE, "wit_anime.py")
+    options = [sys.executable, script, "--site", site.base, "--resolver", args.resolver, "--no-catalog"]
+    query = ["resolve", "-e", args.episode_range, "--stream", "--rate", "0"]
+    
+    def timed(label, extra, queries):
+        return (label, [time_process(options + extra + query, env, f"{q}\n".encode()) for q in queries])
+    
+    def output(extra):
+        result = subprocess.run(options + extra + query, input=b"title repeat\n", env=env, capture_output=True, check=True)
+        return sorted(result.stdout.decode("utf-8").splitlines())
+    
+    rows = [
+        ("python -c pass", [time_process([sys.executable, "-c", "pass"]) for _ in range(args.runs)]),
+        ("import wit_anime", [time_process([sys.executable, "-c", f"import sys; sys.path.insert(0, {HERE!r}); import wit_anime"])
+                              for _ in range(args.runs)]),
+        timed("in-process, new query", ["--no-daemon"], [f"title local {i}" for i in range(args.runs)]),
+        timed("in-process, repeated query", ["--no-daemon"], ["title repeat"] * args.runs),
+    ]
+    daemon = subprocess.Popen(options + ["daemon", "--idle", "0"], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        client = wit_anime.DaemonClient(path)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                client.call("ping")
+                break
+            except (OSError, ValueError):
+                if daemon.poll() is not None or time.monotonic() > deadline:
+                    console.print("[red]❌ The daemon did not come up[/red]")
+                    return 1
+                time.sleep(0.05)
+        rows.append(timed("daemon, new query", [], [f"title daemon {i}" for i in range(args.runs)]))
+        rows.append(timed("daemon, repeated query", [], ["title repeat"] * args.runs))
+        # A script run by path is compiled on every start; `python -m` loads the cached bytecode
+        py_compile.compile(script, cfile=importlib.util.cache_from_source(script))
+        module = [sys.executable, "-m", "wit_anime"] + options[2:]
+        rows.append(("daemon, repeated query (python -m)",
+                     [time_process(module + query, dict(env, PYTHONPATH=HERE), b"title repeat\n") for _ in range(args.runs)]))
+        # The request alone, without a process start: what the daemon adds to a query
+        url = f"{site.base}/search?q=title%20repeat"
+        round_trips = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            client.call("search_page", url=url)
+            client.call("links", episode_url=f"{site.base}/episode/title-repeat-0/1")
+            round_trips.append(time.perf_counter() - start)
+        rows.append(("daemon round trips (search + links)", round_trips))
+        through_daemon = output([])
+        in_process = output(["--no-daemon"])
+        client.call("shutdown")
+        daemon.wait(timeout=10)
+    finally:
+        if daemon.poll() is None:
+            daemon.kill()
+        site.close()
+        shutil.rmtree(home, ignore_errors=True)
+    summarize("Fresh process to resolved streams", rows)
+    if through_daemon != in_process:
+        console.print("[red]❌ The daemon and in-process runs resolved different records[/red]")
+        return 1
+    console.print(f"[green]✅ Both modes resolved the same {len(in_process)} record(s)[/green]")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    resolver = commands.add_parser("resolver", help=bench_resolver.__doc__)
+    resolver.add_argument("urls", nargs="+", help="download URLs to resolve")
+    resolver.add_argument("--runs", type=int, default=3, help="passes over the URL list per backend")
+    resolver.set_defaults(func=bench_resolver)
+
+    parse = commands.add_parser("parse", help=bench_parse.__doc__)
+    parse.add_argument("--runs", type=int, default=20, help="parses per page and backend")
+    parse.add_argument("--results", type=int, default=30, help="cards on the synthetic search page")
+    parse.add_argument("--episodes", type=int, default=500, help="episodes on the synthetic anime page")
+    parse.set_defaults(func=bench_parse)
+
+    render = commands.add_parser("render", help=bench_render.__doc__)
+    render.add_argument("--rows", type=int, default=25, help="titles in the menu")
+    render.add_argument("--keys", type=int, default=200, help="simulated arrow key presses")
+    render.add_argument("--width", type=int, default=120, help="terminal width")
+    render.add_argument("--height", type=int, default=50, help="terminal height")
+    render.set_defaults(func=bench_render)
+
+    menu = commands.add_parser("menu", help=bench_menu.__doc__)
+    menu.add_argument("--episodes", type=int, default=3000, help="episodes in the longer list (the shorter has a tenth)")
+    menu.add_argument("--keys", type=int, default=100, help="cursor moves")
+    menu.add_argument("--pages", type=int, default=8, help="page flips each way")
+    menu.add_argument("--width", type=int, default=120, help="terminal width")
+    menu.add_argument("--height", type=int, default=50, help="terminal height")
+    menu.set_defaults(func=bench_menu)
+
+    startup = commands.add_parser("startup", help=bench_startup.__doc__)
+    startup.add_argument("--runs", type=int, default=10, help="process launches to time")
+    startup.add_argument("--budget", type=int, default=250, help="maximum median time to first prompt (ms)")
+    startup.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    startup.set_defaults(func=bench_startup)
+
+    e2e = commands.add_parser("e2e", help=bench_e2e.__doc__)
+    e2e.add_argument("--titles", type=int, default=8, help="search queries to resolve")
+    e2e.add_argument("--episodes", type=int, default=24, help="episodes per anime page")
+    e2e.add_argument("--episode-range", default="1-6", help="episodes resolved per title")
+    e2e.add_argument("--results", type=int, default=20, help="cards per search page")
+    e2e.add_argument("--workers", type=int, default=wit_anime.RESOLVE_WORKERS, help="resolve worker pool size")
+    e2e.add_argument("--resolver", choices=wit_anime.RESOLVER_BACKENDS, default="library", help="yt-dlp backend")
+    e2e.add_argument("--parser", choices=("auto",) + wit_anime.PARSER_BACKENDS, default="auto", help="HTML parser")
+    e2e.add_argument("--runs", type=int, default=5, help="fetch + parse passes over the captured fixtures")
+    e2e.add_argument("--videos", type=int, default=2, help="resolved streams read end to end through the proxy")
+    e2e.add_argument("--video-mb", type=int, default=8, help="size of the synthetic video")
+    e2e.add_argument("--latency", type=float, default=0, metavar="MS", help="delay added to every response")
+    e2e.add_argument("--bandwidth", type=wit_anime.parse_rate, metavar="RATE",
+                     help="total response bandwidth, e.g. 800K or 5M (bytes per second)")
+    e2e.add_argument("--slow-fraction", type=float, default=0, help="share of page responses that are slow")
+    e2e.add_argument("--slow-ms", type=float, default=2000, help="extra delay of a slow response")
+    e2e.add_argument("--error-fraction", type=float, default=0, help="share of page responses answered with 503")
+    e2e.set_defaults(func=bench_e2e)
+
+    registry = commands.add_parser("registry", help=bench_registry.__doc__)
+    registry.add_argument("--runs", type=int, default=50, help="native decodes")
+    registry.add_argument("--ytdlp-runs", type=int, default=3, help="yt-dlp resolutions per backend")
+    registry.add_argument("--backends", nargs="*", choices=("library", "subprocess"), default=["library", "subprocess"],
+                          help="yt-dlp backends to compare against")
+    registry.add_argument("--capture", action="store_true", help=f"regenerate {REGISTRY_FIXTURE} with node first")
+    registry.add_argument("--node", default="node", help="node executable for --capture")
+    registry.set_defaults(func=bench_registry)
+
+    race = commands.add_parser("race", help=bench_race.__doc__)
+    race.add_argument("--runs", type=int, default=3, help="episodes timed per mode")
+    race.add_argument("--source", action="append", metavar="QUALITY=DELAY@RATE",
+                      help="first-byte delay and bandwidth of a quality's video, e.g. 1080p=1500ms@4M "
+                           f"(default: {' '.join(DEFAULT_RACE_SOURCES)})")
+    race.add_argument("--video-mb", type=int, default=16, help="size of the synthetic video")
+    race.add_argument("--resolver", choices=wit_anime.RESOLVER_BACKENDS, default="library", help="yt-dlp backend")
+    race.set_defaults(func=bench_race)
+
+    episodes = commands.add_parser("episodes", help=bench_episodes.__doc__)
+    episodes.add_argument("--episodes", type=int, default=2000, help="episodes on the synthetic anime page")
+    episodes.add_argument("--runs", type=int, default=3, help="processes per mode")
+    episodes.add_argument("--latency", type=float, default=0, metavar="MS", help="delay added to every response")
+    episodes.add_argument("--bandwidth", type=wit_anime.parse_rate, metavar="RATE",
+                          help="response bandwidth, e.g. 800K or 5M (bytes per second)")
+    episodes.add_argument("--mode", choices=EPISODE_MODES, help=argparse.SUPPRESS)
+    episodes.add_argument("--base", help=argparse.SUPPRESS)
+    episodes.set_defaults(func=bench_episodes)
+
+    daemon = commands.add_parser("daemon", help=bench_daemon.__doc__)
+    daemon.add_argument("--runs", type=int, default=5, help="processes per case")
+    daemon.add_argument("--episodes", type=int, default=24, help="episodes per anime page")
+    daemon.add_argument("--episode-range", default="1-2", help="episodes resolved per query")
+    daemon.add_argument("--latency", type=float, default=50, metavar="MS", help="delay added to every response")
+    daemon.add_argument("--resolver", choices=wit_anime.RESOLVER_BACKENDS, default="library", help="yt-dlp backend")
+    daemon.set_defaults(func=bench_daemon)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
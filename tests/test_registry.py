@@ -0,0 +1,84 @@
+"""Server registry decoding against registry.json, captured from the site's x6c.js / px9.js under node."""
+import copy
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import benchmark  # noqa: E402
+import wit_anime  # noqa: E402
+
+
+@pytest.fixture
+def fixture():
+    with open(os.path.join(ROOT, benchmark.REGISTRY_FIXTURE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def px9_arguments(values):
+    count = values["_t"]["l"]
+    return values["_m"]["r"], count, [values.get(f"_p{i}") for i in range(count)], values["_s"], values["_a"]
+
+
+def page(fixture, values):
+    return benchmark.registry_page(values, fixture["servers"], fixture["downloads"])
+
+
+def test_parse_server_registry_matches_player():
+    content, expected = benchmark.registry_fixture()
+    assert wit_anime.parse_server_registry(content) == expected
+
+
+def test_decode_x6c_resource(fixture):
+    values = fixture["globals"]
+    for key, url in fixture["player"]["embeds"].items():
+        assert wit_anime.decode_x6c_resource(values["resourceRegistry"][key], values["configRegistry"][key]) == url
+
+
+def test_decode_px9_registry(fixture):
+    decoded = wit_anime.decode_px9_registry(*px9_arguments(fixture["globals"]))
+    assert decoded == list(zip(fixture["player"]["downloads"], fixture["globals"]["_a"]))
+
+
+def test_px9_count_beyond_orders(fixture):
+    values = fixture["globals"]
+    secret, count, parts, orders, auth = px9_arguments(values)
+    decoded = wit_anime.decode_px9_registry(secret, count + 2, parts + [None, None], orders, auth)
+    assert [url for url, _ in decoded] == fixture["player"]["downloads"] + [None, None]
+    
+    values = copy.deepcopy(values)
+    values["_t"]["l"] = count + 5
+    entries = wit_anime.parse_server_registry(page(fixture, values))
+    assert [entry["url"] for entry in entries if entry["kind"] == "download"] == fixture["player"]["downloads"]
+
+
+def test_px9_missing_or_malformed_entry(fixture):
+    values = copy.deepcopy(fixture["globals"])
+    del values["_p1"]
+    values["_s"][2] = "zz"  # Not hex
+    urls = [url for url, _ in wit_anime.decode_px9_registry(*px9_arguments(values))]
+    assert urls == [fixture["player"]["downloads"][0], None, None]
+    
+    entries = wit_anime.parse_server_registry(page(fixture, values))
+    assert [entry["url"] for entry in entries if entry["kind"] == "download"] == fixture["player"]["downloads"][:1]
+
+
+def test_malformed_x6c_entry_is_skipped(fixture):
+    values = copy.deepcopy(fixture["globals"])
+    values["configRegistry"]["0"]["k"] = "!!"
+    values["configRegistry"]["1"] = {"d": [1]}
+    entries = wit_anime.parse_server_registry(page(fixture, values))
+    embeds = [url for key, url in fixture["player"]["embeds"].items() if key not in ("0", "1") and url]
+    assert [entry["url"] for entry in entries if entry["kind"] == "embed"] == embeds
+
+
+def test_undecodable_registries_are_no_registry(fixture):
+    values = copy.deepcopy(fixture["globals"])
+    values["_s"] = []
+    values["configRegistry"] = {key: {} for key in values["configRegistry"]}
+    assert wit_anime.parse_server_registry(page(fixture, values)) is None
+    assert wit_anime.parse_server_registry(b"<html><body>No player here</body></html>") is None
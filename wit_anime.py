@@ -1,104 +1,2894 @@
-import cloudscraper
-from bs4 import BeautifulSoup
-from rich.console import Console
-from rich.prompt import Prompt
-from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
-from rich.panel import Panel
+# Heavy dependencies (cloudscraper, bs4, rich.table/progress/panel, arabic_reshaper,
+# bidi, readchar, httpx, sqlite3, asyncio) are imported where they are used so the search
+# prompt appears quickly; AnimeScraperUI.warm_up loads them while the user types.
 import sys
-import readchar
-import webbrowser
-from urllib.parse import quote
+from urllib.parse import quote, urlsplit, parse_qs
 import math
 import re
-import arabic_reshaper
-from bidi.algorithm import get_display
 import subprocess
 import time
 import threading
+import os
+import argparse
+import json
+import queue
+import random
+import functools
+import calendar
+import unicodedata
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
+
+# Local state (response cache etc.) lives under the user's cache directory
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "wit_anime")
+
+# Site scraped for search, anime and episode pages (overridable for local stand-ins)
+SITE_URL = os.environ.get("WIT_ANIME_SITE_URL", "https://anime3rb.com").rstrip("/")
+
+# How long a cached page stays fresh, per page type (seconds)
+PAGE_TTLS = {
+    "search": 15 * 60,      # Search results change as new shows are added
+    "anime": 60 * 60,       # Episode lists grow while a show is airing
+    "episode": 6 * 60 * 60, # Download links are stable once published
+}
+
+# Total size of cached page bodies before least-recently-used entries are evicted
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Async HTTP engine
+HTTP_TIMEOUT = 20               # Seconds per request (connect timeout is shorter)
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_PER_HOST_LIMIT = 4         # Concurrent requests to one host
+HTTP_MAX_CONNECTIONS = 16       # Pooled keep-alive connections overall
+HTTP_STREAM_BUFFER = 8          # Body chunks held for a slow streaming consumer before the download waits
+
+# Request policy for page fetches
+FETCH_DEADLINE = 30             # Seconds one fetch may take, retries and hedges included
+FETCH_RETRIES = 3               # Retries after 5xx, 429, challenges and connection errors
+RETRY_BASE_DELAY = 0.5          # Backoff doubles per retry, with +-50% jitter
+RETRY_MAX_DELAY = 8
+HEDGE_PERCENTILE = 0.95         # Send a duplicate once a request is slower than this share of recent ones (0: never hedge)
+HEDGE_MIN_DELAY = 0.25          # Never hedge sooner than this (seconds)
+HEDGE_HISTORY = 64              # Recent latencies kept per host
+HEDGE_MIN_SAMPLES = 8           # Samples needed before the percentile is trusted
+HEDGE_DEFAULT_DELAY = 1.5       # Hedge delay used until then
+TRANSIENT_ERROR_RE = re.compile(r'HTTP Error (?:429|5\d\d)|timed? ?out|temporar|connection (?:reset|aborted|refused)', re.IGNORECASE)
+
+# Cloudflare clearance and session cookies kept between runs
+SESSION_STATE_FILE = os.path.join(CACHE_DIR, "session.json")
+
+# Batch downloads
+DOWNLOAD_CONNECTIONS = 8            # Parallel range requests across all files
+DOWNLOAD_SEGMENTS = 4               # Range segments per file
+DOWNLOAD_CHUNK = 256 * 1024         # Bytes read per network call
+DOWNLOAD_STATE_INTERVAL = 4 * 1024 * 1024  # Persist resume state after this many bytes per segment
+DOWNLOAD_RETRIES = 3
+QUALITY_ORDER = ("1080p", "1080p HEVC", "720p", "480p")  # Best first; fallback goes down this list
+
+# Headless `resolve` runs
+RESOLVE_WORKERS = 4         # Inputs and episodes resolved at once
+RESOLVE_HOST_RATE = 2.0     # Requests per second to any one host
+
+# Headers the video CDN expects (same as the mpv invocation)
+STREAM_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36",
+    "Referer": "https://videos.vid3rb.com/",
+}
+
+# Local read-ahead proxy between mpv and the video CDN
+PROXY_CHUNK = 2 * 1024 * 1024           # Upstream range request size
+PROXY_READAHEAD = 8                     # Chunks fetched ahead of the playback position
+PROXY_BUFFER_BYTES = 256 * 1024 * 1024  # Memory ring buffer per proxy (least recently used chunks dropped)
+PRELOAD_BYTES = 8 * 1024 * 1024         # Buffered before mpv starts
+
+# Automatic quality selection by measured throughput
+EPISODE_DURATION = 24 * 60              # Assumed episode length when estimating bitrates (seconds)
+THROUGHPUT_PROBE_BYTES = 1024 * 1024    # Ranged read used to measure a CDN host
+THROUGHPUT_HEADROOM = 1.5               # Required throughput / average bitrate to play without stalling
+THROUGHPUT_HISTORY_TTL = 24 * 60 * 60   # Per-host measurements older than this are probed again
+THROUGHPUT_FILE = os.path.join(CACHE_DIR, "throughput.json")
+
+# Racing every listed source (qualities and servers) for the quickest start
+RACE_WORKERS = 6                        # Sources resolved and probed at once
+RACE_PROBE_BYTES = 512 * 1024           # Ranged read per source: time to first byte and early throughput
+RACE_GRACE = 1.0                        # Seconds slower sources get once the first one has been probed
+RACE_TIMEOUT = 15                       # The race is decided with whatever has finished by then
+
+# Persistent mpv player controlled over JSON IPC
+MPV_IPC_TIMEOUT = 5     # Seconds to wait for the socket to appear and for command replies
+
+# Resident daemon (`wit_anime.py daemon`) that later invocations hand their network work to
+DAEMON_SOCKET = os.path.join(CACHE_DIR, "daemon.sock")
+DAEMON_IDLE_TIMEOUT = 2 * 60 * 60   # Exit after this long without a request (seconds, 0 to stay up)
+DAEMON_REQUEST_TIMEOUT = FETCH_DEADLINE + 30    # Longest a client waits on the daemon between two replies
+DAEMON_PARSED_PAGES = 256           # Parsed search, anime and episode pages the daemon keeps in memory
+
+# Download-link prefetching in the episode menu
+PREFETCH_AHEAD = 3      # Episodes after the cursor to resolve in the background
+PREFETCH_WORKERS = 3    # Concurrent page fetches used for prefetching
+
+# Resolved streaming URLs
+STREAM_URL_TTL = 30 * 60        # Used when the URL carries no expiry hint (seconds)
+STREAM_URL_EXPIRY_MARGIN = 60   # Re-resolve this long before a signed URL expires
+
+# Query parameters that carry an absolute unix expiry time on signed CDN URLs
+EXPIRY_PARAMS = ("expires", "expire", "expiry", "exp", "e", "validto", "valid_to", "deadline")
+
+# yt-dlp resolution
+YTDLP_TIMEOUT = 20              # Seconds allowed for one URL extraction
+YTDLP_WORKERS = 4               # Concurrent in-process extractions (source races, headless batches)
+RESOLVER_BACKENDS = ("auto", "library", "subprocess")
+
+# HTML parsing backends, fastest first (selectolax and lxml are optional)
+PARSER_BACKENDS = ("selectolax", "lxml", "html.parser")
+
+# Episode lists
+EPISODE_FIRST_SCREEN = 30       # Episodes parsed before the menu opens; the rest stream in behind it
+EPISODE_STREAM_CHUNK = 64 * 1024
+
+# Search pagination
+SEARCH_MAX_PAGES = 10           # Result pages followed per query
+SEARCH_PAGE_CONCURRENCY = 4     # Result pages fetched at once
+SEARCH_PAGE_RE = re.compile(rb'[?&](?:amp;)?page=(\d+)')
+
+# Class patterns used to locate the download section on episode pages
+DOWNLOAD_SECTION_SELECTOR = 'div.flex.flex-col.rounded-lg.bg-gray-100\\/70.dark\\:bg-dark-700\\/30'
+DOWNLOAD_SECTION_CLASS_RE = re.compile(r'.*rounded-lg.*bg-gray-100.*')
+DOWNLOAD_CONTAINER_CLASS_RE = re.compile(r'.*flex.*flex-col.*rounded-lg.*')
+QUALITY_LABEL_CLASS_RE = re.compile(r'.*font-light.*')
+FILE_SIZE_RE = re.compile(r'\[([\d.]+\s*[^\]]+)\]')
+
+# Obfuscated server registries the player scripts decode in the browser
+# (x6c.js: embed servers, px9.js: download links)
+YONAPLAY_EMBED_RE = re.compile(r'^https://yonaplay\.org/embed\.php\?id=\d+$')
+YONAPLAY_API_KEY = "73503d58-f228-425f-97f1-2d9512f5772c"
+JS_ASSIGNMENT_PREFIX_RE = re.compile(r'(?:^|[^\w$.\'"]|window\s*\.\s*|window\s*\[\s*["\'])\Z')
+DIRECT_MEDIA_RE = re.compile(r'\.(?:mp4|m3u8|mkv|webm)$', re.IGNORECASE)  # Playable without an extractor
+
+# Offline catalog of known titles, searched locally as the user types
+CATALOG_FILE = os.path.join(CACHE_DIR, "catalog.sqlite3")
+CATALOG_MIN_SCORE = 0.35    # Share of the query's trigrams a title must contain to match
+CATALOG_SUGGESTIONS = 8     # Matches listed under the search prompt
+ARABIC_DIACRITICS_RE = re.compile('[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')  # Harakat, Quranic marks, tatweel
+ARABIC_LETTER_FOLDS = str.maketrans({
+    "\u0623": "\u0627", "\u0625": "\u0627", "\u0622": "\u0627", "\u0671": "\u0627",  # Alef variants -> bare alef
+    "\u0629": "\u0647",   # Taa marbuta -> haa
+    "\u0649": "\u064A",   # Alef maqsura -> yaa
+})
+
+# RTL title formatting
+ARABIC_CHARS_RE = re.compile(
+    '[\u0600-\u06FF'   # Arabic
+    '\u0750-\u077F'    # Arabic Supplement
+    '\u08A0-\u08FF'    # Arabic Extended-A
+    '\uFB50-\uFDFF'    # Arabic Presentation Forms-A
+    '\uFE70-\uFEFF]'   # Arabic Presentation Forms-B
+)
+TITLE_WIDTHS = (80, 100)    # Widths titles are shown at (menus, headers)
+RTL_CACHE_SIZE = 8192       # Memoized (title, width) formats
+
+
+def resolve_through_daemon(argv, path=DAEMON_SOCKET):
+    """Hand a whole `resolve` invocation to a running daemon; the exit status, or None to run it here.
+
+    Runs before rich and the rest of the module load. The daemon parses argv and
+    answers {"accepted": {"input", "output"}} when it can serve the invocation,
+    or {"result": null} when not (another command, another --site, --no-cache,
+    --trace...). The input lines are then streamed to it, and the NDJSON records
+    it sends back are written here. Once input has been read there is no falling
+    back: a daemon lost mid-run is reported as a failure.
+    """
+    import socket
+    if "resolve" not in argv or {"-h", "--help", "--no-daemon", "--no-hedge"} & set(argv):
+        return None
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(DAEMON_REQUEST_TIMEOUT)
+        reader = sock.makefile("rb")
+        try:
+            sock.connect(path)
+            sock.sendall(json.dumps({"op": "resolve", "argv": argv, "site": SITE_URL}).encode("utf-8") + b"\n")
+            reply = json.loads(reader.readline())
+        except (OSError, ValueError):
+            return None  # Stale socket or a daemon on its way out: run in-process
+        if "accepted" not in reply:
+            return None
+        
+        options = reply["accepted"]
+        source = sys.stdin if options["input"] == "-" else open(options["input"], encoding="utf-8")
+        output = open(options["output"], "a", encoding="utf-8") if options["output"] else sys.stdout
+        
+        def send_input():
+            try:
+                for line in source:
+                    sock.sendall(line.encode("utf-8"))
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass  # The reply loop reports the lost daemon
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+        
+        # Blocks on the input (stdin may be a terminal) while the records stream back
+        threading.Thread(target=send_input, name="daemon-input", daemon=True).start()
+        try:
+            for line in reader:
+                message = json.loads(line)
+                if "error" in message:
+                    raise RuntimeError(message["error"])
+                for record in message.get("items", ()):
+                    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output.flush()
+                if "result" in message:
+                    failures = message["result"]["failures"]
+                    if failures:
+                        print(f"⚠️ {failures} record(s) failed", file=sys.stderr)
+                    return 1 if failures else 0
+            raise ConnectionError("the daemon closed the connection mid-reply")
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"💥 Daemon error: {e}", file=sys.stderr)
+            return 1
+        except KeyboardInterrupt:
+            print("\n\n👋 Goodbye!")
+            return 0
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    # `resolve` through a running daemon needs nothing below: answer it before the imports and the app
+    status = resolve_through_daemon(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
+from rich.console import Console  # noqa: E402
+from rich.prompt import Prompt  # noqa: E402
+
+
+class Span:
+    """One timed stage; attributes can be added while it runs"""
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.start, time.perf_counter(), self.attrs)
+        return False
+
+
+class NullSpan:
+    """Span used while tracing is off"""
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    """Collects per-stage spans; off (and close to free) unless --trace is given"""
+    def __init__(self):
+        self.enabled = False
+        self.spans = []     # (name, start, end, thread id, thread name, attrs)
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs) if self.enabled else NULL_SPAN
+
+    def record(self, name, start, end, attrs=None):
+        """Add a span measured elsewhere (perf_counter start/end)"""
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        with self.lock:
+            self.spans.append((name, start, end, thread.ident, thread.name, attrs or {}))
+
+    def export(self, path):
+        """Write spans as JSON lines (.jsonl) or, for any other name, a Chrome trace (chrome://tracing, Perfetto)"""
+        with self.lock:
+            spans = list(self.spans)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for name, start, end, _, thread_name, attrs in spans:
+                    f.write(json.dumps({
+                        "name": name, "start_ms": round((start - self.origin) * 1000, 3),
+                        "duration_ms": round((end - start) * 1000, 3), "thread": thread_name, **attrs,
+                    }, ensure_ascii=False) + "\n")
+                return
+            pid = os.getpid()
+            events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+                      for tid, thread_name in {(span[3], span[4]) for span in spans}]
+            events += [
+                {"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                 "ts": round((start - self.origin) * 1e6), "dur": round((end - start) * 1e6), "args": attrs}
+                for name, start, end, tid, _, attrs in spans
+            ]
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+    def summary(self):
+        """[(stage, count, total ms, p50 ms, max ms)] in order of first appearance"""
+        durations = OrderedDict()
+        with self.lock:
+            for name, start, end, *_ in self.spans:
+                durations.setdefault(name, []).append((end - start) * 1000)
+        rows = []
+        for name, values in durations.items():
+            values.sort()
+            rows.append((name, len(values), sum(values), values[len(values) // 2], values[-1]))
+        return rows
+
+
+TRACER = Tracer()
+
+
+def traced(name):
+    """Decorator timing every call of a function as a span"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with TRACER.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def contains_arabic(text):
+    """Check if text contains Arabic characters"""
+    return bool(text) and ARABIC_CHARS_RE.search(text) is not None
+
+
+@functools.lru_cache(maxsize=RTL_CACHE_SIZE)
+def format_rtl_text(text, max_width=60):
+    """Format Arabic text for proper RTL display using arabic_reshaper and bidi"""
+    if not text:
+        return text
+        
+    text = text.strip()
+    
+    if contains_arabic(text):
+        try:
+            import arabic_reshaper
+            from bidi.algorithm import get_display
+            
+            # Truncate if too long, then apply reshaping (connects Arabic
+            # letters properly) and the bidi algorithm (right-to-left display)
+            if len(text) > max_width:
+                text = text[:max_width-3] + "..."
+            return get_display(arabic_reshaper.reshape(text))
+        except Exception:
+            # Fallback to original text if reshaping fails
+            return text[:max_width] if len(text) > max_width else text
+    
+    # For non-Arabic text, just truncate if needed
+    if len(text) > max_width:
+        return text[:max_width-3] + "..."
+    return text
+
+
+def attach_display_titles(records, widths=TITLE_WIDTHS):
+    """Store the formatted title for each display width under record['display']"""
+    for record in records:
+        record["display"] = {width: format_rtl_text(record["title"], width) for width in widths}
+    return records
+
+
+def available_parser_backends():
+    """Return the installed HTML parsing backends, fastest first"""
+    backends = []
+    try:
+        import selectolax.lexbor  # noqa: F401
+        backends.append("selectolax")
+    except ImportError:
+        pass
+    try:
+        import lxml  # noqa: F401
+        backends.append("lxml")
+    except ImportError:
+        pass
+    backends.append("html.parser")
+    return backends
+
+
+def _make_soup(content, backend, parse_only):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(content, "lxml" if backend == "lxml" else "html.parser", parse_only=parse_only)
+
+
+def _class_matches(pattern):
+    """SoupStrainer class filter equivalent to class_=pattern on a full soup"""
+    return lambda value: value is not None and pattern.search(value) is not None
+
+
+def _episode_card_strainer():
+    """SoupStrainer keeping <a> elements and every div.video-data, even one outside a link.
+
+    Episode numbers count all div.video-data on the page, so a card without a
+    link must survive parsing for the cards after it to keep their numbers.
+    """
+    from bs4 import SoupStrainer
+    
+    def keep(name, attrs):
+        return name == "a" or (name == "div" and "video-data" in ((attrs or {}).get("class") or "").split())
+    
+    class EpisodeCards(SoupStrainer):
+        def allow_tag_creation(self, nsprefix, name, attrs):  # bs4 >= 4.13
+            return keep(name, attrs)
+        
+        def allow_string_creation(self, string):  # bs4 >= 4.13
+            return False
+        
+        def search_tag(self, markup_name=None, markup_attrs={}):  # bs4 < 4.13, while parsing
+            if isinstance(markup_name, str):
+                return keep(markup_name, markup_attrs)
+            return super().search_tag(markup_name, markup_attrs)
+    
+    return EpisodeCards()
+
+
+def _quality_from_label(quality_text):
+    if "1080p HEVC" in quality_text:
+        return "1080p HEVC"
+    elif "1080p" in quality_text:
+        return "1080p"
+    elif "720p" in quality_text:
+        return "720p"
+    elif "480p" in quality_text:
+        return "480p"
+    return "Unknown"
+
+
+def _download_entry(quality_text, url, button_text):
+    size = "Unknown"
+    size_match = FILE_SIZE_RE.search(button_text)
+    if size_match:
+        size = size_match.group(1)
+    return {
+        "url": url,
+        "size": size,
+        "quality_text": quality_text
+    }
+
+
+@traced("parse.search")
+def parse_search_results(content, backend="html.parser"):
+    """Parse a search page into [{"title", "url"}, ...]"""
+    results = []
+    if backend == "selectolax":
+        from selectolax.lexbor import LexborHTMLParser
+        tree = LexborHTMLParser(content)
+        for card in tree.css('div[class*="title-card"]'):
+            title_element = card.css_first('h2.title-name')
+            url_element = card.css_first('a.btn.btn-md.btn-plain.w-full')
+            if title_element and url_element:
+                results.append({"title": title_element.text().strip(), "url": url_element.attributes["href"]})
+        return results
+    
+    from bs4 import SoupStrainer
+    
+    # Only build the result cards, not the whole page
+    strainer = SoupStrainer("div", class_=lambda value: value is not None and "title-card" in value)
+    soup = _make_soup(content, backend, strainer)
+    for title in soup.select('div[class*="title-card"]'):
+        title_element = title.select_one('h2.title-name')
+        url_element = title.select_one('a.btn.btn-md.btn-plain.w-full')
+        if title_element and url_element:
+            results.append({"title": title_element.text.strip(), "url": url_element['href']})
+    return results
+
+
+def parse_search_page_count(content):
+    """Highest page number linked from a search page's pagination (1 when unpaginated)"""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return max([1] + [int(page) for page in SEARCH_PAGE_RE.findall(content)])
+
+
+@traced("parse.episodes")
+def parse_episodes(content, backend="html.parser"):
+    """Parse an anime page into [{'num', 'title', 'url'}, ...]"""
+    episodes = []
+    if backend == "selectolax":
+        from selectolax.lexbor import LexborHTMLParser
+        tree = LexborHTMLParser(content)
+        cards = tree.css('div.video-data')
+        if any(card.css_first('a') is not None for card in cards):
+            # HTML5 parsing moves a link nested in a card's link elsewhere; the tree builders keep the nesting, like the baseline
+            return parse_episodes(content, "lxml" if "lxml" in available_parser_backends() else "html.parser")
+        for i, episode in enumerate(cards):
+            episode_url_element = episode.parent
+            while episode_url_element is not None and episode_url_element.tag != 'a':
+                episode_url_element = episode_url_element.parent
+            episode_title_element = episode.css_first('p.font-light.text-sm')
+            if episode_url_element is not None and episode_title_element:
+                episodes.append({
+                    'num': i + 1,
+                    'title': episode_title_element.text().strip(),
+                    'url': episode_url_element.attributes['href']
+                })
+        return episodes
+    
+    # Episode cards are links wrapping div.video-data; skip everything outside them
+    soup = _make_soup(content, backend, _episode_card_strainer())
+    for i, episode in enumerate(soup.select('div.video-data')):
+        episode_url_element = episode.find_parent('a')
+        episode_title_element = episode.select_one('p.font-light.text-sm')
+        if episode_url_element and episode_title_element:
+            episodes.append({
+                'num': i + 1,
+                'title': episode_title_element.text.strip(),
+                'url': episode_url_element['href']
+            })
+    return episodes
+
+
+class EpisodeStreamParser:
+    """Incremental anime-page parser: feed() text chunks, drain() finished episode records.
+
+    Matches parse_episodes (div.video-data inside an <a>, title from
+    p.font-light.text-sm) without building a tree; only the episode being read
+    is kept.
+    """
+    def __init__(self):
+        from html.parser import HTMLParser
+        
+        owner = self
+        
+        class Parser(HTMLParser):
+            def handle_starttag(self, tag, attrs):
+                owner._start(tag, attrs)
+            
+            def handle_endtag(self, tag):
+                owner._end(tag)
+            
+            def handle_data(self, data):
+                if owner.title_depth:
+                    owner.title.append(data)
+        
+        self.parser = Parser(convert_charrefs=True)
+        self.ready = []
+        self.count = 0          # div.video-data seen, the episode number of the current one
+        self.anchors = []       # hrefs of the open <a>s, innermost last
+        self.href = None        # href of the <a> enclosing the current div.video-data
+        self.div_depth = 0      # Open <div>s inside the current div.video-data (0: outside)
+        self.title_depth = 0    # Open <p>s inside the title paragraph (0: outside)
+        self.title = []
+        self.title_done = False
+
+    def _start(self, tag, attrs):
+        if tag == "a":
+            self.anchors.append(dict(attrs).get("href"))
+        elif tag == "div":
+            if self.div_depth:
+                self.div_depth += 1
+            elif "video-data" in (dict(attrs).get("class") or "").split():
+                self.count += 1
+                self.div_depth = 1
+                self.href = self.anchors[-1] if self.anchors else None  # Like find_parent('a'): links inside the card don't count
+                self.title = []
+                self.title_done = False
+        elif tag == "p" and self.div_depth:
+            if self.title_depth:
+                self.title_depth += 1
+            elif not self.title_done and {"font-light", "text-sm"} <= set((dict(attrs).get("class") or "").split()):
+                self.title_depth = 1
+
+    def _end(self, tag):
+        if tag == "a":
+            if self.anchors:
+                self.anchors.pop()
+        elif tag == "p" and self.title_depth:
+            self.title_depth -= 1
+            self.title_done = not self.title_depth
+        elif tag == "div" and self.div_depth:
+            self.div_depth -= 1
+            if not self.div_depth and self.href is not None and self.title_done:
+                self.ready.append({"num": self.count, "title": "".join(self.title).strip(), "url": self.href})
+            if not self.div_depth:
+                self.title = []
+
+    def feed(self, text):
+        self.parser.feed(text)
+
+    def close(self):
+        self.parser.close()
+
+    def drain(self):
+        ready, self.ready = self.ready, []
+        return ready
+
+
+def iter_parse_episodes(chunks):
+    """Yield episode records from an anime page given as byte chunks, as soon as each one is complete"""
+    import codecs
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = EpisodeStreamParser()
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+        yield from parser.drain()
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    yield from parser.drain()
+
+
+def iter_chunks(content, size=EPISODE_STREAM_CHUNK):
+    for offset in range(0, len(content), size):
+        yield content[offset:offset + size]
+
+
+class EpisodeList(Sequence):
+    """Append-only episode store kept as parallel arrays, with each URL prefix stored once.
+
+    Items read back as {"num", "url", "title"} dicts built on access. Appends
+    from one loader thread are safe against readers: the title list grows last,
+    so len() never counts a half-written row.
+    """
+    def __init__(self, episodes=()):
+        self._prefixes = []          # Distinct URL prefixes (everything up to the last "/")
+        self._prefix_ids = {}
+        self._prefix = array("I")
+        self._suffixes = []
+        self._nums = array("q")
+        self._titles = []
+        self._by_num = {}            # Episode number -> index of its first row
+        self._folded = []            # normalize_title() of each title, filled on the first filter
+        self.extend(episodes)
+
+    def append(self, episode):
+        prefix, _, suffix = episode["url"].rpartition("/")
+        prefix_id = self._prefix_ids.get(prefix)
+        if prefix_id is None:
+            prefix_id = self._prefix_ids[prefix] = len(self._prefixes)
+            self._prefixes.append(prefix + "/" if _ else "")
+        self._by_num.setdefault(episode["num"], len(self._titles))
+        self._nums.append(episode["num"])
+        self._prefix.append(prefix_id)
+        self._suffixes.append(suffix)
+        self._titles.append(episode["title"])
+
+    def extend(self, episodes):
+        for episode in episodes:
+            self.append(episode)
+
+    def __len__(self):
+        return len(self._titles)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("episode index out of range")
+        return {
+            "num": self._nums[index],
+            "url": self._prefixes[self._prefix[index]] + self._suffixes[index],
+            "title": self._titles[index],
+        }
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def index_of(self, num):
+        """Index of episode number `num`, or None"""
+        return self._by_num.get(num)
+
+    def matches(self, text, within=None, start=0, stop=None):
+        """Indices whose episode number starts with `text` or whose title contains it.
+
+        `within` narrows an earlier result (for a query that extends the
+        previous one); otherwise rows start..stop are scanned.
+        """
+        stop = len(self) if stop is None else stop
+        needle = normalize_title(text)
+        for index in range(len(self._folded), stop):
+            self._folded.append(normalize_title(self._titles[index]))
+        candidates = within if within is not None else range(start, stop)
+        return [
+            index for index in candidates
+            if str(self._nums[index]).startswith(text) or needle in self._folded[index]
+        ]
+
+
+@traced("parse.links")
+def parse_download_links(content, backend="html.parser"):
+    """Parse an episode page into {quality: {"url", "size", "quality_text"}}, or None without a download section"""
+    download_links = {}
+    if backend == "selectolax":
+        from selectolax.lexbor import LexborHTMLParser
+        tree = LexborHTMLParser(content)
+        download_section = tree.css_first(DOWNLOAD_SECTION_SELECTOR)
+        if download_section is None:
+            download_section = next(
+                (div for div in tree.css('div') if DOWNLOAD_SECTION_CLASS_RE.search(div.attributes.get('class') or '')),
+                None
+            )
+        if download_section is None:
+            return None
+        for container in download_section.css('div'):
+            if not DOWNLOAD_CONTAINER_CLASS_RE.search(container.attributes.get('class') or ''):
+                continue
+            label_element = next(
+                (label for label in container.css('label') if QUALITY_LABEL_CLASS_RE.search(label.attributes.get('class') or '')),
+                None
+            )
+            if label_element is None:
+                continue
+            quality_text = label_element.text(separator='', strip=True)
+            download_link = container.css_first('a[href]')
+            if download_link is not None:
+                download_links[_quality_from_label(quality_text)] = _download_entry(
+                    quality_text, download_link.attributes['href'], download_link.text(separator='', strip=True)
+                )
+        return download_links
+    
+    from bs4 import SoupStrainer
+    
+    # Only the download section is needed from the (large) episode page
+    soup = _make_soup(content, backend, SoupStrainer("div", class_=_class_matches(DOWNLOAD_SECTION_CLASS_RE)))
+    download_section = soup.select_one(DOWNLOAD_SECTION_SELECTOR)
+    if not download_section:
+        download_section = soup.find('div', class_=DOWNLOAD_SECTION_CLASS_RE)
+    if not download_section:
+        return None
+    
+    for container in download_section.find_all('div', class_=DOWNLOAD_CONTAINER_CLASS_RE):
+        label_element = container.find('label', class_=QUALITY_LABEL_CLASS_RE)
+        if not label_element:
+            continue
+        quality_text = label_element.get_text(strip=True)
+        download_link = container.find('a', href=True)
+        if download_link:
+            download_links[_quality_from_label(quality_text)] = _download_entry(
+                quality_text, download_link['href'], download_link.get_text(strip=True)
+            )
+    return download_links
+
+
+def _js_literal_end(text, start):
+    """Index just past the JS string/array/object literal starting at text[start], or None"""
+    depth = 0
+    quote = None
+    index = start
+    while index < len(text):
+        char = text[index]
+        if quote:
+            if char == "\\":
+                index += 1
+            elif char == quote:
+                quote = None
+                if not depth:
+                    return index + 1
+        elif char in "\"'":
+            quote = char
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if not depth:
+                return index + 1
+        elif not depth:
+            return None
+        index += 1
+    return None
+
+
+def _js_single_quoted(match):
+    return json.dumps(re.sub(r"\\(.)", r"\1", match.group(1)))
+
+
+def js_literal(text, name):
+    """Value of the first `name = <literal>` (or window.name / window['name']) assignment in text, or None.
+
+    Plain JSON is decoded directly; single-quoted strings and bare object
+    keys are rewritten to JSON first.
+    """
+    pattern = re.escape(name) + r'(?:["\']\s*\])?\s*=(?!=)\s*'
+    decoder = json.JSONDecoder()
+    for match in re.finditer(pattern, text):
+        # Literal-first pattern for speed; the name must not be part of a longer name or another object
+        if not JS_ASSIGNMENT_PREFIX_RE.search(text, max(0, match.start() - 16), match.start()):
+            continue
+        start = match.end()
+        try:
+            return decoder.raw_decode(text, start)[0]
+        except ValueError:
+            pass
+        end = _js_literal_end(text, start)
+        if end is None:
+            continue
+        literal = re.sub(r"'((?:[^'\\]|\\.)*)'", _js_single_quoted, text[start:end])
+        literal = re.sub(r'([{,]\s*)([A-Za-z_$][\w$]*)\s*:', r'\1"\2":', literal)
+        try:
+            return json.loads(literal)
+        except ValueError:
+            continue
+    return None
+
+
+def _b64decode(text):
+    import base64
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def decode_x6c_resource(resource, config):
+    """Embed URL from a resourceRegistry entry and its configRegistry settings, as x6c.js computes it"""
+    data = re.sub(r'[^A-Za-z0-9+/=]', '', resource[::-1])
+    offset = int(config["d"][int(_b64decode(config["k"]).decode())])
+    url = _b64decode(data).decode("latin-1")[:-offset] if offset else ""  # JS slice(0, -0) is empty
+    if YONAPLAY_EMBED_RE.match(url):
+        url += "&apiKey=" + YONAPLAY_API_KEY
+    return url
+
+
+def _xor_hex(chunk, secret):
+    data = bytes.fromhex(chunk)
+    key = (secret * (len(data) // len(secret) + 1))[:len(data)]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(key, "big")).to_bytes(len(data), "big")
+
+
+def decode_px9_registry(secret, count, parts, orders, auth=None):
+    """[(url, auth), ...] from the px9.js globals.
+
+    secret is _m.r (base64), count _t.l, parts the _p{i} lists of hex chunks,
+    orders _s (hex-encoded JSON positions of each chunk) and auth _a. An entry
+    whose globals are missing or malformed decodes to a None url, as px9.js
+    returns null for an index it has no cache entry for.
+    """
+    key = _b64decode(secret)
+    if not key:
+        raise ValueError("Empty registry key")
+    entries = []
+    for i in range(count):
+        url = None
+        try:
+            positions = json.loads(_xor_hex(orders[i], key).decode("latin-1"))
+            if isinstance(parts[i], list) and all(isinstance(position, int) and position >= 0 for position in positions):
+                arranged = [b""] * (max(positions) + 1 if positions else 0)
+                for position, chunk in zip(positions, parts[i]):
+                    arranged[position] = _xor_hex(chunk, key)
+                content = b"".join(arranged)
+                try:
+                    url = content.decode("utf-8")
+                except UnicodeDecodeError:
+                    url = content.decode("latin-1")
+        except (IndexError, TypeError, ValueError):
+            pass
+        entries.append((url, auth[i] if isinstance(auth, list) and i < len(auth) else None))
+    return entries
+
+
+def _registry_anchors(text):
+    """Server names by data-server-id (#episode-servers links) and labels by data-index (.download-link)"""
+    from html.parser import HTMLParser
+    
+    servers, downloads = {}, {}
+    
+    class Parser(HTMLParser):
+        current = None  # (mapping, key, text parts) of the link being read
+        
+        def handle_starttag(self, tag, attrs):
+            attrs = dict(attrs)
+            if attrs.get("data-server-id") is not None:
+                self.current = (servers, attrs["data-server-id"], [])
+            elif "download-link" in (attrs.get("class") or "").split() and attrs.get("data-index") is not None:
+                self.current = (downloads, attrs["data-index"], [])
+        
+        def handle_endtag(self, tag):
+            if self.current and tag in ("a", "button", "li"):
+                mapping, key, parts = self.current
+                mapping[key] = " ".join("".join(parts).split())
+                self.current = None
+        
+        def handle_data(self, data):
+            if self.current:
+                self.current[2].append(data)
+    
+    parser = Parser(convert_charrefs=True)
+    parser.feed(text)
+    parser.close()
+    return servers, downloads
+
+
+@traced("parse.registry")
+def parse_server_registry(content):
+    """Decode the player's server registries in an episode page.
+
+    Returns [{"name", "url", "kind": "download" | "embed", "auth"}, ...] in page
+    order, downloads first, or None when the page carries neither registry.
+    """
+    text = content.decode("utf-8", "replace") if isinstance(content, bytes) else content
+    entries = []
+    found = False  # a registry that fails to decode counts as no registry
+    servers, downloads = _registry_anchors(text)
+    
+    secret, total = js_literal(text, "_m"), js_literal(text, "_t")
+    try:
+        orders = js_literal(text, "_s")
+        orders = orders if isinstance(orders, list) else []
+        # Entries past the end of _s have no chunk order and decode to nothing
+        count = min(int(total.get("l", 0)), len(orders)) if isinstance(secret, dict) and isinstance(total, dict) else 0
+        parts = [js_literal(text, f"_p{i}") for i in range(count)]
+        decoded = decode_px9_registry(secret["r"], count, parts, orders, js_literal(text, "_a")) if count > 0 else []
+    except (KeyError, TypeError, ValueError):  # binascii.Error is a ValueError
+        decoded = []
+    if any(url for url, auth in decoded):
+        found = True
+        for index, (url, auth) in enumerate(decoded):
+            if url:
+                name = downloads.get(str(index)) or f"Download {index + 1}"
+                entries.append({"name": name, "url": url, "kind": "download", "auth": auth})
+    
+    resources, configs = js_literal(text, "resourceRegistry"), js_literal(text, "configRegistry")
+    if isinstance(resources, dict) and isinstance(configs, dict):
+        order = list(servers) + [key for key in resources if key not in servers]
+        for key in order:
+            if key in resources and key in configs:
+                try:
+                    url = decode_x6c_resource(resources[key], configs[key])
+                except (KeyError, IndexError, TypeError, ValueError):
+                    continue
+                found = True
+                if url:
+                    entries.append({"name": servers.get(key) or f"Server {key}", "url": url, "kind": "embed", "auth": None})
+    
+    return entries if found else None
+
+
+def registry_download_links(entries):
+    """Registry entries in the {quality: {"url", "size", "quality_text"}} shape of parse_download_links"""
+    links = {}
+    for entry in entries:
+        label = entry["name"] if entry["kind"] == "download" else f"{entry['name']} (embed)"
+        key, n = label, 2
+        while key in links:
+            key, n = f"{label} #{n}", n + 1
+        links[key] = _download_entry(label, entry["url"], "")
+        links[key]["kind"] = entry["kind"]
+    return links
+
+class CachedResponse:
+    """Minimal response object returned by AnimeScraperUI.fetch_page"""
+    def __init__(self, status_code, content, from_cache=False, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.from_cache = from_cache
+        self.headers = headers or {}
+
+
+class ResponseCache:
+    """SQLite-backed page cache keyed by URL with per-type TTL and LRU eviction"""
+    def __init__(self, path=None, max_bytes=CACHE_MAX_BYTES):
+        self.path = path or os.path.join(CACHE_DIR, "pages.sqlite3")
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        import sqlite3
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY,"
+            " page_type TEXT NOT NULL,"
+            " content BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " stored_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at)")
+        self.db.commit()
+
+    def get(self, url, page_type):
+        """Return cached body for url if still fresh, else None"""
+        ttl = PAGE_TTLS.get(page_type, 0)
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT content, stored_at FROM pages WHERE url = ?", (url,)).fetchone()
+            if not row:
+                return None
+            content, stored_at = row
+            if now - stored_at > ttl:
+                self.db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self.db.commit()
+                return None
+            self.db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (now, url))
+            self.db.commit()
+            return content
+
+    def put(self, url, page_type, content):
+        """Store a page body and evict least-recently-used entries over the size cap"""
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO pages (url, page_type, content, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, page_type, content, len(content), now, now)
+            )
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total > self.max_bytes:
+                for old_url, size in self.db.execute("SELECT url, size FROM pages ORDER BY accessed_at").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self.db.execute("DELETE FROM pages WHERE url = ?", (old_url,))
+                    total -= size
+            self.db.commit()
+
+    def entries(self, page_type):
+        """Yield (url, content) for every stored page of a type, fresh or not"""
+        with self.lock:
+            rows = self.db.execute("SELECT url, content FROM pages WHERE page_type = ?", (page_type,)).fetchall()
+        yield from rows
+
+    def clear(self):
+        """Drop every cached page"""
+        with self.lock:
+            self.db.execute("DELETE FROM pages")
+            self.db.commit()
+
+
+def normalize_title(text):
+    """Fold a title for matching: Arabic letter variants unified, diacritics dropped, Latin casefolded"""
+    text = unicodedata.normalize("NFKC", text)
+    text = ARABIC_DIACRITICS_RE.sub("", text).translate(ARABIC_LETTER_FOLDS).casefold()
+    return " ".join(re.findall(r"\w+", text))
+
+
+def title_trigrams(normalized):
+    """Trigrams of each word padded with spaces, so word starts and short words match too"""
+    grams = set()
+    for word in normalized.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class CatalogIndex:
+    """On-disk trigram index of known anime titles, updated as search pages are seen"""
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        import sqlite3
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS titles ("
+            " id INTEGER PRIMARY KEY,"
+            " url TEXT UNIQUE NOT NULL,"
+            " title TEXT NOT NULL,"
+            " seen_at REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS grams ("
+            " gram TEXT NOT NULL,"
+            " title_id INTEGER NOT NULL,"
+            " PRIMARY KEY (gram, title_id)) WITHOUT ROWID"
+        )
+        self.db.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+
+    def add(self, records):
+        """Insert new titles and re-index renamed ones; returns how many changed"""
+        now = time.time()
+        changed = 0
+        with self.lock:
+            for record in records:
+                row = self.db.execute("SELECT id, title FROM titles WHERE url = ?", (record["url"],)).fetchone()
+                if row and row[1] == record["title"]:
+                    self.db.execute("UPDATE titles SET seen_at = ? WHERE id = ?", (now, row[0]))
+                    continue
+                if row:
+                    title_id = row[0]
+                    self.db.execute("UPDATE titles SET title = ?, seen_at = ? WHERE id = ?", (record["title"], now, title_id))
+                    self.db.execute("DELETE FROM grams WHERE title_id = ?", (title_id,))
+                else:
+                    title_id = self.db.execute(
+                        "INSERT INTO titles (url, title, seen_at) VALUES (?, ?, ?)", (record["url"], record["title"], now)
+                    ).lastrowid
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO grams (gram, title_id) VALUES (?, ?)",
+                    [(gram, title_id) for gram in title_trigrams(normalize_title(record["title"]))]
+                )
+                changed += 1
+            self.db.commit()
+        return changed
+
+    def search(self, query, limit=CATALOG_SUGGESTIONS):
+        """Titles sharing the most trigrams with query (typo and prefix tolerant), best first"""
+        grams = title_trigrams(normalize_title(query))
+        if not grams:
+            return []
+        needed = max(1, math.ceil(len(grams) * CATALOG_MIN_SCORE))
+        placeholders = ",".join("?" * len(grams))
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT t.title, t.url, COUNT(*) AS hits FROM grams g JOIN titles t ON t.id = g.title_id"
+                f" WHERE g.gram IN ({placeholders}) GROUP BY g.title_id HAVING hits >= ?"
+                " ORDER BY hits DESC, length(t.title) LIMIT ?",
+                (*grams, needed, limit)
+            ).fetchall()
+        return [{"title": title, "url": url} for title, url, _ in rows]
+
+
+def is_cloudflare_challenge(status_code, headers, content):
+    """Check whether a response is a Cloudflare challenge page rather than real content"""
+    if status_code not in (403, 429, 503):
+        return False
+    if headers.get("cf-mitigated") == "challenge":
+        return True
+    if "cloudflare" not in headers.get("server", "").lower():
+        return False
+    head = content[:4096]
+    return b"challenge-platform" in head or b"Just a moment" in head or b"cf-chl" in head
+
+
+class SessionStore:
+    """Saves the scraper's cookies and User-Agent so Cloudflare clearance survives restarts.
+
+    Clearance is bound to the User-Agent it was issued for, so both are restored
+    together. Nothing is checked at startup: if the saved clearance is no longer
+    accepted the site challenges again, cloudscraper solves it and the new
+    cookies are saved.
+    """
+    def __init__(self, scraper, path=SESSION_STATE_FILE):
+        self.scraper = scraper
+        self.path = path
+        self.lock = threading.Lock()
+        self.saved_signature = None
+
+    def _signature(self):
+        return (
+            self.scraper.headers.get("User-Agent"),
+            tuple(sorted((c.domain, c.path, c.name, c.value) for c in self.scraper.cookies)),
+        )
+
+    def load(self):
+        """Restore saved cookies and User-Agent into the scraper; returns True if anything was loaded"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        
+        now = time.time()
+        cookies = [c for c in state.get("cookies", []) if not c.get("expires") or c["expires"] > now]
+        if not cookies:
+            return False
+        if state.get("user_agent"):
+            self.scraper.headers["User-Agent"] = state["user_agent"]
+        for c in cookies:
+            self.scraper.cookies.set(
+                c["name"], c["value"], domain=c["domain"], path=c["path"],
+                expires=c.get("expires"), secure=c.get("secure", False)
+            )
+        self.saved_signature = self._signature()
+        return True
+
+    def save_if_changed(self):
+        """Write the state file when cookies or User-Agent changed since the last save/load"""
+        with self.lock:
+            signature = self._signature()
+            if signature == self.saved_signature:
+                return
+            state = {
+                "saved_at": time.time(),
+                "user_agent": self.scraper.headers.get("User-Agent"),
+                "cookies": [
+                    {
+                        "name": c.name, "value": c.value, "domain": c.domain, "path": c.path,
+                        "expires": c.expires, "secure": bool(c.secure),
+                    }
+                    for c in self.scraper.cookies
+                ],
+            }
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                # Cookies are credentials: keep the file private to the user
+                fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.path)
+                self.saved_signature = signature
+            except OSError:
+                pass
+
+
+class AsyncFetcher:
+    """asyncio fetch layer on a background event loop with pooled keep-alive connections.
+
+    Requests go through httpx (HTTP/2 when the h2 package is installed) using the
+    cookies and User-Agent of the cloudscraper session. Cloudflare challenges are
+    handed to cloudscraper, whose refreshed clearance cookies are then reused.
+    Without httpx every request runs on the cloudscraper session in a worker thread.
+    """
+    def __init__(self, scraper, per_host=HTTP_PER_HOST_LIMIT, timeout=HTTP_TIMEOUT, session_store=None,
+                 deadline=FETCH_DEADLINE, retries=FETCH_RETRIES, hedge_percentile=HEDGE_PERCENTILE):
+        self.scraper = scraper
+        self.session_store = session_store
+        self.per_host = per_host
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.hedge_percentile = hedge_percentile
+        self.client = None
+        self.host_limits = {}  # host -> asyncio.Semaphore
+        self.latencies = {}    # host -> recent successful response times (seconds), newest last
+        self.stats = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0}
+        try:
+            import httpx
+            self.httpx = httpx
+        except ImportError:  # Optional: pooled async HTTP; falls back to the cloudscraper session
+            self.httpx = None
+        import asyncio
+        self.asyncio = asyncio
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="http-loop", daemon=True)
+        self.thread.start()
+
+    def submit(self, url, headers=None):
+        """Schedule a GET on the event loop; returns a concurrent.futures.Future of a CachedResponse"""
+        return self.asyncio.run_coroutine_threadsafe(self.fetch(url, headers), self.loop)
+
+    def get(self, url, headers=None):
+        """Blocking GET from any thread"""
+        return self.submit(url, headers).result(timeout=self.deadline + self.timeout)
+
+    def _client(self):
+        if self.client is None:
+            try:
+                import h2  # noqa: F401
+                http2 = True
+            except ImportError:
+                http2 = False
+            self.client = self.httpx.AsyncClient(
+                http2=http2,
+                follow_redirects=True,
+                timeout=self.httpx.Timeout(self.timeout, connect=HTTP_CONNECT_TIMEOUT),
+                limits=self.httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS),
+            )
+        return self.client
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.host_limits:
+            self.host_limits[host] = self.asyncio.Semaphore(self.per_host)
+        return self.host_limits[host]
+
+    def _scraper_get(self, url, headers):
+        response = self.scraper.get(url, headers=headers, timeout=self.timeout)
+        if self.session_store:
+            # Persist clearance obtained by solving a challenge
+            self.session_store.save_if_changed()
+        return CachedResponse(response.status_code, response.content, headers=response.headers)
+
+    @staticmethod
+    def retryable(response):
+        """Worth another try: server errors, rate limiting and unsolved Cloudflare challenges"""
+        return (response.status_code >= 500 or response.status_code == 429
+                or is_cloudflare_challenge(response.status_code, response.headers, response.content))
+
+    def hedge_delay(self, url):
+        """Seconds after which a duplicate request is sent, or None when hedging is off"""
+        if not self.hedge_percentile:
+            return None
+        samples = self.latencies.get(urlsplit(url).netloc)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        ordered = sorted(samples)
+        return max(HEDGE_MIN_DELAY, ordered[min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))])
+
+    async def fetch(self, url, headers=None):
+        """GET with a deadline, jittered exponential backoff on retryable answers, and hedging"""
+        deadline = self.loop.time() + self.deadline
+        self.stats["requests"] += 1
+        attempt = 0
+        while True:
+            response, error = None, None
+            try:
+                response = await self._hedged(url, headers, deadline)
+                if not self.retryable(response):
+                    return response
+            except Exception as e:
+                error = e
+            
+            attempt += 1
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            retry_after = response.headers.get("retry-after", "") if response is not None else ""
+            if retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            if attempt > self.retries or self.loop.time() + delay >= deadline:
+                if response is not None:
+                    return response
+                raise error
+            self.stats["retries"] += 1
+            await self.asyncio.sleep(delay)
+
+    async def _hedged(self, url, headers, deadline):
+        """Run one attempt, adding a duplicate if it is slower than usual; first good answer wins"""
+        first = self.asyncio.ensure_future(self._timed_attempt(url, headers))
+        tasks = {first}
+        hedge_after = self.hedge_delay(url)
+        try:
+            if hedge_after is not None and self.loop.time() + hedge_after < deadline:
+                done, _ = await self.asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    self.stats["hedges"] += 1
+                    tasks.add(self.asyncio.ensure_future(self._timed_attempt(url, headers)))
+            
+            result = None
+            while tasks:
+                done, tasks = await self.asyncio.wait(
+                    tasks, timeout=max(0, deadline - self.loop.time()), return_when=self.asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError(f"No response from {urlsplit(url).netloc} before the deadline")
+                for task in done:
+                    if task.exception() is None and not self.retryable(task.result()):
+                        if task is not first:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    result = task
+            return result.result()  # Every attempt failed: report the last one
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _timed_attempt(self, url, headers):
+        started = self.loop.time()
+        response = await self._attempt(url, headers)
+        if not self.retryable(response):
+            samples = self.latencies.setdefault(urlsplit(url).netloc, [])
+            samples.append(self.loop.time() - started)
+            del samples[:-HEDGE_HISTORY]
+        return response
+
+    def _request_headers(self, client, headers):
+        """Share clearance cookies and the matching User-Agent with cloudscraper"""
+        for cookie in self.scraper.cookies:
+            client.cookies.set(cookie.name, cookie.value, domain=cookie.domain, path=cookie.path)
+        request_headers = {
+            name: value for name, value in self.scraper.headers.items()
+            if name.lower() in ("user-agent", "accept", "accept-language")
+        }
+        if headers:
+            request_headers.update(headers)
+        return request_headers
+
+    def stream(self, url, headers=None):
+        """Iterate over the body of a 200 response as it arrives, or return None.
+
+        Connection errors before the response arrives are retried with the
+        backoff and deadline of fetch(). None (no httpx, another status, a
+        challenge) means the caller should use get(), which retries and solves
+        challenges. At most HTTP_STREAM_BUFFER chunks wait for a slow consumer;
+        beyond that the download pauses until it catches up.
+        """
+        if self.httpx is None:
+            return None
+        opened = Future()  # (status, chunk queue) once the response headers are in
+        
+        async def produce():
+            chunks = self.asyncio.Queue(HTTP_STREAM_BUFFER)
+            deadline = self.loop.time() + self.deadline
+            self.stats["requests"] += 1
+            attempt = 0
+            try:
+                while not opened.done():
+                    try:
+                        async with self._host_limit(url):
+                            client = self._client()
+                            async with client.stream("GET", url, headers=self._request_headers(client, headers)) as response:
+                                opened.set_result((response.status_code, chunks))
+                                if response.status_code == 200:
+                                    async for chunk in response.aiter_bytes():
+                                        await chunks.put(chunk)
+                        await chunks.put(None)
+                    except Exception:
+                        if opened.done():
+                            raise  # Part of the body was already handed out
+                        attempt += 1
+                        delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                        if attempt > self.retries or self.loop.time() + delay >= deadline:
+                            raise
+                        self.stats["retries"] += 1
+                        await self.asyncio.sleep(delay)
+            except Exception as e:
+                if opened.done():
+                    await chunks.put(e)
+                else:
+                    opened.set_exception(e)
+        
+        task = self.asyncio.run_coroutine_threadsafe(produce(), self.loop)
+        try:
+            status, chunks = opened.result(timeout=self.deadline + self.timeout)
+        except BaseException:
+            task.cancel()
+            raise
+        if status != 200:
+            return None
+        
+        def body():
+            try:
+                while True:
+                    chunk = self.asyncio.run_coroutine_threadsafe(chunks.get(), self.loop).result(timeout=self.timeout)
+                    if chunk is None:
+                        return
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    yield chunk
+            finally:
+                task.cancel()  # Consumer gave up early: drop the connection instead of waiting on it
+        return body()
+
+    async def _attempt(self, url, headers):
+        async with self._host_limit(url):
+            if self.httpx is None:
+                return await self.loop.run_in_executor(None, self._scraper_get, url, headers)
+            
+            client = self._client()
+            response = await client.get(url, headers=self._request_headers(client, headers))
+            if is_cloudflare_challenge(response.status_code, response.headers, response.content):
+                # Let cloudscraper solve the challenge; its cookies are picked up next time
+                return await self.loop.run_in_executor(None, self._scraper_get, url, headers)
+            return CachedResponse(response.status_code, response.content, headers=response.headers)
+
+    def close(self):
+        if self.client is not None:
+            self.asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def parse_episode_range(spec, total):
+    """Parse '1-24', '3,5,7-9' or 'all' into a sorted list of episode numbers within 1..total"""
+    if spec.strip().lower() in ("", "all"):
+        return list(range(1, total + 1))
+    numbers = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, _, last = part.partition("-")
+            first = int(first) if first.strip() else 1
+            last = int(last) if last.strip() else total
+            numbers.update(range(first, last + 1))
+        else:
+            numbers.add(int(part))
+    return sorted(n for n in numbers if 1 <= n <= total)
+
+
+def parse_rate(text):
+    """Parse a byte rate such as '800K', '5M' or '1.5G' (per second); None/'' means unlimited"""
+    if not text:
+        return None
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?)i?B?\s*', text, re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid rate: {text}")
+    return int(float(match.group(1)) * 1024 ** " KMG".index(match.group(2).upper() or " "))
+
+
+def parse_size(text):
+    """Parse a file size such as '350 MB' or '1.2 GB' into bytes; None when unknown"""
+    match = re.search(r'([\d.]+)\s*([KMG])i?B', text or "", re.IGNORECASE)
+    if not match:
+        return None
+    try:
+        return int(float(match.group(1)) * 1024 ** " KMG".index(match.group(2).upper()))
+    except ValueError:
+        return None
+
+
+def probe_stream(session, url, headers=None, length=THROUGHPUT_PROBE_BYTES):
+    """Ranged read of the first `length` bytes: (seconds to the first byte, bytes/second after it or None)"""
+    requested = time.monotonic()
+    with session.get(url, headers={**(headers or STREAM_HEADERS), "Range": f"bytes=0-{length - 1}"},
+                     stream=True, timeout=15) as response:
+        if response.status_code >= 400:
+            raise IOError(f"HTTP {response.status_code}")
+        chunks = response.iter_content(64 * 1024)
+        first = next(chunks, b"")
+        started = time.monotonic()
+        received = 0
+        for chunk in chunks:
+            received += len(chunk)
+            if received + len(first) >= length:
+                break
+        elapsed = time.monotonic() - started
+    if not received:
+        return started - requested, None  # Nothing to time beyond the first read
+    return started - requested, received / max(elapsed, 0.001)
+
+
+def probe_throughput(session, url, headers=None, length=THROUGHPUT_PROBE_BYTES):
+    """Measure sustained bytes/second of a ranged read, timed from the first byte"""
+    return probe_stream(session, url, headers, length)[1]
+
+
+class ThroughputHistory:
+    """Per-host throughput measurements (exponentially averaged), kept between runs"""
+    def __init__(self, path=THROUGHPUT_FILE, ttl=THROUGHPUT_HISTORY_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.hosts = json.load(f)
+        except (OSError, ValueError):
+            self.hosts = {}
+
+    def estimate(self, host):
+        """Bytes/second for a host, or None when it has no recent measurement"""
+        with self.lock:
+            entry = self.hosts.get(host)
+        if not entry or time.time() - entry["updated"] > self.ttl:
+            return None
+        return entry["rate"]
+
+    def record(self, host, rate):
+        with self.lock:
+            entry = self.hosts.get(host)
+            if entry and time.time() - entry["updated"] <= self.ttl:
+                rate = 0.7 * entry["rate"] + 0.3 * rate
+            self.hosts[host] = {"rate": rate, "updated": time.time()}
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.hosts, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                pass  # History is only an optimization
+        return rate
+
+
+def pick_quality(links, quality):
+    """Pick the requested quality, else the next lower one, else the best available"""
+    if quality in links:
+        return quality
+    order = [q for q in QUALITY_ORDER if q in links] + [q for q in links if q not in QUALITY_ORDER]
+    if quality in QUALITY_ORDER:
+        lower = [q for q in order if q in QUALITY_ORDER and QUALITY_ORDER.index(q) > QUALITY_ORDER.index(quality)]
+        if lower:
+            return lower[0]
+    return order[0] if order else None
+
+
+def safe_filename(name):
+    return re.sub(r'\s*[\\/:*?"<>|\x00-\x1f]+\s*', " ", name).strip()[:150] or "episode"
+
+
+class HostRateLimiter:
+    """Spaces requests to each host at least 1/rate seconds apart, across threads"""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, 0))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class TokenBucket:
+    """Thread-safe byte budget shared by all download connections; up to `burst` bytes (default: one second's worth) go out at once"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class SegmentedDownloader:
+    """Downloads files as parallel HTTP range segments into preallocated .part files.
+
+    Progress is kept in a '<file>.part.json' sidecar so an interrupted download
+    resumes where each segment stopped. One connection pool and one bandwidth
+    budget are shared by every file, so several episodes download at once.
+    """
+    def __init__(self, connections=DOWNLOAD_CONNECTIONS, segments=DOWNLOAD_SEGMENTS, rate_limit=None, headers=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.segments = segments
+        self.headers = dict(headers or STREAM_HEADERS)
+        self.bucket = TokenBucket(rate_limit)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=connections, pool_maxsize=connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pool = ThreadPoolExecutor(max_workers=connections, thread_name_prefix="download")
+        self.closed = threading.Event()  # Set by close(): running segments save their progress and stop
+
+    def _probe(self, url):
+        """Return (size, supports_ranges) for url"""
+        response = self.session.get(url, headers={**self.headers, "Range": "bytes=0-0"}, stream=True, timeout=30)
+        response.close()
+        if response.status_code == 206:
+            content_range = response.headers.get("Content-Range", "")
+            total = content_range.rpartition("/")[2]
+            if total.isdigit():
+                return int(total), True
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        return (int(length) if length and length.isdigit() else None), False
+
+    def _load_state(self, state_path, size):
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("size") == size:
+                return state
+        except (OSError, ValueError):
+            pass
+        step = -(-size // self.segments)
+        return {
+            "size": size,
+            "segments": [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)],
+        }
+
+    def _save_state(self, state_path, state, lock):
+        with lock:
+            tmp_path = state_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, state_path)
+
+    @staticmethod
+    def _preallocate(fd, size):
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                pass  # Filesystem without fallocate support
+        os.ftruncate(fd, size)
+
+    @staticmethod
+    def _write_at(fd, data, offset, lock):
+        if hasattr(os, "pwrite"):
+            os.pwrite(fd, data, offset)
+        else:
+            with lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                os.write(fd, data)
+
+    def _fetch_segment(self, url, fd, segment, state, state_path, lock, on_bytes, abort):
+        start, end, _ = segment
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            offset = start + segment[2]
+            if offset > end or abort.is_set() or self.closed.is_set():
+                return
+            try:
+                headers = {**self.headers, "Range": f"bytes={offset}-{end}"}
+                with self.session.get(url, headers=headers, stream=True, timeout=30) as response:
+                    if response.status_code != 206:
+                        raise IOError(f"HTTP {response.status_code} for range request")
+                    unsaved = 0
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                        chunk = chunk[:end + 1 - offset]
+                        self.bucket.consume(len(chunk))
+                        self._write_at(fd, chunk, offset, lock)
+                        offset += len(chunk)
+                        segment[2] += len(chunk)
+                        unsaved += len(chunk)
+                        on_bytes(len(chunk))
+                        if unsaved >= DOWNLOAD_STATE_INTERVAL:
+                            self._save_state(state_path, state, lock)
+                            unsaved = 0
+                        if offset > end or abort.is_set() or self.closed.is_set():
+                            break
+                self._save_state(state_path, state, lock)
+                if offset > end:
+                    return
+            except Exception:
+                if attempt == DOWNLOAD_RETRIES or abort.is_set() or self.closed.is_set():
+                    self._save_state(state_path, state, lock)
+                    raise
+                time.sleep(2 ** attempt)
+
+    def _fetch_whole(self, url, path, on_bytes):
+        """Servers without range support: one plain streaming download"""
+        with self.session.get(url, headers=self.headers, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            with open(path + ".part", "wb") as f:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                    if self.closed.is_set():
+                        raise IOError("Download stopped")
+                    self.bucket.consume(len(chunk))
+                    f.write(chunk)
+                    on_bytes(len(chunk))
+        os.replace(path + ".part", path)
+
+    def download(self, url, path, on_start=None, on_bytes=None):
+        """Download url to path, resuming a previous partial download; blocks until done"""
+        on_bytes = on_bytes or (lambda n: None)
+        if os.path.exists(path):
+            return
+        size, ranged = self._probe(url)
+        if not ranged or not size:
+            if on_start:
+                on_start(size, 0)
+            self._fetch_whole(url, path, on_bytes)
+            return
+        
+        part_path = path + ".part"
+        state_path = part_path + ".json"
+        state = self._load_state(state_path, size)
+        if not os.path.exists(part_path):
+            # A state file without its data file is useless
+            for segment in state["segments"]:
+                segment[2] = 0
+        if on_start:
+            on_start(size, sum(segment[2] for segment in state["segments"]))
+        
+        lock = threading.Lock()
+        abort = threading.Event()
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        futures = []
+        try:
+            if os.fstat(fd).st_size != size:
+                self._preallocate(fd, size)
+            futures = [
+                self.pool.submit(self._fetch_segment, url, fd, segment, state, state_path, lock, on_bytes, abort)
+                for segment in state["segments"] if segment[0] + segment[2] <= segment[1]
+            ]
+            for future in futures:
+                future.result()
+            if any(segment[0] + segment[2] <= segment[1] for segment in state["segments"]):
+                raise IOError("Download stopped")  # Closed mid-file: keep the .part for resuming
+            os.fsync(fd)
+        except BaseException:
+            # Stop the other segments and let them record their progress before the file closes
+            abort.set()
+            # Cancelled futures never count as done for wait(), so only wait for the running ones
+            wait([future for future in futures if not future.cancel()])
+            self._save_state(state_path, state, lock)
+            raise
+        finally:
+            os.close(fd)
+        os.replace(part_path, path)
+        os.remove(state_path)
+
+    def close(self):
+        self.closed.set()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+class ProxiedStream:
+    """One upstream video served by StreamProxy, cached in fixed-size range chunks"""
+    def __init__(self, url, headers, session):
+        self.url = url
+        self.headers = headers
+        self.session = session
+        self.size = None
+        self.ranged = None
+        self.content_type = "application/octet-stream"
+        self.lock = threading.Lock()
+        self.inflight = {}  # chunk index -> Event set once the chunk is stored (or failed)
+
+    def probe(self):
+        """Learn the size and range support of the upstream file (once)"""
+        with self.lock:
+            if self.ranged is not None:
+                return
+            response = self.session.get(self.url, headers={**self.headers, "Range": "bytes=0-0"}, stream=True, timeout=30)
+            response.close()
+            self.content_type = response.headers.get("Content-Type", self.content_type)
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            if response.status_code == 206 and total.isdigit():
+                self.size = int(total)
+                self.ranged = True
+            elif response.status_code < 400:
+                self.ranged = False
+            else:
+                raise IOError(f"HTTP {response.status_code}")
+
+
+class StreamProxy:
+    """Local HTTP proxy that mpv plays from, reading the CDN ahead in large range chunks.
+
+    Chunks live in a memory ring buffer shared by all streams, so bytes fetched
+    by the preload are the ones mpv plays, and seeks back into buffered ranges
+    never touch the network. The upstream requests carry the Referer and
+    User-Agent the CDN requires.
+    """
+    def __init__(self, headers=None, chunk_size=PROXY_CHUNK, readahead=PROXY_READAHEAD, buffer_bytes=PROXY_BUFFER_BYTES):
+        import requests
+        from http.server import ThreadingHTTPServer
+        self.headers = dict(headers or STREAM_HEADERS)
+        self.chunk_size = chunk_size
+        self.readahead = readahead
+        self.max_chunks = max(readahead * 2, buffer_bytes // chunk_size)
+        self.session = requests.Session()
+        self.streams = {}           # stream id -> ProxiedStream
+        self.chunks = OrderedDict()  # (stream id, chunk index) -> bytes, least recently used first
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="readahead")
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name="stream-proxy", daemon=True).start()
+
+    def register(self, url):
+        """Return the local URL that serves `url` through the proxy"""
+        import hashlib
+        stream_id = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+        with self.lock:
+            if stream_id not in self.streams:
+                self.streams[stream_id] = ProxiedStream(url, self.headers, self.session)
+        extension = os.path.splitext(urlsplit(url).path)[1]
+        return f"http://127.0.0.1:{self.port}/stream/{stream_id}{extension}"
+
+    def preload(self, local_url, length=PRELOAD_BYTES):
+        """Fetch the first `length` bytes of a registered stream into the buffer"""
+        stream_id = self._stream_id(local_url)
+        stream = self.streams[stream_id]
+        stream.probe()
+        if not stream.ranged:
+            return False
+        last = min(length, stream.size) - 1
+        futures = [self.pool.submit(self._chunk, stream_id, index) for index in range(0, last // self.chunk_size + 1)]
+        for future in futures:
+            future.result()
+        return True
+
+    @staticmethod
+    def _stream_id(path):
+        return os.path.splitext(urlsplit(path).path.rpartition("/")[2])[0]
+
+    def _chunk(self, stream_id, index):
+        """Return chunk `index` of a stream, from the buffer or fetched once from upstream"""
+        key = (stream_id, index)
+        stream = self.streams[stream_id]
+        while True:
+            with self.lock:
+                data = self.chunks.get(key)
+                if data is not None:
+                    self.chunks.move_to_end(key)
+                    return data
+                pending = stream.inflight.get(index)
+                if pending is None:
+                    pending = stream.inflight[index] = threading.Event()
+                    break
+            # Someone else is fetching this chunk: wait for it, then look again
+            pending.wait()
+            with self.lock:
+                if key not in self.chunks and stream.inflight.get(index) is None:
+                    raise IOError("upstream fetch failed")
+        
+        try:
+            start = index * self.chunk_size
+            end = min(start + self.chunk_size, stream.size) - 1
+            response = self.session.get(stream.url, headers={**self.headers, "Range": f"bytes={start}-{end}"}, timeout=30)
+            if response.status_code != 206:
+                raise IOError(f"HTTP {response.status_code} from upstream")
+            data = response.content
+            with self.lock:
+                self.chunks[key] = data
+                while len(self.chunks) > self.max_chunks:
+                    self.chunks.popitem(last=False)
+            return data
+        finally:
+            with self.lock:
+                stream.inflight.pop(index, None)
+            pending.set()
+
+    def _read_ahead(self, stream_id, index):
+        stream = self.streams[stream_id]
+        last = (stream.size - 1) // self.chunk_size
+        for ahead in range(index + 1, min(index + self.readahead, last) + 1):
+            with self.lock:
+                buffered = (stream_id, ahead) in self.chunks or ahead in stream.inflight
+            if not buffered:
+                self.pool.submit(self._chunk, stream_id, ahead)
+
+    def _handler_class(self):
+        from http.server import BaseHTTPRequestHandler
+        proxy = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Headers and body are separate writes; don't stall on delayed ACKs
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def do_HEAD(self):
+                self.do_GET(body=False)
+            
+            def do_GET(self, body=True):
+                stream_id = proxy._stream_id(self.path)
+                stream = proxy.streams.get(stream_id)
+                if stream is None:
+                    self.send_error(404)
+                    return
+                try:
+                    stream.probe()
+                except Exception as e:
+                    self.send_error(502, str(e))
+                    return
+                if not stream.ranged:
+                    self._relay(stream, body)
+                    return
+                
+                start, end = 0, stream.size - 1
+                match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get("Range", ""))
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)), end) if match.group(2) else end
+                    else:  # Suffix range: last N bytes
+                        start = max(0, stream.size - int(match.group(2)))
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{stream.size}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{stream.size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Type", stream.content_type)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if not body:
+                    return
+                
+                position = start
+                try:
+                    while position <= end:
+                        index = position // proxy.chunk_size
+                        proxy._read_ahead(stream_id, index)
+                        data = proxy._chunk(stream_id, index)
+                        offset = position - index * proxy.chunk_size
+                        piece = data[offset:offset + end - position + 1]
+                        self.wfile.write(piece)
+                        position += len(piece)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # mpv closed the connection (seek or quit)
+                except Exception:
+                    # Upstream failed mid-response; drop the connection so mpv retries
+                    self.close_connection = True
+            
+            def _relay(self, stream, body):
+                """Upstream without range support: pass the response straight through"""
+                headers = dict(proxy.headers)
+                if self.headers.get("Range"):
+                    headers["Range"] = self.headers["Range"]
+                try:
+                    with proxy.session.get(stream.url, headers=headers, stream=True, timeout=30) as response:
+                        self.send_response(response.status_code)
+                        for name in ("Content-Type", "Content-Length", "Content-Range", "Accept-Ranges"):
+                            if name in response.headers:
+                                self.send_header(name, response.headers[name])
+                        if "Content-Length" not in response.headers:
+                            self.close_connection = True
+                        self.end_headers()
+                        if body:
+                            for chunk in response.iter_content(64 * 1024):
+                                self.wfile.write(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+        
+        return Handler
+
+    def close(self):
+        self.server.shutdown()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class MpvPlayer:
+    """One long-lived mpv process controlled over its JSON IPC socket.
+
+    Episodes are loaded into the running player with `loadfile` and the next one
+    is queued with `loadfile ... append-play`, so mpv starts once and keeps its
+    window and demuxer cache between episodes.
+    """
+    def __init__(self, options):
+        self.options = list(options)
+        self.process = None
+        self.sock = None
+        self.events = queue.Queue()
+        self.pending = {}   # request id -> Future for the reply
+        self.request_id = 0
+        self.titles = {}    # loaded URL -> window title
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def supported():
+        import socket
+        return hasattr(socket, "AF_UNIX")
+
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        import socket
+        import tempfile
+        path = os.path.join(tempfile.gettempdir(), f"wit_anime-mpv-{os.getpid()}.sock")
+        if os.path.exists(path):
+            os.unlink(path)
+        self.process = subprocess.Popen(
+            ["mpv", "--idle=yes", "--no-terminal", f"--input-ipc-server={path}", *self.options],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + MPV_IPC_TIMEOUT
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(path)
+                break
+            except OSError:
+                sock.close()
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.process.kill()
+                    raise RuntimeError("mpv IPC socket did not come up")
+                time.sleep(0.05)
+        self.sock = sock
+        self.events = queue.Queue()
+        threading.Thread(target=self._read, args=(sock,), name="mpv-ipc", daemon=True).start()
+
+    def _read(self, sock):
+        """Route replies to their waiting commands and queue everything else as events"""
+        buffer = b""
+        try:
+            while True:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        continue
+                    if "request_id" in message and "event" not in message:
+                        with self.lock:
+                            future = self.pending.pop(message["request_id"], None)
+                        if future is not None:
+                            future.set_result(message)
+                    elif "event" in message:
+                        self.events.put(message)
+        except OSError:
+            pass
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("mpv exited"))
+        self.events.put({"event": "shutdown"})
+
+    def command(self, *args):
+        from concurrent.futures import Future
+        future = Future()
+        with self.lock:
+            self.request_id += 1
+            self.pending[self.request_id] = future
+            message = json.dumps({"command": list(args), "request_id": self.request_id}) + "\n"
+            self.sock.sendall(message.encode("utf-8"))
+        reply = future.result(timeout=MPV_IPC_TIMEOUT)
+        if reply.get("error") != "success":
+            raise RuntimeError(f"mpv {args[0]}: {reply.get('error')}")
+        return reply.get("data")
+
+    def drain_events(self):
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def play(self, url, title):
+        """Replace whatever is playing with url, starting mpv if needed"""
+        if not self.running():
+            self.start()
+        self.drain_events()
+        self.titles[url] = title
+        self.command("loadfile", url, "replace")
+
+    def append(self, url, title):
+        """Queue url after the current file; plays at once if mpv already went idle"""
+        self.titles[url] = title
+        self.command("loadfile", url, "append-play")
+
+    def current_title(self):
+        """Set and return the window title for the file mpv just started"""
+        title = self.titles.get(self.command("get_property", "path"))
+        if title:
+            self.command("set_property", "title", title)
+        return title
+
+    def close(self):
+        if self.running():
+            try:
+                self.command("quit")
+                self.process.wait(timeout=2)
+            except Exception:
+                self.process.kill()
+
+
+class LinkPrefetcher:
+    """Resolve episode download links ahead of the cursor on a bounded thread pool"""
+    def __init__(self, resolve, workers=PREFETCH_WORKERS, ahead=PREFETCH_AHEAD, keep=64):
+        self.resolve = resolve
+        self.ahead = ahead
+        self.keep = keep
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.futures = {}  # episode url -> Future, in submission order
+        self.lock = threading.Lock()
+
+    def schedule(self, episodes, selected):
+        """Queue the selected episode and the next few; drop queued work outside that window"""
+        wanted = [ep['url'] for ep in episodes[selected:selected + 1 + self.ahead]]
+        with self.lock:
+            for url, future in list(self.futures.items()):
+                if url not in wanted and future.cancel():
+                    del self.futures[url]
+            for url in wanted:
+                future = self.futures.get(url)
+                if future is None or (future.done() and not self._succeeded(future)):
+                    self.futures[url] = self.executor.submit(self.resolve, url)
+            # Bound the memo of finished results
+            finished = [url for url, future in self.futures.items() if future.done()]
+            for url in finished[:max(0, len(finished) - self.keep)]:
+                del self.futures[url]
+
+    def get(self, url):
+        """Return links for url, waiting on a prefetch in flight or resolving directly"""
+        with self.lock:
+            future = self.futures.get(url)
+        if future is not None and not future.cancelled():
+            result = future.result()
+            if not result.get("success"):
+                # Don't keep failures around; the next attempt should refetch
+                with self.lock:
+                    if self.futures.get(url) is future:
+                        del self.futures[url]
+            return result
+        return self.resolve(url)
+
+    def cancel_pending(self):
+        """Cancel every queued fetch that has not started yet"""
+        with self.lock:
+            for url, future in list(self.futures.items()):
+                if future.cancel():
+                    del self.futures[url]
+
+    @staticmethod
+    def _succeeded(future):
+        return not future.cancelled() and future.exception() is None and future.result().get("success")
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def stream_url_expiry(url):
+    """Return the unix time a signed URL expires at, read from its query string, or None"""
+    try:
+        query = {k.lower(): v[0] for k, v in parse_qs(urlsplit(url).query).items() if v}
+    except ValueError:
+        return None
+    
+    # AWS SigV4: signing date plus lifetime in seconds
+    if "x-amz-date" in query and "x-amz-expires" in query:
+        try:
+            signed = calendar.timegm(time.strptime(query["x-amz-date"], "%Y%m%dT%H%M%SZ"))
+            return signed + int(query["x-amz-expires"])
+        except ValueError:
+            pass
+    
+    for name in EXPIRY_PARAMS:
+        value = query.get(name)
+        if value and value.isdigit():
+            expiry = int(value)
+            if expiry > 10 ** 12:  # Milliseconds
+                expiry //= 1000
+            # Ignore values that are clearly not timestamps (e.g. a short "e=1" flag)
+            if expiry > 10 ** 9:
+                return expiry
+    return None
+
+
+class StreamUrlCache:
+    """In-memory cache of resolved streaming URLs keyed by download URL"""
+    def __init__(self, ttl=STREAM_URL_TTL):
+        self.ttl = ttl
+        self.entries = {}  # download url -> (streaming url, expires_at)
+        self.lock = threading.Lock()
+
+    def get(self, download_url):
+        with self.lock:
+            entry = self.entries.get(download_url)
+            if not entry:
+                return None
+            streaming_url, expires_at = entry
+            if time.time() >= expires_at:
+                del self.entries[download_url]
+                return None
+            return streaming_url
+
+    def put(self, download_url, streaming_url):
+        expiry = stream_url_expiry(streaming_url)
+        if expiry is not None:
+            expires_at = expiry - STREAM_URL_EXPIRY_MARGIN
+        else:
+            expires_at = time.time() + self.ttl
+        with self.lock:
+            self.entries[download_url] = (streaming_url, expires_at)
+
+    def invalidate(self, download_url):
+        with self.lock:
+            self.entries.pop(download_url, None)
+
+
+class YtDlpResolver:
+    """Warm, in-process yt-dlp: long-lived YoutubeDL instances, one per worker thread"""
+    def __init__(self, session=None, timeout=YTDLP_TIMEOUT, workers=YTDLP_WORKERS):
+        self.session = session  # requests session whose cookies are shared with yt-dlp
+        self.timeout = timeout
+        self.workers = workers
+        self.local = threading.local()  # .ydl: the calling worker's YoutubeDL (not thread-safe to share)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="yt-dlp")
+
+    def _create(self):
+        import yt_dlp
+        options = {
+            "quiet": True,
+            "no_warnings": True,
+            "skip_download": True,
+            "nocheckcertificate": True,                             # --no-check-certificate
+            "socket_timeout": 15,                                   # --socket-timeout 15
+            "extractor_args": {"generic": {"impersonate": [""]}},  # --extractor-args generic:impersonate
+        }
+        return yt_dlp.YoutubeDL(options)
+
+    def _ydl(self):
+        ydl = getattr(self.local, "ydl", None)
+        if ydl is None:
+            ydl = self.local.ydl = self._create()
+        return ydl
+
+    def _share_cookies(self, ydl):
+        if self.session is None:
+            return
+        for cookie in self.session.cookies:
+            ydl.cookiejar.set_cookie(cookie)
+
+    def _resolve(self, download_url):
+        ydl = self._ydl()
+        self._share_cookies(ydl)
+        info = ydl.extract_info(download_url, download=False)
+        if info.get("_type") == "playlist" and info.get("entries"):
+            info = next(entry for entry in info["entries"] if entry)
+        # Same output as `yt-dlp --get-url`: one line per selected format
+        formats = info.get("requested_formats") or [info]
+        urls = [fmt["url"] for fmt in formats if fmt.get("url")]
+        if not urls:
+            raise ValueError("yt-dlp returned no URL")
+        return "\n".join(urls)
+
+    def warm(self):
+        """Import yt-dlp and build an extractor instance in the background"""
+        def create():
+            try:
+                self._ydl()
+            except ImportError:
+                pass
+        self.executor.submit(create)
+
+    def resolve(self, download_url):
+        future = self.executor.submit(self._resolve, download_url)
+        try:
+            return {"success": True, "url": future.result(timeout=self.timeout)}
+        except ImportError:
+            return {"success": False, "error": "yt-dlp is not installed as a Python package"}
+        except FutureTimeoutError:
+            # The stuck call keeps its worker busy; continue on a fresh pool with fresh instances
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="yt-dlp")
+            self.local = threading.local()
+            return {"success": False, "error": "Timeout while extracting URL"}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class DaemonClient:
+    """Requests to a running `wit_anime.py daemon`, one connection per request.
+
+    A request is one JSON line {"op": ..., **params}. The daemon answers with
+    any number of {"items": [...]} lines for streamed results, then a final
+    {"result": ...} or {"error": "..."} line. Transport failures raise OSError
+    (or ValueError for a garbled reply); errors reported by the daemon raise
+    RuntimeError.
+    """
+    def __init__(self, path=DAEMON_SOCKET, timeout=DAEMON_REQUEST_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+
+    @classmethod
+    def connect(cls, site_url, path=DAEMON_SOCKET):
+        """A client for the daemon scraping site_url, or None when no such daemon is listening"""
+        if not MpvPlayer.supported() or not os.path.exists(path):
+            return None
+        try:
+            info = cls(path, timeout=1).call("ping")
+        except (OSError, ValueError, RuntimeError):
+            return None  # Stale socket file from a daemon that was killed, or a hung one
+        return cls(path) if info.get("site") == site_url else None
+
+    def _messages(self, op, params):
+        import socket
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            sock.sendall(json.dumps({"op": op, **params}).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as reader:
+                for line in reader:
+                    message = json.loads(line)
+                    if "error" in message:
+                        raise RuntimeError(message["error"])
+                    yield message
+                    if "items" not in message:
+                        return
+        raise ConnectionError("the daemon closed the connection mid-reply")
+
+    def call(self, op, **params):
+        for message in self._messages(op, params):
+            if "result" in message:
+                return message["result"]
+
+    def stream(self, op, **params):
+        """Yield the items of a streamed reply as their lines arrive"""
+        for message in self._messages(op, params):
+            yield from message.get("items", ())
+
+
+class ResolverDaemon:
+    """Serve a warm AnimeScraperUI to short-lived invocations over a Unix socket.
+
+    The daemon owns the HTTP session (and its Cloudflare clearance), the response
+    cache, the yt-dlp workers and the resolved streaming URLs for as long as it
+    runs, and keeps parsed pages in memory on top of the response cache, so a
+    fresh terminal skips the imports, the session setup and the parsing.
+    """
+    def __init__(self, app, path=DAEMON_SOCKET, idle_timeout=DAEMON_IDLE_TIMEOUT, max_pages=DAEMON_PARSED_PAGES):
+        self.app = app
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.max_pages = max_pages
+        self.parsed = OrderedDict()     # (page type, url) -> (expires at, parsed page), least recently used first
+        self.lock = threading.Lock()
+        self.last_request = time.monotonic()
+        self.open_connections = 0       # Requests being answered; the daemon never idles out under one
+        self.server = None
+        self.ops = {
+            "ping": self.ping,
+            "search_page": self.search_page,
+            "links": self.links,
+            "stream_url": self.stream_url,
+            "clear_cache": self.clear_cache,
+            "shutdown": self.shutdown,
+        }
+        self.streams = {"episodes": self.episodes}
+        self.sessions = {"resolve": self.resolve}  # Also read from the connection after the request line
+
+    def bind(self):
+        """Take over the socket path; RuntimeError if another daemon is listening on it"""
+        import socketserver
+        try:
+            DaemonClient(self.path, timeout=1).call("ping")
+        except (OSError, ValueError, RuntimeError):
+            pass  # Nobody answers: a leftover socket file is replaced
+        else:
+            raise RuntimeError(f"A daemon is already listening on {self.path}")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        umask = os.umask(0o077)  # Only this user may connect
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(self.path, self._handler_class())
+        finally:
+            os.umask(umask)
+        self.server.daemon_threads = True
+
+    def serve(self):
+        """Answer requests until shut down or idle for idle_timeout, then remove the socket"""
+        self.last_request = time.monotonic()  # Idle time counts from here, not from before the warm-up
+        if self.idle_timeout:
+            threading.Thread(target=self._exit_when_idle, name="daemon-idle", daemon=True).start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _exit_when_idle(self):
+        while True:
+            with self.lock:
+                busy = self.open_connections > 0
+                remaining = self.last_request + self.idle_timeout - time.monotonic()
+            if busy:
+                remaining = self.idle_timeout  # Look again later: idle time counts from the end of the request
+            elif remaining <= 0:
+                self.server.shutdown()
+                return
+            time.sleep(min(remaining, 60))
+
+    def _handler_class(self):
+        import socketserver
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def send(self, message):
+                self.wfile.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+
+            def handle(self):
+                with daemon.lock:
+                    daemon.open_connections += 1
+                    daemon.last_request = time.monotonic()
+                try:
+                    request = json.loads(self.rfile.readline())
+                    op = request.pop("op", None)
+                    with TRACER.span("daemon", op=op):
+                        if op in daemon.sessions:
+                            daemon.sessions[op](self.rfile, self.send, **request)
+                        elif op in daemon.streams:
+                            for items in daemon.streams[op](**request):
+                                self.send({"items": items})
+                            self.send({"result": None})
+                        elif op in daemon.ops:
+                            self.send({"result": daemon.ops[op](**request)})
+                        else:
+                            self.send({"error": f"Unknown daemon operation: {op}"})
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client went away
+                except Exception as e:
+                    try:
+                        self.send({"error": str(e)})
+                    except OSError:
+                        pass
+                finally:
+                    with daemon.lock:
+                        daemon.open_connections -= 1
+                        daemon.last_request = time.monotonic()
+
+        return Handler
+
+    def _recall(self, page_type, url):
+        with self.lock:
+            entry = self.parsed.get((page_type, url))
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self.parsed[(page_type, url)]
+                return None
+            self.parsed.move_to_end((page_type, url))
+            return entry[1]
+
+    def _remember(self, page_type, url, page):
+        if not self.app.use_cache:
+            return
+        with self.lock:
+            self.parsed[(page_type, url)] = (time.monotonic() + PAGE_TTLS[page_type], page)
+            self.parsed.move_to_end((page_type, url))
+            while len(self.parsed) > self.max_pages:
+                self.parsed.popitem(last=False)
+
+    def ping(self):
+        return {"pid": os.getpid(), "site": self.app.site_url}
+
+    def search_page(self, url):
+        page = self._recall("search", url)
+        if page is None:
+            status, results, pages = self.app.search_page(url)
+            page = {"status": status, "results": results, "pages": pages}
+            if status == 200:
+                self._remember("search", url, page)
+        return page
+
+    def episodes(self, url):
+        """Yield the anime page's episodes in growing batches; the first one is a screenful, sent before the page is parsed"""
+        known = self._recall("anime", url)
+        parsed = EpisodeList() if known is None else None
+        batch = []
+        size = EPISODE_FIRST_SCREEN
+        for episode in known if known is not None else self.app.iter_episodes(url):
+            batch.append(episode)
+            if parsed is not None:
+                parsed.append(episode)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+                size = min(size * 2, 4096)
+        if batch:
+            yield batch
+        if parsed:
+            self._remember("anime", url, parsed)
+
+    def links(self, episode_url):
+        page = self._recall("episode", episode_url)
+        if page is None:
+            page = self.app.extract_download_links(episode_url)
+            if page["success"]:
+                self._remember("episode", episode_url, page)
+        return page
+
+    def stream_url(self, download_url, refresh=False):
+        return self.app.get_streaming_url(download_url, refresh=refresh, show_progress=False)
+
+    def resolve(self, rfile, send, argv, site):
+        """Run a `resolve` invocation handed over by resolve_through_daemon.
+
+        Input lines arrive on the connection after the request; each record is
+        sent as soon as it is ready. The client's --site default (site) is used
+        when argv names none.
+        """
+        try:
+            args = parse_args(["--site", site] + argv)
+        except SystemExit:
+            send({"result": None})
+            return
+        if (args.command != "resolve" or args.no_cache or args.clear_cache or args.trace
+                or args.no_hedge
+                or args.site.rstrip("/") != self.app.site_url):
+            send({"result": None})  # Needs the client's own settings: it runs in-process
+            return
+        send({"accepted": {"input": args.input, "output": args.output}})
+        
+        lock = threading.Lock()
+        
+        def emit(record):
+            with lock:
+                send({"items": [record]})
+        
+        failures = self.app.resolve_batch((line.decode("utf-8") for line in rfile), emit, episodes=args.episodes,
+                                          quality=args.quality, stream=args.stream, workers=args.workers,
+                                          rate_limiter=HostRateLimiter(args.rate))
+        with lock:
+            send({"result": {"failures": failures}})
+    
+    def clear_cache(self):
+        """Forget parsed pages (the client clears the shared on-disk cache itself)"""
+        with self.lock:
+            self.parsed.clear()
+        return None
+
+    def shutdown(self):
+        # Reply first: shutdown() waits for the serve loop to notice
+        threading.Thread(target=self.server.shutdown, name="daemon-shutdown", daemon=True).start()
+        return {"pid": os.getpid()}
+
+
+class MenuRenderer:
+    """Retained-mode menu drawing: a frame is rendered once, then only changed cursor rows are rewritten"""
+    def __init__(self, console, max_frames=16):
+        self.console = console
+        self.max_frames = max_frames
+        self.frames = OrderedDict()  # frame key -> (plain lines, highlighted lines, screen line of each row)
+        self.current = None          # (frame key, selected row) currently on screen
+        self.last_bytes = 0          # Bytes written by the last draw
+        self.total_bytes = 0
+
+    def invalidate(self):
+        """Force a full redraw next time (something else was printed over the menu)"""
+        self.current = None
+
+    def _capture(self, renderables):
+        with self.console.capture() as capture:
+            for renderable in renderables:
+                self.console.print(renderable)
+        return capture.get().split("\n")
+
+    def _frame(self, key, build, row_count):
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.frames.move_to_end(key)
+            return frame
+        
+        # Render the frame with no row highlighted and with every row highlighted;
+        # the lines that differ are the row lines, in order
+        plain = self._capture(build(lambda row: False))
+        highlighted = self._capture(build(lambda row: True))
+        rows = None
+        if len(plain) == len(highlighted) and len(plain) <= self.console.height:
+            changed = [i for i, (a, b) in enumerate(zip(plain, highlighted)) if a != b]
+            if len(changed) == row_count:
+                rows = changed
+        frame = (plain, highlighted, rows)
+        self.frames[key] = frame
+        while len(self.frames) > self.max_frames:
+            self.frames.popitem(last=False)
+        return frame
+
+    def draw(self, key, build, row_count, selected):
+        """Show frame `key` with row `selected` highlighted.
+
+        build(highlighted) returns the renderables of the frame, drawing row i
+        highlighted when highlighted(i) is true.
+        """
+        key = (key, self.console.width, self.console.height)
+        plain, highlighted, rows = self._frame(key, build, row_count)
+        
+        if rows is not None and self.current is not None and self.current[0] == key:
+            # Same frame on screen: rewrite the old and new cursor rows only
+            parts = []
+            previous = self.current[1]
+            if previous != selected and 0 <= previous < len(rows):
+                parts.append(f"\033[{rows[previous] + 1};1H{plain[rows[previous]]}\033[K")
+            if 0 <= selected < len(rows):
+                parts.append(f"\033[{rows[selected] + 1};1H{highlighted[rows[selected]]}\033[K")
+            parts.append(f"\033[{len(plain)};1H")
+            output = "".join(parts)
+        else:
+            lines = list(plain)
+            if rows is not None and 0 <= selected < len(rows):
+                lines[rows[selected]] = highlighted[rows[selected]]
+            elif rows is None:
+                # Rows could not be located (wrapped cells, frame taller than the terminal)
+                lines = self._capture(build(lambda row: row == selected))
+            output = "\033[H\033[J" + "\n".join(lines)
+        
+        self.console.file.write(output)
+        self.console.file.flush()
+        self.last_bytes = len(output.encode("utf-8"))
+        self.total_bytes += self.last_bytes
+        self.current = (key, selected)
+
 
 class AnimeScraperUI:
-    def __init__(self):
+    def __init__(self, use_cache=True, stream_ttl=STREAM_URL_TTL, resolver="auto", parser="auto", use_catalog=True,
+                 site_url=SITE_URL, use_daemon=True, hedge=True):
         self.console = Console()
-        self.scraper = cloudscraper.create_scraper()
+        self.site_url = site_url.rstrip("/")
+        self.renderer = MenuRenderer(self.console)
+        self.use_cache = use_cache
+        self.use_catalog = use_catalog
+        self.use_daemon = use_daemon    # Hand network work to a running `wit_anime.py daemon` when there is one
+        self.hedge = hedge              # Duplicate slow page requests (AsyncFetcher hedging)
+        self.parser = parser
         self.anime_choices = []
-        self.episodes = []
+        self.episodes = EpisodeList()
+        self.current_anime = None
+        self.search_status = None       # Shown under the anime menu while more result pages load
+        self.episodes_status = None     # Same for the episode list
+        self._search_generation = 0     # Bumped per query so stale background pages are dropped
+        self._menu_lock = threading.Lock()
+        self._menu_refresh = None       # Redraws the open anime menu when new results arrive
+        self.stream_urls = StreamUrlCache(ttl=stream_ttl)
+        self.resolver_backend = resolver
+        self.rate_limiter = None        # HostRateLimiter applied to network fetches (headless runs)
+        self.registry_urls = set()      # URLs decoded from episode pages' server registries
+        self.selected_at = None         # perf_counter when a quality was picked, for time-to-first-frame
+        # Session, HTTP engine, cache and worker pools are built on first use (see warm_up)
+        self._components = {}
+        self._components_lock = threading.RLock()
+    
+    def _component(self, name, factory):
+        """Create a heavy component once, on first use from any thread"""
+        if name not in self._components:
+            with self._components_lock:
+                if name not in self._components:
+                    self._components[name] = factory()
+        return self._components[name]
+    
+    @property
+    def parser_backend(self):
+        return self._component("parser_backend", lambda: available_parser_backends()[0] if self.parser == "auto" else self.parser)
+    
+    @property
+    def scraper(self):
+        return self._component("scraper", self._create_scraper)
+    
+    def _create_scraper(self):
+        import cloudscraper
+        scraper = cloudscraper.create_scraper()
+        self._components["session_store"] = SessionStore(scraper)
+        self._components["session_store"].load()
+        return scraper
+    
+    @property
+    def catalog(self):
+        return self._component("catalog", lambda: CatalogIndex() if self.use_catalog else None)
+    
+    @property
+    def session_store(self):
+        self.scraper
+        return self._components["session_store"]
+    
+    @property
+    def http(self):
+        return self._component("http", lambda: AsyncFetcher(self.scraper, session_store=self.session_store,
+                                                            hedge_percentile=HEDGE_PERCENTILE if self.hedge else 0))
+    
+    @property
+    def cache(self):
+        return self._component("cache", self._create_cache)
+    
+    def _create_cache(self):
+        if not self.use_cache:
+            return None
+        try:
+            return ResponseCache()
+        except Exception:
+            # Read-only home or broken cache file: run without caching
+            return None
+    
+    @property
+    def prefetcher(self):
+        return self._component("prefetcher", lambda: LinkPrefetcher(self.extract_download_links))
+    
+    @property
+    def stream_proxy(self):
+        return self._component("stream_proxy", StreamProxy)
+    
+    @property
+    def throughput(self):
+        return self._component("throughput", ThroughputHistory)
+    
+    @property
+    def resolver(self):
+        return self._component("resolver", lambda: YtDlpResolver(session=self.scraper))
+    
+    @property
+    def daemon(self):
+        return self._component("daemon", lambda: DaemonClient.connect(self.site_url) if self.use_daemon else None)
+    
+    def remote(self, op, **params):
+        """Run op in the daemon; None when there is none or it failed, and the caller works in-process"""
+        client = self.daemon
+        if client is None:
+            return None
+        try:
+            with TRACER.span("remote", op=op):
+                return client.call(op, **params)
+        except (OSError, ValueError):
+            self._components["daemon"] = None  # Gone: stay in-process from now on
+        except RuntimeError:
+            pass
+        return None
+    
+    def close(self):
+        """Stop mpv and drop queued prefetches, resolves and read-ahead, so exiting doesn't wait for them"""
+        if "mpv" in self._components:
+            self._components["mpv"].close()
+        for name in ("prefetcher", "resolver", "stream_proxy"):
+            if name in self._components:
+                self._components[name].close()
+    
+    def warm_up(self):
+        """Import heavy modules and open the session in the background while the user types"""
+        def warm():
+            try:
+                if self.daemon is None:
+                    self.http
+                    self.cache
+                    self.parser_backend
+                import bs4  # noqa: F401
+                import arabic_reshaper  # noqa: F401
+                import bidi.algorithm  # noqa: F401
+                import rich.table  # noqa: F401
+                import rich.progress  # noqa: F401
+                import rich.panel  # noqa: F401
+                import readchar  # noqa: F401
+            except Exception:
+                # Whatever failed is retried, and reported, on first real use
+                pass
+        threading.Thread(target=warm, name="warm-up", daemon=True).start()
+    
+    def fetch_page(self, url, page_type, headers=None, rate_limiter=None):
+        """Fetch a page through the response cache (only successful responses are cached).
+        rate_limiter overrides self.rate_limiter for this request."""
+        rate_limiter = rate_limiter or self.rate_limiter
+        with TRACER.span("fetch", page_type=page_type, url=url) as span:
+            if self.cache:
+                content = self.cache.get(url, page_type)
+                if content is not None:
+                    span.set(status=200, bytes=len(content), cached=True)
+                    return CachedResponse(200, content, from_cache=True)
+            
+            if rate_limiter is not None:
+                rate_limiter.wait(url)
+            response = self.http.get(url, headers=headers)
+            span.set(status=response.status_code, bytes=len(response.content), cached=False)
+            if self.cache and response.status_code == 200:
+                self.cache.put(url, page_type, response.content)
+            return response
         
     def is_arabic(self, text):
         """Check if text contains Arabic characters"""
-        if not text:
-            return False
-        arabic_count = 0
-        for char in text:
-            if ('\u0600' <= char <= '\u06FF' or  # Arabic
-                '\u0750' <= char <= '\u077F' or  # Arabic Supplement
-                '\u08A0' <= char <= '\u08FF' or  # Arabic Extended-A
-                '\uFB50' <= char <= '\uFDFF' or  # Arabic Presentation Forms-A
-                '\uFE70' <= char <= '\uFEFF'):   # Arabic Presentation Forms-B
-                arabic_count += 1
-        return arabic_count > 0
+        return contains_arabic(text)
     
     def format_arabic_text(self, text, max_width=60):
         """Format Arabic text for proper RTL display using arabic_reshaper and bidi"""
-        if not text:
-            return text
-            
-        text = text.strip()
-        
-        if self.is_arabic(text):
-            try:
-                # Apply reshaping (connects Arabic letters properly)
-                reshaped_text = arabic_reshaper.reshape(text)
-                
-                # Apply bidi algorithm (right-to-left display)
-                bidi_text = get_display(reshaped_text)
-                
-                # Truncate if too long
-                if len(text) > max_width:
-                    truncated = text[:max_width-3] + "..."
-                    reshaped_truncated = arabic_reshaper.reshape(truncated)
-                    bidi_text = get_display(reshaped_truncated)
-                
-                return bidi_text
-            except Exception as e:
-                # Fallback to original text if reshaping fails
-                return text[:max_width] if len(text) > max_width else text
-        
-        # For non-Arabic text, just truncate if needed
-        if len(text) > max_width:
-            return text[:max_width-3] + "..."
-        return text
+        return format_rtl_text(text, max_width)
+    
+    def display_title(self, record, max_width):
+        """Display form of record['title'], precomputed at parse time when available"""
+        display = record.get("display")
+        if display and max_width in display:
+            return display[max_width]
+        return self.format_arabic_text(record["title"], max_width=max_width)
     
     def preload_stream(self, url, progress_callback=None):
-        """Preload stream to avoid buffering lag"""
+        """Preload stream to avoid buffering lag; returns the local proxy URL mpv should play"""
+        if progress_callback:
+            progress_callback("🔄 Preloading stream...")
+        if "\n" in url:
+            return url  # Separate video/audio URLs: mpv fetches them directly
         try:
-            # Use curl or wget to preload first few MB
-            cmd = [
-                "curl",
-                "-s",
-                "-r", "0-5242880",  # Download first 5MB
-                "-H", "User-Agent: Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "-H", "Referer: https://videos.vid3rb.com/",
-                "-o", "/dev/null" if sys.platform != "win32" else "nul",
-                url
-            ]
-            
-            if progress_callback:
-                progress_callback("🔄 Preloading stream...")
-            
-            subprocess.run(cmd, timeout=10, capture_output=True)
-            
-            if progress_callback:
+            with TRACER.span("preload"):
+                local_url = self.stream_proxy.register(url)
+                preloaded = self.stream_proxy.preload(local_url)
+            if preloaded and progress_callback:
                 progress_callback("✅ Stream preloaded")
-                
-        except:
-            # Fallback: just wait a bit
+            return local_url
+        except Exception:
+            # Proxy or upstream unavailable: let mpv fetch directly
             if progress_callback:
                 progress_callback("⏳ Preparing stream...")
-            time.sleep(2)
+            return url
     
-    def stream_with_mpv(self, url, episode_title, additional_args=None):
-        """Stream video URL with mpv player using optimized buffering configuration"""
+    def stream_with_mpv(self, url, episode_title, additional_args=None, upcoming=None):
+        """Stream video URL with mpv player using optimized buffering configuration.
+
+        `upcoming` yields (streaming URL, title) for the following episodes; each
+        one is resolved while the previous plays and queued in the same mpv.
+        """
         
         # Base mpv command
         cmd = ['mpv']
@@ -129,12 +2919,12 @@ class AnimeScraperUI:
         if additional_args:
             cmd.extend(additional_args)
         
-        # Add the URL
-        cmd.append(url)
-        
         try:
             self.console.print(f"[green]🎬 Optimizing stream for smooth playback...[/green]")
             
+            from rich.progress import Progress, SpinnerColumn, TextColumn
+            from rich.panel import Panel
+            
             # Preload stream in background
             with Progress(
                 SpinnerColumn(),
@@ -143,16 +2933,22 @@ class AnimeScraperUI:
             ) as progress:
                 preload_task = progress.add_task("🔄 Preloading stream buffer...", total=None)
                 
-                # Preload in separate thread
+                # Preload in separate thread; mpv plays from the local read-ahead proxy
+                playback = {"url": url}
                 def preload():
-                    self.preload_stream(url, lambda msg: progress.update(preload_task, description=msg))
+                    playback["url"] = self.preload_stream(url, lambda msg: progress.update(preload_task, description=msg))
                 
-                preload_thread = threading.Thread(target=preload)
+                preload_thread = threading.Thread(target=preload, daemon=True)
                 preload_thread.start()
                 preload_thread.join(timeout=8)  # Max 8 seconds preload
                 
                 progress.remove_task(preload_task)
             
+            # Add the URL (the proxy keeps filling its buffer if the preload timed out)
+            if preload_thread.is_alive() and "\n" not in url:
+                playback["url"] = self.stream_proxy.register(url)
+            cmd.append(playback["url"])
+            
             # Show optimized player info panel
             player_panel = Panel(
                 f"[bold cyan]🎬 Now Streaming (Optimized)[/bold cyan]\n\n"
@@ -171,6 +2967,10 @@ class AnimeScraperUI:
             )
             self.console.print(player_panel)
             
+            if MpvPlayer.supported():
+                options = [option for option in cmd[1:-1] if not option.startswith('--title=')]
+                return self.play_in_mpv(playback["url"], episode_title, options, upcoming)
+            
             self.console.print(f"[cyan]🚀 Launching MPV with optimized settings...[/cyan]")
             
             # Run MPV with faster startup
@@ -180,6 +2980,7 @@ class AnimeScraperUI:
                 self.console.print(f"[green]✅ Video playback completed successfully[/green]")
             else:
                 self.console.print(f"[yellow]⚠️ MPV exited with code {result.returncode}[/yellow]")
+            return result.returncode
             
         except subprocess.CalledProcessError as e:
             self.console.print(f"[red]❌ Error running MPV: {e}[/red]")
@@ -193,73 +2994,110 @@ class AnimeScraperUI:
             self.console.print(f"\n[yellow]💡 Streaming URL (try in browser/VLC):[/yellow]")
             self.console.print(f"[blue]{url}[/blue]")
         except KeyboardInterrupt:
-            self.console.print(f"[yellow]⏹️ Video playback interrupted by user[/yellow]")
+            self.console.print(f"[yellow]⏹️ Video playback interrupted by user[/yellow]")
+    
+    def play_in_mpv(self, url, episode_title, options, upcoming=None):
+        """Play url in the persistent mpv and follow its playlist; returns 1 if the first file failed"""
+        player = self._components.get("mpv")
+        if player is not None and player.options != options:
+            player.close()
+            player = None
+        if player is None or not player.running():
+            self.console.print("[cyan]🚀 Launching MPV with optimized settings...[/cyan]")
+            player = self._components["mpv"] = MpvPlayer(options)
+        started = time.perf_counter()
+        player.play(url, episode_title)
+        
+        queued = None
+        def queue_next():
+            try:
+                next_url, next_title = next(upcoming)
+            except Exception:
+                return  # Last episode, or the next one could not be resolved
+            player.append(self.preload_stream(next_url), next_title)
+        
+        loaded = False
+        try:
+            while True:
+                try:
+                    event = player.events.get(timeout=0.5)
+                except queue.Empty:
+                    if not player.running():
+                        break
+                    continue
+                name = event.get("event")
+                if name == "start-file":
+                    title = player.current_title()
+                    if title:
+                        self.console.print(f"[green]▶️ Now playing: {title}[/green]")
+                    # Resolve the following episode while this one plays
+                    if upcoming is not None and (queued is None or not queued.is_alive()):
+                        queued = threading.Thread(target=queue_next, name="mpv-next", daemon=True)
+                        queued.start()
+                elif name == "file-loaded":
+                    loaded = True
+                elif name == "playback-restart" and started is not None:
+                    # First frame of the episode the user picked
+                    now = time.perf_counter()
+                    TRACER.record("mpv.start", started, now)
+                    if self.selected_at is not None:
+                        TRACER.record("time_to_first_frame", self.selected_at, now)
+                        self.selected_at = None
+                    started = None
+                elif name == "end-file" and event.get("reason") == "error" and not loaded:
+                    self.console.print(f"[yellow]⚠️ MPV could not open the stream ({event.get('file_error', 'error')})[/yellow]")
+                    return 1
+                elif name == "idle":
+                    # End of the playlist, unless the next episode is still being queued
+                    if queued is not None and queued.is_alive():
+                        queued.join()
+                        continue
+                    break
+                elif name == "shutdown":
+                    break
+        except KeyboardInterrupt:
+            if player.running():
+                player.command("stop")
+            self.console.print("[yellow]⏹️ Video playback interrupted by user[/yellow]")
+            return 0
+        
+        self.console.print("[green]✅ Video playback completed successfully[/green]")
+        return 0
+    
+    def stream_url_rejected(self, url):
+        """Check whether the CDN refuses a streaming URL (expired or revoked signature)"""
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+            "Referer": "https://videos.vid3rb.com/",
+            "Range": "bytes=0-0",
+        }
+        try:
+            response = self.scraper.get(url, headers=headers, stream=True, timeout=10)
+            response.close()
+            return response.status_code in (401, 403, 410)
+        except Exception:
+            return False
     
-    def extract_download_links(self, episode_url):
+    @traced("links")
+    def extract_download_links(self, episode_url, rate_limiter=None):
         """Extract download links for different qualities from episode page"""
+        remote = self.remote("links", episode_url=episode_url)
+        if remote is not None:
+            return remote
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            
-            response = self.scraper.get(episode_url, headers=headers)
+            # Uses the session's User-Agent: Cloudflare clearance is only valid for the UA it was issued to
+            response = self.fetch_page(episode_url, "episode", rate_limiter=rate_limiter)
             if response.status_code != 200:
                 return {"success": False, "error": f"HTTP {response.status_code}"}
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Find the download section
-            download_section = soup.select_one('div.flex.flex-col.rounded-lg.bg-gray-100\\/70.dark\\:bg-dark-700\\/30')
-            
-            if not download_section:
-                # Try alternative selectors
-                download_section = soup.find('div', class_=re.compile(r'.*rounded-lg.*bg-gray-100.*'))
-                
-            if not download_section:
-                return {"success": False, "error": "Download section not found"}
-            
-            download_links = {}
-            
-            # Find all download containers
-            download_containers = download_section.find_all('div', class_=re.compile(r'.*flex.*flex-col.*rounded-lg.*'))
-            
-            for container in download_containers:
-                # Look for quality label
-                label_element = container.find('label', class_=re.compile(r'.*font-light.*'))
-                if not label_element:
-                    continue
-                
-                quality_text = label_element.get_text(strip=True)
-                
-                # Extract quality info
-                quality = "Unknown"
-                size = "Unknown"
-                
-                if "1080p HEVC" in quality_text:
-                    quality = "1080p HEVC"
-                elif "1080p" in quality_text:
-                    quality = "1080p"
-                elif "720p" in quality_text:
-                    quality = "720p"
-                elif "480p" in quality_text:
-                    quality = "480p"
-                
-                # Find download link
-                download_link = container.find('a', href=True)
-                if download_link:
-                    url = download_link['href']
-                    
-                    # Extract file size from button text
-                    button_text = download_link.get_text(strip=True)
-                    size_match = re.search(r'\[([\d.]+\s*[^\]]+)\]', button_text)
-                    if size_match:
-                        size = size_match.group(1)
-                    
-                    download_links[quality] = {
-                        "url": url,
-                        "size": size,
-                        "quality_text": quality_text
-                    }
+            download_links = parse_download_links(response.content, self.parser_backend)
+            if download_links is None:
+                # Pages without a download section may carry the player's obfuscated server registry
+                registry = parse_server_registry(response.content)
+                if registry is None:
+                    return {"success": False, "error": "Download section not found"}
+                download_links = registry_download_links(registry)
+                self.registry_urls.update(info["url"] for info in download_links.values())
             
             return {"success": True, "links": download_links}
             
@@ -268,103 +3106,161 @@ class AnimeScraperUI:
     
     def display_quality_selection(self, episode, download_info, selected_index=0):
         """Display quality selection menu with arrow navigation"""
-        print("\033[H\033[J", end="")  # Clear screen without blinking
-        
-        # Format episode title
-        formatted_title = self.format_arabic_text(episode['title'], max_width=100)
-        
-        self.console.print(f"[bold cyan]{formatted_title}[/bold cyan]")
-        self.console.print(f"[dim]Episode {episode['num']} - Select Quality (Starts at 00:04 + Buffer)[/dim]\n")
-        
-        if not download_info["success"]:
-            self.console.print(f"[red]❌ Failed to extract download links: {download_info.get('error', 'Unknown error')}[/red]")
+        if not download_info["success"] or not download_info["links"]:
+            print("\033[H\033[J", end="")  # Clear screen without blinking
+            self.renderer.invalidate()
+            self.console.print(f"[bold cyan]{self.display_title(episode, 100)}[/bold cyan]")
+            self.console.print(f"[dim]Episode {episode['num']} - Select Quality (Starts at 00:04 + Buffer)[/dim]\n")
+            if not download_info["success"]:
+                self.console.print(f"[red]❌ Failed to extract download links: {download_info.get('error', 'Unknown error')}[/red]")
+            else:
+                self.console.print("[yellow]⚠️ No download links found for this episode[/yellow]")
             return None
         
-        links = download_info["links"]
-        if not links:
-            self.console.print("[yellow]⚠️ No download links found for this episode[/yellow]")
-            return None
+        links_list = list(download_info["links"].items())
+        from rich.table import Table
         
-        # Create quality selection table with arrow navigation
-        self.console.print("[bold cyan]═══ 🎬 Select Quality (Optimized Buffering) ═══[/bold cyan]")
-        
-        quality_table = Table(show_header=True, header_style="bold cyan")
-        quality_table.add_column("Selection", style="bright_green", width=12)
-        quality_table.add_column("Quality", style="bright_yellow", width=20)
-        quality_table.add_column("Size", style="bright_blue", width=25)
-        quality_table.add_column("Description", style="white", min_width=35)
-        
-        links_list = list(links.items())
-        for idx, (quality, info) in enumerate(links_list):
-            # Enhanced quality descriptions
-            descriptions = {
-                "1080p HEVC": "High quality, smaller size, best for streaming",
-                "1080p": "Full HD quality, larger buffer needed",
-                "720p": "HD quality, balanced performance",
-                "480p": "Standard quality, fastest streaming"
-            }
+        def build(highlighted):
+            # Format episode title
+            formatted_title = self.display_title(episode, 100)
             
-            description = descriptions.get(quality, "Standard quality")
+            # Create quality selection table with arrow navigation
+            quality_table = Table(show_header=True, header_style="bold cyan")
+            quality_table.add_column("Selection", style="bright_green", width=12)
+            quality_table.add_column("Quality", style="bright_yellow", width=20)
+            quality_table.add_column("Size", style="bright_blue", width=25)
+            quality_table.add_column("Description", style="white", min_width=35)
             
-            if idx == selected_index:
-                quality_table.add_row(
-                    f"[bright_green]> {idx + 1}[/bright_green]",
-                    f"[bold reverse yellow]{quality}[/]",
-                    f"[bold reverse yellow]{info['size']}[/]",
-                    f"[bold reverse yellow]{description}[/]"
-                )
-            else:
-                quality_table.add_row(
-                    f"[bright_green]  {idx + 1}[/bright_green]",
-                    quality,
-                    info["size"],
-                    description
-                )
-        
-        self.console.print(quality_table)
+            for idx, (quality, info) in enumerate(links_list):
+                # Enhanced quality descriptions
+                descriptions = {
+                    "1080p HEVC": "High quality, smaller size, best for streaming",
+                    "1080p": "Full HD quality, larger buffer needed",
+                    "720p": "HD quality, balanced performance",
+                    "480p": "Standard quality, fastest streaming"
+                }
+                
+                description = descriptions.get(quality, "Standard quality")
+                size = parse_size(info["size"])
+                if size:
+                    description += f" (~{size * 8 / EPISODE_DURATION / 1e6:.1f} Mbit/s)"
+                
+                if highlighted(idx):
+                    quality_table.add_row(
+                        f"[bright_green]> {idx + 1}[/bright_green]",
+                        f"[bold reverse yellow]{quality}[/]",
+                        f"[bold reverse yellow]{info['size']}[/]",
+                        f"[bold reverse yellow]{description}[/]"
+                    )
+                else:
+                    quality_table.add_row(
+                        f"[bright_green]  {idx + 1}[/bright_green]",
+                        quality,
+                        info["size"],
+                        description
+                    )
+            
+            return [
+                f"[bold cyan]{formatted_title}[/bold cyan]",
+                f"[dim]Episode {episode['num']} - Select Quality (Starts at 00:04 + Buffer)[/dim]\n",
+                "[bold cyan]═══ 🎬 Select Quality (Optimized Buffering) ═══[/bold cyan]",
+                quality_table,
+                # Enhanced instructions with buffering info
+                "\n[bold yellow]🚀 Optimization:[/bold yellow] 30s cache + 150MB buffer",
+                "[bold yellow]🕐 Timing:[/bold yellow] Starts at 00:04, preloads buffer to prevent lag",
+                "Use [bold magenta]↑[/]/[bold magenta]↓[/] arrows to select, [bold green]Enter[/] to stream, "
+                f"[bold cyan]a[/] to pick by measured speed, [bold cyan]r[/] to race all sources, [bold red]q[/] to go back.",
+            ]
         
-        # Enhanced instructions with buffering info
-        self.console.print(f"\n[bold yellow]🚀 Optimization:[/bold yellow] 30s cache + 150MB buffer")
-        self.console.print(f"[bold yellow]🕐 Timing:[/bold yellow] Starts at 00:04, preloads buffer to prevent lag")
-        self.console.print(f"Use [bold magenta]↑[/]/[bold magenta]↓[/] arrows to select, [bold green]Enter[/] to stream, [bold red]q[/] to go back.")
+        frame_key = ("quality", episode['url'], tuple(quality for quality, _ in links_list))
+        self.renderer.draw(frame_key, build, len(links_list), selected_index)
         
         return links_list
     
-    def get_streaming_url(self, download_url):
+    def get_streaming_url(self, download_url, refresh=False, show_progress=True):
         """Extract final streaming URL using yt-dlp with faster processing"""
+        if not refresh:
+            cached_url = self.stream_urls.get(download_url)
+            if cached_url:
+                return {"success": True, "url": cached_url, "cached": True}
+        else:
+            self.stream_urls.invalidate(download_url)
+        
+        def resolve():
+            remote = self.remote("stream_url", download_url=download_url, refresh=refresh)
+            return remote if remote is not None else self.resolve_with_retry(download_url)
+        
         try:
-            with Progress(
-                SpinnerColumn(),
-                TextColumn("[progress.description]{task.description}"),
-                console=self.console
-            ) as progress:
-                task = progress.add_task("🚀 Fast URL extraction...", total=None)
-                
-                # Use yt-dlp to get the actual streaming URL with faster options
-                cmd = [
-                    "yt-dlp",
-                    "--get-url",
-                    "--no-check-certificate",       # Skip SSL verification for speed
-                    "--extractor-args", "generic:impersonate",
-                    "--socket-timeout", "15",       # Faster timeout
-                    download_url
-                ]
-                
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=20  # Reduced timeout
-                )
+            if not show_progress:
+                result = resolve()
+            else:
+                from rich.progress import Progress, SpinnerColumn, TextColumn
                 
-                progress.remove_task(task)
+                with Progress(
+                    SpinnerColumn(),
+                    TextColumn("[progress.description]{task.description}"),
+                    console=self.console
+                ) as progress:
+                    task = progress.add_task("🚀 Fast URL extraction...", total=None)
+                    result = resolve()
+                    progress.remove_task(task)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        
+        if result["success"]:
+            self.stream_urls.put(download_url, result["url"])
+        return result
+    
+    def resolve_with_retry(self, download_url):
+        """Resolve, trying once more after a jittered pause when the failure looks transient"""
+        result = self.resolve_stream_url(download_url)
+        if not result["success"] and TRANSIENT_ERROR_RE.search(result.get("error") or ""):
+            time.sleep(RETRY_BASE_DELAY * random.uniform(0.5, 1.5))
+            result = self.resolve_stream_url(download_url)
+        return result
+    
+    def resolve_stream_url(self, download_url, backend=None):
+        """Resolve a download URL with the configured backend, falling back to the yt-dlp subprocess"""
+        backend = backend or self.resolver_backend
+        if download_url in self.registry_urls and DIRECT_MEDIA_RE.search(urlsplit(download_url).path):
+            # Decoded from the page's server registry and already a media file: nothing to extract
+            with TRACER.span("resolve", backend="registry", success=True):
+                return {"success": True, "url": download_url}
+        with TRACER.span("resolve", backend=backend) as span:
+            if backend in ("auto", "library"):
+                result = self.resolver.resolve(download_url)
+                if result["success"] or backend == "library":
+                    span.set(success=result["success"])
+                    return result
+            result = self.resolve_with_subprocess(download_url)
+            span.set(success=result["success"], subprocess=True)
+            return result
+    
+    def resolve_with_subprocess(self, download_url):
+        """Resolve a download URL by running the yt-dlp command line tool"""
+        try:
+            # Use yt-dlp to get the actual streaming URL with faster options
+            cmd = [
+                "yt-dlp",
+                "--get-url",
+                "--no-check-certificate",       # Skip SSL verification for speed
+                "--extractor-args", "generic:impersonate",
+                "--socket-timeout", "15",       # Faster timeout
+                download_url
+            ]
+            
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=YTDLP_TIMEOUT  # Reduced timeout
+            )
+            
+            if result.returncode == 0:
+                return {"success": True, "url": result.stdout.strip()}
+            else:
+                return {"success": False, "error": result.stderr}
                 
-                if result.returncode == 0:
-                    streaming_url = result.stdout.strip()
-                    return {"success": True, "url": streaming_url}
-                else:
-                    return {"success": False, "error": result.stderr}
-                    
         except subprocess.TimeoutExpired:
             return {"success": False, "error": "Timeout while extracting URL"}
         except FileNotFoundError:
@@ -372,12 +3268,167 @@ class AnimeScraperUI:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
+    def upcoming_streams(self, episode, quality):
+        """Yield (streaming URL, title) for the episodes after `episode`, resolving one per request"""
+        index = next((i for i, ep in enumerate(self.episodes) if ep["url"] == episode["url"]), None)
+        if index is None or quality is None:
+            return
+        for following in self.episodes[index + 1:]:
+            download_info = self.prefetcher.get(following["url"])
+            if not download_info["success"] or not download_info["links"]:
+                return
+            chosen = pick_quality(download_info["links"], quality)
+            url_result = self.get_streaming_url(download_info["links"][chosen]["url"], show_progress=False)
+            if not url_result["success"]:
+                return
+            yield url_result["url"], f"Episode {following['num']} - {following['title'][:50]}"
+    
+    def play_quality(self, episode, info, url_result, quality=None):
+        """Stream a resolved quality, re-resolving once if the signed URL was rejected; returns mpv's exit status"""
+        if not url_result["success"]:
+            self.console.print(f"[red]❌ Failed to extract streaming URL: {url_result['error']}[/red]")
+            return 1
+        
+        streaming_url = url_result["url"]
+        if url_result.get("cached"):
+            self.console.print("[green]⚡ Using cached streaming URL[/green]")
+        else:
+            self.console.print("[green]🔗 Streaming URL extracted successfully[/green]")
+        
+        # Format episode title for player
+        episode_title = f"Episode {episode['num']} - {episode['title'][:50]}"
+        
+        # Stream with optimized MPV function
+        returncode = self.stream_with_mpv(streaming_url, episode_title, upcoming=self.upcoming_streams(episode, quality))
+        
+        # An expired signed URL makes mpv fail; resolve a fresh one and retry once
+        if returncode not in (None, 0) and self.stream_url_rejected(streaming_url):
+            self.console.print("[yellow]🔄 Streaming URL expired, resolving a fresh one...[/yellow]")
+            url_result = self.get_streaming_url(info["url"], refresh=True)
+            if url_result["success"]:
+                returncode = self.stream_with_mpv(url_result["url"], episode_title)
+            else:
+                self.console.print(f"[red]❌ Failed to extract streaming URL: {url_result['error']}[/red]")
+        return returncode
+    
+    def auto_select_quality(self, links, duration=EPISODE_DURATION):
+        """Pick the best quality whose average bitrate the measured throughput sustains.
+
+        Candidates are tried best first. Each CDN host is probed with a short
+        ranged read unless it has a recent measurement in the throughput
+        history; the lowest quality is used when nothing fits.
+        """
+        import requests
+        order = [q for q in QUALITY_ORDER if q in links] + [q for q in links if q not in QUALITY_ORDER]
+        fallback = None
+        with requests.Session() as session:
+            for quality in order:
+                stream = self.get_streaming_url(links[quality]["url"], show_progress=False)
+                if not stream["success"]:
+                    continue
+                host = urlsplit(stream["url"]).netloc
+                rate = self.throughput.estimate(host)
+                probed = False  # Whether this candidate's rate was just measured, not taken from history
+                if rate is None:
+                    try:
+                        measured = probe_throughput(session, stream["url"])
+                    except Exception:
+                        measured = None
+                    if measured:
+                        rate = self.throughput.record(host, measured)
+                        probed = True
+                fallback = {"success": True, "quality": quality, "stream": stream, "throughput": rate, "probed": probed}
+                size = parse_size(links[quality]["size"])
+                if rate and size and rate >= size / duration * THROUGHPUT_HEADROOM:
+                    return fallback
+        return fallback or {"success": False, "error": "No quality could be resolved"}
+    
+    def race_sources(self, links, duration=EPISODE_DURATION, grace=RACE_GRACE, timeout=RACE_TIMEOUT):
+        """Resolve and range-probe every source at once and rank them for the quickest smooth start.
+
+        A source's start estimate is its time to first byte plus the time to
+        preload PRELOAD_BYTES at its early throughput; sources whose throughput
+        sustains their bitrate come first. Sources still running when the race
+        is decided are ranked last, unprobed, so they remain usable for failover.
+        Returns [{"quality", "stream", "ttfb", "throughput", "startup"}, ...].
+        """
+        import requests
+        
+        def attempt(quality):
+            stream = self.get_streaming_url(links[quality]["url"], show_progress=False)
+            if not stream["success"]:
+                return None
+            candidate = {"quality": quality, "stream": stream, "ttfb": None, "throughput": None, "startup": None}
+            if "\n" in stream["url"]:
+                return candidate  # Separate video/audio URLs: nothing single to probe
+            try:
+                with requests.Session() as session:
+                    ttfb, rate = probe_stream(session, stream["url"], length=RACE_PROBE_BYTES)
+            except Exception:
+                return None  # Resolved but the host refuses or times out
+            candidate["ttfb"], candidate["throughput"] = ttfb, rate
+            candidate["startup"] = ttfb + (PRELOAD_BYTES / rate if rate else 0)
+            if rate:
+                self.throughput.record(urlsplit(stream["url"]).netloc, rate)
+            return candidate
+        
+        with TRACER.span("race", sources=len(links)) as span:
+            executor = ThreadPoolExecutor(max_workers=min(len(links), RACE_WORKERS) or 1, thread_name_prefix="race")
+            futures = {executor.submit(attempt, quality): quality for quality in links}
+            deadline = time.monotonic() + timeout
+            first_ready = None
+            finished = []
+            pending = set(futures)
+            while pending and time.monotonic() < deadline:
+                done, pending = wait(pending, timeout=deadline - time.monotonic(), return_when=FIRST_COMPLETED)
+                finished += [future.result() for future in done if future.result()]
+                estimates = [c["startup"] for c in finished if c["startup"] is not None]
+                if estimates:
+                    # A probed source is ready: the others get a short grace period, never longer
+                    # than the best source needs to start (a slower one could not win back the wait)
+                    first_ready = first_ready or time.monotonic()
+                    deadline = min(deadline, first_ready + min(grace, min(estimates)))
+            executor.shutdown(wait=False, cancel_futures=True)
+            
+            def sustains(candidate):
+                size = parse_size(links[candidate["quality"]]["size"])
+                rate = candidate["throughput"]
+                return not (rate and size) or rate >= size / duration * THROUGHPUT_HEADROOM
+            
+            probed = sorted(
+                (c for c in finished if c["startup"] is not None),
+                key=lambda c: (not sustains(c), c["startup"])
+            )
+            ranked = probed + [c for c in finished if c["startup"] is None]
+            # Unfinished sources are resolved again on demand if playback has to fail over to them
+            ranked += [{"quality": futures[future], "stream": None, "ttfb": None, "throughput": None, "startup": None}
+                       for future in pending]
+            if ranked:
+                span.set(winner=ranked[0]["quality"], finished=len(finished))
+            return ranked
+    
+    def play_raced(self, episode, links, ranked):
+        """Play the race winner, failing over down the ranking when a source cannot be played"""
+        for position, candidate in enumerate(ranked):
+            quality = candidate["quality"]
+            stream = candidate["stream"] or self.get_streaming_url(links[quality]["url"])
+            if position:
+                self.console.print(f"[yellow]🔁 Failing over to {quality}...[/yellow]")
+            returncode = self.play_quality(episode, links[quality], stream, quality)
+            if returncode in (None, 0):
+                return returncode
+        self.console.print("[red]❌ None of the sources could be played[/red]")
+        return 1
+    
     def handle_quality_selection(self, episode, links_list):
         """Handle user quality selection with arrow navigation"""
+        import readchar
+        
         if not links_list:
             return
         
         selected_index = 0
+        self.renderer.invalidate()
         
         while True:
             # Display quality options with current selection
@@ -397,283 +3448,1019 @@ class AnimeScraperUI:
                     # Select current quality
                     quality, info = links_list[selected_index]
                     
+                    self.selected_at = time.perf_counter()
                     self.console.print(f"\n[bold green]✅ Selected: {quality} ({info['size']})[/bold green]")
                     self.console.print(f"[cyan]🚀 Optimizing for lag-free playback...[/cyan]")
                     
                     # Extract streaming URL
-                    url_result = self.get_streaming_url(info["url"])
+                    self.play_quality(episode, info, self.get_streaming_url(info["url"]), quality)
                     
-                    if url_result["success"]:
-                        streaming_url = url_result["url"]
-                        self.console.print(f"[green]🔗 Streaming URL extracted successfully[/green]")
-                        
-                        # Format episode title for player
-                        episode_title = f"Episode {episode['num']} - {episode['title'][:50]}"
-                        
-                        # Stream with optimized MPV function
-                        self.stream_with_mpv(streaming_url, episode_title)
-                        
+                    self.console.print("\n[dim]Press Enter to continue...[/dim]")
+                    readchar.readkey()
+                    return
+                elif key.lower() == 'a':
+                    self.selected_at = time.perf_counter()
+                    self.console.print("\n[cyan]📶 Measuring connection speed...[/cyan]")
+                    choice = self.auto_select_quality(dict(links_list))
+                    if choice["success"]:
+                        info = dict(links_list)[choice["quality"]]
+                        speed = f"{choice['throughput'] * 8 / 1e6:.1f} Mbit/s" if choice["throughput"] else "unknown speed"
+                        source = "measured" if choice["probed"] else "from history"
+                        self.console.print(f"[bold green]✅ Auto: {choice['quality']} ({info['size']}) at {speed} ({source})[/bold green]")
+                        self.play_quality(episode, info, choice["stream"], choice["quality"])
                     else:
-                        self.console.print(f"[red]❌ Failed to extract streaming URL: {url_result['error']}[/red]")
+                        self.console.print(f"[red]❌ Failed to extract streaming URL: {choice['error']}[/red]")
                     
                     self.console.print(f"\n[dim]Press Enter to continue...[/dim]")
                     readchar.readkey()
                     return
+                elif key.lower() == 'r':
+                    self.selected_at = time.perf_counter()
+                    self.console.print(f"\n[cyan]🏁 Racing {len(links_list)} sources...[/cyan]")
+                    links = dict(links_list)
+                    ranked = self.race_sources(links)
+                    if ranked:
+                        for candidate in ranked:
+                            if candidate["startup"] is not None:
+                                speed = f"{candidate['throughput'] * 8 / 1e6:.1f} Mbit/s" if candidate["throughput"] else "?"
+                                self.console.print(f"[dim]  {candidate['quality']}: first byte {candidate['ttfb'] * 1000:.0f} ms, {speed}[/dim]")
+                        self.console.print(f"[bold green]✅ Fastest: {ranked[0]['quality']} ({links[ranked[0]['quality']]['size']})[/bold green]")
+                        self.play_raced(episode, links, ranked)
+                    else:
+                        self.console.print("[red]❌ No source could be resolved[/red]")
+                    
+                    self.console.print("\n[dim]Press Enter to continue...[/dim]")
+                    readchar.readkey()
+                    return
                 elif key.lower() == 'q':
                     return
                     
             except KeyboardInterrupt:
                 return
     
+    def resolve_batch(self, inputs, emit, episodes="all", quality=None, stream=False, workers=RESOLVE_WORKERS,
+                      rate_limiter=None):
+        """Headless search -> episodes -> download links (-> streaming URL) for each input line.
+
+        Inputs are search queries (first result is used) or anime page URLs and
+        are consumed lazily: at most `workers` inputs, counting their episodes,
+        are in flight before the next line is read. emit() gets one JSON-ready record per episode, or
+        per failed input, as soon as it is ready. Returns the number of records
+        that carry an error. rate_limiter spaces every page fetch and streaming
+        URL lookup of the batch (default: self.rate_limiter).
+        """
+        rate_limiter = rate_limiter or self.rate_limiter
+        outstanding = [0]
+        failures = [0]
+        idle = threading.Condition()
+        slots = threading.Semaphore(workers)   # One per input being resolved, held until its last episode is done
+        
+        def public(record):
+            # Display titles are a terminal rendering detail (and keyed by int width)
+            return {key: value for key, value in record.items() if key != "display"}
+        
+        def report(record):
+            if "error" in record:
+                with idle:
+                    failures[0] += 1
+            emit(record)
+        
+        def resolve_episode(source, anime, episode):
+            record = {"input": source, "anime": public(anime), "episode": public(episode)}
+            download_info = self.extract_download_links(episode["url"], rate_limiter=rate_limiter)
+            if not download_info["success"]:
+                record["error"] = download_info["error"]
+                report(record)
+                return
+            links = download_info["links"]
+            chosen = pick_quality(links, quality or QUALITY_ORDER[0]) if (quality or stream) else None
+            record["links"] = {chosen: links[chosen]} if quality and chosen else links
+            if stream and chosen:
+                download_url = links[chosen]["url"]
+                if rate_limiter is not None:
+                    rate_limiter.wait(download_url)
+                url_result = self.get_streaming_url(download_url, show_progress=False)
+                record["quality"] = chosen
+                if url_result["success"]:
+                    record["stream_url"] = url_result["url"]
+                    record["stream_expires"] = stream_url_expiry(url_result["url"])
+                else:
+                    record["error"] = url_result["error"]
+            report(record)
+        
+        def resolve_input(source, group):
+            if source.startswith(("http://", "https://")):
+                anime = {"title": urlsplit(source).path.rstrip("/").rpartition("/")[2] or "Anime", "url": source}
+            else:
+                status, results, _ = self.search_page(f"{self.site_url}/search?q={quote(source)}", rate_limiter=rate_limiter)
+                if status != 200:
+                    report({"input": source, "error": f"Search failed: HTTP {status}"})
+                    return
+                if not results:
+                    report({"input": source, "error": "No results found"})
+                    return
+                if self.catalog is not None:
+                    self.catalog.add(results)
+                anime = results[0]
+            
+            try:
+                anime_episodes = EpisodeList(self.iter_episodes(anime["url"], rate_limiter=rate_limiter))
+            except Exception as e:
+                report({"input": source, "anime": public(anime), "error": str(e)})
+                return
+            if not anime_episodes:
+                report({"input": source, "anime": public(anime), "error": "No episodes found"})
+                return
+            wanted = set(parse_episode_range(episodes, max(ep["num"] for ep in anime_episodes)))
+            for episode in anime_episodes:
+                if episode["num"] in wanted:
+                    submit(group, resolve_episode, source, anime, episode)
+        
+        def run(group, task, source, *args):
+            try:
+                task(source, *args)
+            except Exception as e:
+                report({"input": source, "error": str(e)})
+            finally:
+                with idle:
+                    outstanding[0] -= 1
+                    group[0] -= 1
+                    if not group[0]:
+                        slots.release()
+                    idle.notify_all()
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="resolve") as pool:
+            def submit(group, task, source, *args):
+                # Counted before the parent task finishes, so the totals only reach 0 at the very end
+                with idle:
+                    outstanding[0] += 1
+                    group[0] += 1
+                pool.submit(run, group, task, source, *args)
+            
+            for line in inputs:
+                source = line.strip()
+                if source and not source.startswith("#"):
+                    slots.acquire()
+                    group = [0]     # Tasks still running for this input
+                    submit(group, resolve_input, source, group)
+            with idle:
+                idle.wait_for(lambda: outstanding[0] == 0)
+        return failures[0]
+    
+    def batch_download(self, anime_title, episodes, numbers, quality, output_dir,
+                       connections=DOWNLOAD_CONNECTIONS, segments=DOWNLOAD_SEGMENTS, rate_limit=None):
+        """Resolve and download a set of episodes concurrently as segmented range requests"""
+        from rich.progress import (Progress, TextColumn, BarColumn, DownloadColumn,
+                                   TransferSpeedColumn, TimeRemainingColumn)
+        
+        selected = [ep for ep in episodes if ep['num'] in set(numbers)]
+        if not selected:
+            self.console.print("[yellow]⚠️ No episodes in that range[/yellow]")
+            return False
+        os.makedirs(output_dir, exist_ok=True)
+        
+        downloader = SegmentedDownloader(connections=connections, segments=segments, rate_limit=rate_limit)
+        # Files download side by side; the downloader's pool caps total connections
+        files = ThreadPoolExecutor(max_workers=min(len(selected), connections), thread_name_prefix="episode")
+        failures = []
+        
+        try:
+            with Progress(
+                TextColumn("[progress.description]{task.description}"),
+                BarColumn(),
+                DownloadColumn(),
+                TransferSpeedColumn(),
+                TimeRemainingColumn(),
+                console=self.console
+            ) as progress:
+                def fetch(ep):
+                    label = f"Episode {ep['num']}"
+                    task = progress.add_task(f"{label} 🔍 resolving", total=None)
+                    try:
+                        download_info = self.prefetcher.get(ep['url'])
+                        if not download_info["success"]:
+                            raise IOError(download_info.get("error", "Unknown error"))
+                        chosen = pick_quality(download_info["links"], quality)
+                        if chosen is None:
+                            raise IOError("No download links found")
+                        url_result = self.get_streaming_url(download_info["links"][chosen]["url"], show_progress=False)
+                        if not url_result["success"]:
+                            raise IOError(url_result["error"].strip())
+                        
+                        stream_url = url_result["url"].splitlines()[0]
+                        extension = os.path.splitext(urlsplit(stream_url).path)[1] or ".mp4"
+                        path = os.path.join(output_dir, safe_filename(f"{anime_title} - {ep['num']:02d} [{chosen}]") + extension)
+                        progress.update(task, description=f"{label} ⬇️ {chosen}")
+                        downloader.download(
+                            stream_url, path,
+                            on_start=lambda size, done: progress.update(task, total=size, completed=done),
+                            on_bytes=lambda count: progress.advance(task, count)
+                        )
+                        progress.update(task, description=f"{label} ✅ {chosen}")
+                    except Exception as e:
+                        failures.append((ep, str(e)))
+                        progress.update(task, description=f"{label} ❌ failed")
+                
+                list(files.map(fetch, selected))
+        finally:
+            # Also on Ctrl+C or an error: running segments save their progress and stop, so the
+            # .part files resume next time, and unstarted episodes are dropped
+            downloader.close()
+            files.shutdown(wait=False, cancel_futures=True)
+        for ep, error in failures:
+            self.console.print(f"[red]❌ Episode {ep['num']}: {error}[/red]")
+        self.console.print(f"[green]✅ Downloaded {len(selected) - len(failures)}/{len(selected)} episode(s) to {output_dir}[/green]")
+        return not failures
+    
+    def prompt_batch_download(self, episodes, selected):
+        """Ask for an episode range and quality, then download them"""
+        from rich.prompt import Prompt
+        
+        anime_title = (self.current_anime or {}).get("title", "Anime")
+        try:
+            spec = Prompt.ask("Episodes to download (e.g. 1-24, 3,5,7-9, all)", default=f"{episodes[selected]['num']}-{episodes[-1]['num']}")
+            numbers = parse_episode_range(spec, max(ep['num'] for ep in episodes))
+            quality = Prompt.ask("Quality", choices=list(QUALITY_ORDER), default="720p")
+            output_dir = Prompt.ask("Save to", default=os.path.join(os.getcwd(), safe_filename(anime_title)))
+        except ValueError as e:
+            self.console.print(f"[red]❌ {e}[/red]")
+            return
+        self.batch_download(anime_title, episodes, numbers, quality, output_dir)
+    
     def search_anime(self, anime_name):
-        """Search for anime and return results"""
+        """Search for anime and return results; later result pages keep arriving in the background"""
         self.console.print(f"[yellow]🔍 Searching for anime...[/yellow]")
         
-        search_url = f"https://anime3rb.com/search?q={quote(anime_name)}"
+        search_url = f"{self.site_url}/search?q={quote(anime_name)}"
+        self._search_generation += 1
+        self.search_status = None
         
         try:
-            response = self.scraper.get(search_url)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                titles = soup.select('div[class*="title-card"]')
-                
+            with TRACER.span("search", query=anime_name):
+                status, results, page_count = self.search_page(search_url)
+            if status == 200:
+                seen = set()
                 self.anime_choices = []
-                for title in titles:
-                    title_element = title.select_one('h2.title-name')
-                    url_element = title.select_one('a.btn.btn-md.btn-plain.w-full')
-                    if title_element and url_element:
-                        anime_title = title_element.text.strip()
-                        anime_url = url_element['href']
-                        self.anime_choices.append({"title": anime_title, "url": anime_url})
-                
+                self.add_search_results(self.anime_choices, seen, results)
+                last_page = min(page_count, SEARCH_MAX_PAGES)
+                if last_page > 1 and self.anime_choices:
+                    self.search_status = f"Loading page 2/{last_page}..."
+                    threading.Thread(
+                        target=self._search_more_pages,
+                        args=(search_url, last_page, self.anime_choices, seen, self._search_generation),
+                        name="search-pages", daemon=True,
+                    ).start()
                 return len(self.anime_choices) > 0
             else:
-                self.console.print(f"[red]Failed to fetch search results. Status code: {response.status_code}[/red]")
-                return False
+                self.console.print(f"[red]Failed to fetch search results. Status code: {status}[/red]")
+                return self.search_catalog(anime_name)
         except Exception as e:
             self.console.print(f"[red]Error during search: {str(e)}[/red]")
+            return self.search_catalog(anime_name)
+    
+    def search_page(self, url, rate_limiter=None):
+        """Fetch and parse one search result page: (status code, results, highest linked page number)"""
+        remote = self.remote("search_page", url=url)
+        if remote is not None:
+            return remote["status"], remote["results"], remote["pages"]
+        response = self.fetch_page(url, "search", rate_limiter=rate_limiter)
+        if response.status_code != 200:
+            return response.status_code, [], 0
+        return 200, parse_search_results(response.content, self.parser_backend), parse_search_page_count(response.content)
+    
+    def search_catalog(self, anime_name):
+        """Offer offline catalog matches when the live search is unavailable"""
+        matches = self.catalog.search(anime_name, limit=50) if self.catalog is not None else []
+        if not matches:
             return False
+        self.console.print(f"[yellow]📚 Showing {len(matches)} match(es) from the offline catalog[/yellow]")
+        self.anime_choices = attach_display_titles(matches)
+        return True
+    
+    def prompt_query(self):
+        """Read a search query, listing offline catalog matches as the user types.
+
+        Returns (query, record): record is the catalog entry picked with the
+        arrow keys, or None when the query should be searched online.
+        """
+        if not sys.stdin.isatty() or self.catalog is None or not len(self.catalog):
+            return Prompt.ask("[bold blue]🔍 Enter anime search query[/bold blue]"), None
+        import readchar
+        from rich.table import Table
+        
+        query = ""
+        selected = -1  # -1: the query itself, otherwise a suggestion row
+        self.renderer.invalidate()
+        while True:
+            matches = attach_display_titles(self.catalog.search(query)) if query.strip() else []
+            selected = min(selected, len(matches) - 1)
+            
+            def build(highlighted):
+                table = Table(show_header=True, header_style="bold cyan")
+                table.add_column("No.", style="dim", width=4)
+                table.add_column("Known titles (offline catalog)", style="bold white", min_width=60)
+                for idx, match in enumerate(matches):
+                    title = self.display_title(match, 80)
+                    if highlighted(idx):
+                        table.add_row(f"[bright_green]> {idx + 1}[/bright_green]", f"[bold reverse yellow]{title}[/]")
+                    else:
+                        table.add_row(f"[bright_green]  {idx + 1}[/bright_green]", title)
+                return [
+                    f"[bold blue]🔍 Enter anime search query:[/bold blue] {self.format_arabic_text(query, 80) if query else ''}▌",
+                    table,
+                    "Use [bold magenta]↑[/]/[bold magenta]↓[/] to pick a known title, [bold green]Enter[/] to open it or search online.",
+                ]
+            
+            self.renderer.draw(("query", query, tuple(match["url"] for match in matches)), build, len(matches), selected)
+            
+            key = readchar.readkey()
+            if key in (readchar.key.ENTER, "\r", "\n"):
+                if selected >= 0:
+                    return query, matches[selected]
+                if query.strip():
+                    return query, None
+            elif key in (readchar.key.BACKSPACE, "\x7f", "\b"):
+                query = query[:-1]
+                selected = -1
+            elif key == readchar.key.UP:
+                selected = max(selected - 1, -1)
+            elif key == readchar.key.DOWN:
+                selected = min(selected + 1, len(matches) - 1)
+            elif key == readchar.key.CTRL_C:
+                raise KeyboardInterrupt
+            elif len(key) == 1 and key.isprintable():
+                query += key
+                selected = -1
+    
+    def add_search_results(self, choices, seen, results):
+        """Append results whose URL is not listed yet, and record them in the offline catalog"""
+        fresh = [result for result in results if result["url"] not in seen]
+        seen.update(result["url"] for result in fresh)
+        choices.extend(attach_display_titles(fresh))
+        if self.catalog is not None and fresh:
+            self.catalog.add(fresh)
+    
+    def _search_more_pages(self, search_url, last_page, choices, seen, generation):
+        """Fetch result pages 2..last_page concurrently, appending them to choices in page order"""
+        def fetch(page):
+            return self.search_page(f"{search_url}&page={page}")[1:]
+        
+        done = {}       # page -> parsed results waiting for the pages before them
+        next_page = 2
+        try:
+            with ThreadPoolExecutor(max_workers=SEARCH_PAGE_CONCURRENCY, thread_name_prefix="search") as pool:
+                futures = {pool.submit(fetch, page): page for page in range(2, last_page + 1)}
+                while futures:
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    if generation != self._search_generation:
+                        for future in futures:
+                            future.cancel()
+                        return
+                    for future in finished:
+                        page = futures.pop(future)
+                        try:
+                            done[page], page_count = future.result()
+                        except Exception:
+                            done[page], page_count = [], 0
+                        # Pagination may only link nearby pages; follow newly revealed ones
+                        for extra in range(last_page + 1, min(page_count, SEARCH_MAX_PAGES) + 1):
+                            futures[pool.submit(fetch, extra)] = extra
+                        last_page = max(last_page, min(page_count, SEARCH_MAX_PAGES))
+                
+                    with self._menu_lock:
+                        while next_page in done:
+                            self.add_search_results(choices, seen, done.pop(next_page))
+                            next_page += 1
+                        self.search_status = f"Loading page {next_page}/{last_page}..." if futures else None
+                        if self._menu_refresh:
+                            self._menu_refresh()
+        finally:
+            # Also after an error: nothing loads any more, and run_index waits for this to clear
+            with self._menu_lock:
+                if generation == self._search_generation and self.search_status is not None:
+                    self.search_status = None
+                    if self._menu_refresh:
+                        self._menu_refresh()
 
     def print_anime_menu(self, anime_list, selected_index):
         """Print anime selection menu with proper Arabic RTL support"""
-        print("\033[H\033[J", end="")  # Clear screen without blinking
-        table = Table(show_header=True, header_style="bold cyan")
-        table.add_column("No.", style="dim", width=4)
-        table.add_column("Anime Title", style="bold white", min_width=60)
-        
-        for idx, anime in enumerate(anime_list):
-            no = str(idx+1)
-            # Format Arabic title properly using reshaper and bidi
-            title = self.format_arabic_text(anime["title"], max_width=80)
-            
-            if idx == selected_index:
-                table.add_row(f"[bright_green]> {no}[/bright_green]", f"[bold reverse yellow]{title}[/]")
-            else:
-                table.add_row(f"[bright_green]  {no}[/bright_green]", title)
+        from rich.table import Table
+        
+        def build(highlighted):
+            table = Table(show_header=True, header_style="bold cyan")
+            table.add_column("No.", style="dim", width=4)
+            table.add_column("Anime Title", style="bold white", min_width=60)
+            
+            for idx, anime in enumerate(anime_list):
+                no = str(idx+1)
+                # Format Arabic title properly using reshaper and bidi
+                title = self.display_title(anime, 80)
+                
+                if highlighted(idx):
+                    table.add_row(f"[bright_green]> {no}[/bright_green]", f"[bold reverse yellow]{title}[/]")
+                else:
+                    table.add_row(f"[bright_green]  {no}[/bright_green]", title)
+            
+            lines = [
+                table,
+                "\nUse [bold magenta]↑[/]/[bold magenta]↓[/] arrows to select, [bold yellow]g[/bold yellow] to jump, [bold green]Enter[/] to show episodes, [bold red]q[/] to exit.",
+            ]
+            if status:
+                lines.append(f"[dim]⏳ {status}[/dim]")
+            return lines
         
-        self.console.print(table)
-        self.console.print(f"\nUse [bold magenta]↑[/]/[bold magenta]↓[/] arrows to select, [bold yellow]g[/bold yellow] to jump, [bold green]Enter[/] to show episodes, [bold red]q[/] to exit.")
+        status = self.search_status
+        self.renderer.draw(("anime", id(anime_list), len(anime_list), status), build, len(anime_list), selected_index)
 
     def select_anime(self, anime_list):
         """Handle anime selection using wit_anime style navigation"""
+        import readchar
+        
         selected = 0
-        self.print_anime_menu(anime_list, selected)
+        with self._menu_lock:
+            self.renderer.invalidate()
+            self.print_anime_menu(anime_list, selected)
+            # Results from later search pages redraw the menu as they arrive
+            self._menu_refresh = lambda: self.print_anime_menu(anime_list, selected)
         
-        while True:
-            key = readchar.readkey()
-            if key in (readchar.key.UP, "k"):
-                selected = (selected - 1) % len(anime_list)
-                self.print_anime_menu(anime_list, selected)
-            elif key in (readchar.key.DOWN, "j"):
-                selected = (selected + 1) % len(anime_list)
-                self.print_anime_menu(anime_list, selected)
-            elif key.lower() == 'g':
-                try:
-                    num = int(Prompt.ask("Go to anime number")) - 1
-                    if 0 <= num < len(anime_list):
-                        selected = num
+        try:
+            while True:
+                key = readchar.readkey()
+                with self._menu_lock:
+                    if key in (readchar.key.UP, "k"):
+                        selected = (selected - 1) % len(anime_list)
                         self.print_anime_menu(anime_list, selected)
-                except Exception:
-                    pass
-            elif key in (readchar.key.ENTER, "\r", "\n"):
-                return selected
-            elif key in ("q", readchar.key.CTRL_C):
-                sys.exit(0)
+                    elif key in (readchar.key.DOWN, "j"):
+                        selected = (selected + 1) % len(anime_list)
+                        self.print_anime_menu(anime_list, selected)
+                    elif key.lower() == 'g':
+                        try:
+                            num = int(Prompt.ask("Go to anime number")) - 1
+                            if 0 <= num < len(anime_list):
+                                selected = num
+                        except Exception:
+                            pass
+                        self.renderer.invalidate()
+                        self.print_anime_menu(anime_list, selected)
+                    elif key in (readchar.key.ENTER, "\r", "\n"):
+                        return selected
+                    elif key in ("q", readchar.key.CTRL_C):
+                        sys.exit(0)
+        finally:
+            self._menu_refresh = None
                 
-    def fetch_episodes(self, anime_url):
-        """Fetch episodes from selected anime"""
+    def iter_episodes(self, anime_url, rate_limiter=None):
+        """Yield episode records while the anime page downloads; cached pages are parsed in chunks too"""
+        rate_limiter = rate_limiter or self.rate_limiter
+        client = self.daemon
+        if client is not None:
+            received = 0
+            try:
+                for episode in client.stream("episodes", url=anime_url):
+                    received += 1
+                    yield episode
+                return
+            except (OSError, ValueError):
+                if received:
+                    raise
+                self._components["daemon"] = None  # Gone before the first row: load it here instead
+        content = self.cache.get(anime_url, "anime") if self.cache else None
+        if content is None:
+            if rate_limiter is not None:
+                rate_limiter.wait(anime_url)
+            with TRACER.span("fetch", page_type="anime", url=anime_url) as span:
+                stream = self.http.stream(anime_url)
+                if stream is not None:
+                    received = [] if self.cache else None  # Raw bytes for the response cache; no tree is ever built
+                    size = 0
+                    
+                    def chunks():
+                        nonlocal size
+                        for chunk in stream:
+                            size += len(chunk)
+                            if received is not None:
+                                received.append(chunk)
+                            yield chunk
+                    
+                    yield from iter_parse_episodes(chunks())
+                    span.set(status=200, bytes=size, cached=False)
+                    if received is not None:
+                        self.cache.put(anime_url, "anime", b"".join(received))
+                    return
+                span.set(fallback=True)  # Fetched again below through fetch_page
+            response = self.fetch_page(anime_url, "anime", rate_limiter=rate_limiter)
+            if response.status_code != 200:
+                raise IOError(f"Status code: {response.status_code}")
+            content = response.content
+        yield from iter_parse_episodes(iter_chunks(content))
+    
+    def fetch_episodes(self, anime_url, first_screen=EPISODE_FIRST_SCREEN):
+        """Fetch episodes from selected anime; returns once the first screen is parsed, the rest keeps streaming in.
+        first_screen=None waits for the whole list."""
         self.console.print(f"[yellow]📺 Loading episodes...[/yellow]")
         
-        try:
-            response = self.scraper.get(anime_url)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-                episodes = soup.select('div.video-data')
-                
-                self.episodes = []
-                for i, episode in enumerate(episodes):
-                    episode_url_element = episode.find_parent('a')
-                    episode_title_element = episode.select_one('p.font-light.text-sm')
-                    
-                    if episode_url_element and episode_title_element:
-                        episode_url = episode_url_element['href']
-                        episode_title = episode_title_element.text.strip()
-                        self.episodes.append({
-                            'num': i + 1,
-                            'title': episode_title,
-                            'url': episode_url
-                        })
-                
-                return len(self.episodes) > 0
+        episodes = self.episodes = EpisodeList()
+        self.episodes_status = "Loading episodes..."
+        ready = threading.Event()
+        errors = []
+        
+        def refresh(block):
+            if self.episodes is episodes and self._menu_lock.acquire(blocking=block):
+                try:
+                    if self._menu_refresh:
+                        self._menu_refresh()
+                finally:
+                    self._menu_lock.release()
+        
+        def load():
+            with TRACER.span("episodes", url=anime_url) as span:
+                started = time.perf_counter()
+                redrawn = 0
+                try:
+                    for episode in self.iter_episodes(anime_url):
+                        episodes.append(episode)
+                        if len(episodes) == 1:
+                            span.set(first_row_ms=round((time.perf_counter() - started) * 1000, 1))
+                        if len(episodes) == first_screen:
+                            ready.set()
+                        elif first_screen and len(episodes) > first_screen and time.monotonic() - redrawn > 0.2:
+                            # Update the page count under the open menu, without waiting for it
+                            if self.episodes is episodes:
+                                self.episodes_status = f"Loading episodes... ({len(episodes)} so far)"
+                            refresh(block=False)
+                            redrawn = time.monotonic()
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    span.set(episodes=len(episodes))
+                    if self.episodes is episodes:
+                        self.episodes_status = None
+                    ready.set()
+                    refresh(block=True)
+        
+        threading.Thread(target=load, name="episodes", daemon=True).start()
+        ready.wait()
+        if episodes:
+            return True
+        if errors:
+            message = str(errors[0])
+            if message.startswith("Status code"):
+                self.console.print(f"[red]Failed to fetch episodes. {message}[/red]")
             else:
-                self.console.print(f"[red]Failed to fetch episodes. Status code: {response.status_code}[/red]")
-                return False
-        except Exception as e:
-            self.console.print(f"[red]Error fetching episodes: {str(e)}[/red]")
-            return False
+                self.console.print(f"[red]Error fetching episodes: {message}[/red]")
+        return False
 
     def episode_menu(self, episodes, page_size=30):
-        """Episode menu with optimized streaming functionality"""
-        total = len(episodes)
-        if total == 0:
+        """Episode menu with optimized streaming functionality.
+
+        Only the visible page is rendered; `g` jumps by episode number and `/`
+        filters by number or title as the user types, both without a prompt.
+        """
+        import readchar
+        from rich.markup import escape
+        
+        if len(episodes) == 0:
             self.console.print("[red]No episodes found.[/red]")
             Prompt.ask("Press Enter to exit.")
             sys.exit(0)
+        if not isinstance(episodes, EpisodeList):
+            episodes = EpisodeList(episodes)
             
         page = 0
-        selected = 0
-        max_page = (total - 1) // page_size
+        selected = 0            # Cursor position in the view
+        view = None             # Episode indices matching the filter, or None for all of them
+        scanned = 0             # Rows the filter has looked at so far
+        filter_text = ""
+        history = []            # (filter text, view, scanned) before each typed character
+        entry = None            # ("g" or "/", text) while typing a jump or a filter
         
-        def render_episodes():
-            print("\033[H\033[J", end="")
+        # Have yt-dlp imported and ready by the time a quality is picked
+        if self.resolver_backend != "subprocess" and self.daemon is None:
+            self.resolver.warm()
+        
+        from rich.table import Table
+        
+        def count():
+            return len(view) if view is not None else len(episodes)
+        
+        def index(position):
+            return view[position] if view is not None else position
+        
+        def move_to(position):
+            nonlocal page, selected
+            page, selected = position // page_size, position
+        
+        def set_filter(text):
+            nonlocal view, scanned, filter_text
+            if not text:
+                view, scanned, filter_text = None, 0, ""
+                history.clear()
+                return
+            history.append((filter_text, view, scanned))
+            scanned = len(episodes)
+            # A longer query only narrows the previous matches
+            view = episodes.matches(text, within=view, stop=scanned)
+            filter_text = text
+            move_to(0)
+        
+        def render_episodes(full=False):
+            nonlocal scanned
+            # The list may still be growing while the page streams in
+            if view is not None and len(episodes) > scanned:
+                stop = len(episodes)
+                view.extend(episodes.matches(filter_text, start=scanned, stop=stop))
+                scanned = stop
+            total = count()
+            max_page = max(0, total - 1) // page_size
+            status = self.episodes_status
+            if total:
+                # Resolve quality lists for the cursor and the next episodes while the user browses
+                self.prefetcher.schedule(episodes, index(selected))
+            if full:
+                self.renderer.invalidate()
             start = page * page_size
             end = min(start + page_size, total)
-            table = Table(show_header=True, header_style="bold cyan")
-            table.add_column("No.", style="bright_green", width=6)
-            table.add_column("Episode Title", style="bold white", min_width=70)
-            
-            for idx in range(start, end):
-                ep = episodes[idx]
-                num_str = str(ep["num"])
-                # Apply proper Arabic RTL formatting to episode titles
-                episode_title = self.format_arabic_text(ep["title"], max_width=80)
+            
+            def build(highlighted):
+                table = Table(show_header=True, header_style="bold cyan")
+                table.add_column("No.", style="bright_green", width=6)
+                table.add_column("Episode Title", style="bold white", min_width=70)
                 
-                if idx == selected:
-                    table.add_row(f"[bright_green]> {num_str}[/bright_green]", f"[bold reverse yellow]{episode_title}[/]")
-                else:
-                    table.add_row(f"[bright_green]  {num_str}[/bright_green]", episode_title)
+                for position in range(start, end):
+                    ep = episodes[index(position)]
+                    num_str = str(ep["num"])
+                    # Apply proper Arabic RTL formatting to episode titles
+                    episode_title = self.display_title(ep, 80)
+                    
+                    if highlighted(position - start):
+                        table.add_row(f"[bright_green]> {num_str}[/bright_green]", f"[bold reverse yellow]{episode_title}[/]")
+                    else:
+                        table.add_row(f"[bright_green]  {num_str}[/bright_green]", episode_title)
+                
+                counts = f"\nPage {page+1}/{max_page+1} | Episodes {min(start+1, end)}-{end} of {total}"
+                if view is not None:
+                    counts += f" matching '{escape(filter_text)}' ({len(episodes)} in all)"
+                lines = [
+                    table,
+                    counts,
+                    "Use [bold magenta]↑[/]/[bold magenta]↓[/] to move, [bold magenta]←[/]/[bold magenta]→[/] for page, [bold yellow]g[/bold yellow] to jump, [bold yellow]/[/bold yellow] to filter",
+                    "[bold green]Enter[/] for optimized streaming (00:04 start + Buffer), [bold cyan]o[/bold cyan] browser, [bold cyan]d[/bold cyan] download, [bold red]q[/bold red] exit, [bold yellow]b[/bold yellow] back.",
+                ]
+                if entry is not None:
+                    if entry[0] == "g":
+                        label, hint = "Go to episode", "Enter or Esc to close"
+                    else:
+                        label, hint = "Filter", "Enter to keep, Esc to clear"
+                    lines.append(f"[bold yellow]{label}:[/] {escape(entry[1])}▏ [dim]({hint})[/dim]")
+                if status:
+                    lines.append(f"[dim]⏳ {status}[/dim]")
+                return lines
             
-            self.console.print(table)
-            self.console.print(f"\nPage {page+1}/{max_page+1} | Episodes {start+1}-{end} of {total}")
-            self.console.print("Use [bold magenta]↑[/]/[bold magenta]↓[/] to move, [bold magenta]←[/]/[bold magenta]→[/] for page, [bold yellow]g[/bold yellow] to jump")
-            self.console.print("[bold green]Enter[/] for optimized streaming (00:04 start + Buffer), [bold cyan]o[/bold cyan] browser, [bold red]q[/bold red] exit, [bold yellow]b[/bold yellow] back.")
+            frame_key = ("episodes", id(episodes), page, total, status, entry, filter_text)
+            self.renderer.draw(frame_key, build, end - start, selected - start)
         
-        render_episodes()
+        def handle_entry(key):
+            """Edit the jump/filter line; every keystroke applies immediately"""
+            nonlocal entry, filter_text, view, scanned
+            kind, text = entry
+            typed = text
+            if key in (readchar.key.ENTER, "\r", "\n"):
+                entry = None
+            elif key.startswith(readchar.key.ESC):
+                # Esc, or an arrow key (readchar reads Esc together with the key after it)
+                entry = None
+                if kind == "/":
+                    position = index(selected) if count() else 0
+                    set_filter("")
+                    move_to(position)
+            elif key in (readchar.key.BACKSPACE, "\x7f", "\b"):
+                text = text[:-1]
+                entry = (kind, text)
+                if kind == "/" and history:
+                    filter_text, view, scanned = history.pop()
+                    move_to(0)
+            elif len(key) == 1 and key.isprintable() and (kind == "/" or key.isdigit()):
+                text += key
+                entry = (kind, text)
+                if kind == "/":
+                    set_filter(text)
+            if kind == "g" and text and text != typed:
+                position = episodes.index_of(int(text))
+                if position is not None:
+                    set_filter("")
+                    move_to(position)
+            render_episodes()
         
-        while True:
-            key = readchar.readkey()
-            if key in (readchar.key.UP, "k"):
-                if selected > page * page_size:
-                    selected -= 1
-                    render_episodes()
-                elif selected == page * page_size and page > 0:
-                    page -= 1
-                    selected = (page + 1) * page_size - 1
-                    render_episodes()
-            elif key in (readchar.key.DOWN, "j"):
-                start = page * page_size
-                end = min(start + page_size, total)
-                if selected < end - 1:
-                    selected += 1
-                    render_episodes()
-                elif selected == end - 1 and page < max_page:
-                    page += 1
-                    selected = page * page_size
-                    render_episodes()
-            elif key in (readchar.key.RIGHT, "l"):
-                if page < max_page:
-                    page += 1
-                    selected = page * page_size
-                    render_episodes()
-            elif key in (readchar.key.LEFT, "h"):
-                if page > 0:
-                    page -= 1
-                    selected = page * page_size
-                    render_episodes()
-            elif key.lower() == 'g':
-                try:
-                    num = int(Prompt.ask("Go to episode number"))
-                    if 1 <= num <= total:
-                        page = (num - 1) // page_size
-                        selected = num - 1
+        with self._menu_lock:
+            render_episodes(full=True)
+            # Episodes still arriving redraw the page counts
+            self._menu_refresh = render_episodes
+        
+        try:
+            while True:
+                key = readchar.readkey()
+                with self._menu_lock:
+                    if entry is not None:
+                        handle_entry(key)
+                        continue
+                    total = count()
+                    max_page = max(0, total - 1) // page_size
+                    if key in (readchar.key.UP, "k"):
+                        if selected > page * page_size:
+                            selected -= 1
+                            render_episodes()
+                        elif selected == page * page_size and page > 0:
+                            page -= 1
+                            selected = (page + 1) * page_size - 1
+                            render_episodes()
+                    elif key in (readchar.key.DOWN, "j"):
+                        start = page * page_size
+                        end = min(start + page_size, total)
+                        if selected < end - 1:
+                            selected += 1
+                            render_episodes()
+                        elif selected == end - 1 and page < max_page:
+                            page += 1
+                            selected = page * page_size
+                            render_episodes()
+                    elif key in (readchar.key.RIGHT, "l"):
+                        if page < max_page:
+                            page += 1
+                            selected = page * page_size
+                            render_episodes()
+                    elif key in (readchar.key.LEFT, "h"):
+                        if page > 0:
+                            page -= 1
+                            selected = page * page_size
+                            render_episodes()
+                    elif key.lower() == 'g' or key == '/':
+                        entry = (key.lower(), "")
                         render_episodes()
-                except Exception:
-                    pass
-            elif key.lower() == 'o':
-                # Open episode in browser
-                ep = episodes[selected]
-                webbrowser.open(ep['url'])
-                self.console.print(f"\n[bold green]✓ Opened Episode {ep['num']} in browser[/bold green]\n")
-                Prompt.ask("Press Enter to continue.")
-                render_episodes()
-            elif key in (readchar.key.ENTER, "\r", "\n"):
-                # Extract quality options and let user choose
-                ep = episodes[selected]
+                    elif key in ("q", readchar.key.CTRL_C):
+                        sys.exit(0)
+                    elif key.lower() == 'b':
+                        # Go back to anime selection
+                        self.prefetcher.cancel_pending()
+                        return True
+                    elif not total:
+                        continue  # Nothing matches the filter
+                    elif key.lower() == 'o':
+                        # Open episode in browser
+                        import webbrowser
+                        ep = episodes[index(selected)]
+                        webbrowser.open(ep['url'])
+                        self.console.print(f"\n[bold green]✓ Opened Episode {ep['num']} in browser[/bold green]\n")
+                        Prompt.ask("Press Enter to continue.")
+                        render_episodes(full=True)
+                    elif key in (readchar.key.ENTER, "\r", "\n"):
+                        # Extract quality options and let user choose
+                        ep = episodes[index(selected)]
                 
-                self.console.print(f"[yellow]🚀 Loading quality options with optimization...[/yellow]")
-                download_info = self.extract_download_links(ep['url'])
+                        self.console.print(f"[yellow]🚀 Loading quality options with optimization...[/yellow]")
+                        download_info = self.prefetcher.get(ep['url'])
                 
-                if download_info["success"]:
-                    links_list = list(download_info["links"].items())
-                    if links_list:
-                        self.handle_quality_selection(ep, links_list)
-                else:
-                    self.console.print(f"[red]❌ Failed to load quality options: {download_info.get('error', 'Unknown error')}[/red]")
-                    self.console.print(f"[dim]Press Enter to continue...[/dim]")
-                    readchar.readkey()
+                        if download_info["success"]:
+                            links_list = list(download_info["links"].items())
+                            if links_list:
+                                self.handle_quality_selection(ep, links_list)
+                        else:
+                            self.console.print(f"[red]❌ Failed to load quality options: {download_info.get('error', 'Unknown error')}[/red]")
+                            self.console.print(f"[dim]Press Enter to continue...[/dim]")
+                            readchar.readkey()
                 
-                render_episodes()
-            elif key.lower() == 'b':
-                # Go back to anime selection
-                return True
-            elif key in ("q", readchar.key.CTRL_C):
-                sys.exit(0)
+                        render_episodes(full=True)
+                    elif key.lower() == 'd':
+                        # Download a range of episodes
+                        self.prompt_batch_download(episodes, index(selected))
+                        self.console.print("[dim]Press Enter to continue...[/dim]")
+                        readchar.readkey()
+                        render_episodes(full=True)
+        finally:
+            self._menu_refresh = None
 
     def run(self):
         """Main application loop"""
         self.console.print("[bold blue]🎌 Anime Streaming Player (Lag-Free Optimized)[/bold blue]")
         self.console.print("[dim]Search anime, select quality, stream with optimized buffer[/dim]\n")
+        self.warm_up()
         
-        while True:
-            query = Prompt.ask("[bold blue]🔍 Enter anime search query[/bold blue]")
-            
-            if not self.search_anime(query):
-                self.console.print("[red]No results found.[/red]")
-                continue
-            
-            self.console.print(f"[green]✅ Found {len(self.anime_choices)} anime(s)[/green]")
-            index = self.select_anime(self.anime_choices)
-            chosen = self.anime_choices[index]
-            
-            self.console.print(f"\n[bold green]Selected:[/bold green] {self.format_arabic_text(chosen['title'], max_width=100)}")
-            self.console.print(f"[dim]{chosen['url']}[/dim]")
-            
-            if not self.fetch_episodes(chosen["url"]):
-                self.console.print("[red]No episodes found for this anime.[/red]")
-                continue
-            
-            self.console.print(f"[green]✅ Found {len(self.episodes)} episode(s)[/green]")
-            self.console.print("[cyan]🚀 Press Enter for lag-free streaming with optimized buffering[/cyan]")
-            
-            # Run episode menu, if it returns True, go back to anime selection
-            if self.episode_menu(self.episodes):
-                continue
-            else:
-                break
+        try:
+            while True:
+                query, chosen = self.prompt_query()
+                
+                if chosen is None:
+                    if not self.search_anime(query):
+                        self.console.print("[red]No results found.[/red]")
+                        continue
+                    
+                    self.console.print(f"[green]✅ Found {len(self.anime_choices)} anime(s)[/green]")
+                    index = self.select_anime(self.anime_choices)
+                    chosen = self.anime_choices[index]
+                self.current_anime = chosen
+                
+                self.console.print(f"\n[bold green]Selected:[/bold green] {self.display_title(chosen, 100)}")
+                self.console.print(f"[dim]{chosen['url']}[/dim]")
+                
+                if not self.fetch_episodes(chosen["url"]):
+                    self.console.print("[red]No episodes found for this anime.[/red]")
+                    continue
+                
+                more = " so far" if self.episodes_status else ""
+                self.console.print(f"[green]✅ Found {len(self.episodes)} episode(s){more}[/green]")
+                self.console.print("[cyan]🚀 Press Enter for lag-free streaming with optimized buffering[/cyan]")
+                
+                # Run episode menu, if it returns True, go back to anime selection
+                if self.episode_menu(self.episodes):
+                    continue
+                else:
+                    break
+        finally:
+            # Don't leave the persistent mpv running, or queued work holding up the exit, after the menus exit
+            self.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search anime, select quality, stream with mpv")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the on-disk response cache")
+    parser.add_argument("--clear-cache", action="store_true", help="drop all cached pages before starting")
+    parser.add_argument("--no-catalog", action="store_true", help="don't keep or search the offline title catalog")
+    parser.add_argument("--site", default=SITE_URL, metavar="URL",
+                        help="base URL of the site to scrape (default: %(default)s, or $WIT_ANIME_SITE_URL)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="time each stage; write a Chrome trace (or JSON lines for *.jsonl) and print a summary at exit")
+    parser.add_argument("--stream-ttl", type=int, default=STREAM_URL_TTL, metavar="SECONDS",
+                        help="how long to reuse a resolved streaming URL that has no expiry hint")
+    parser.add_argument("--resolver", choices=RESOLVER_BACKENDS, default="auto",
+                        help="yt-dlp backend: in-process library, subprocess, or library with subprocess fallback")
+    parser.add_argument("--parser", choices=("auto",) + PARSER_BACKENDS, default="auto",
+                        help="HTML parser (auto picks the fastest installed one)")
+    parser.add_argument("--no-daemon", action="store_true", help="work in-process even when a daemon is running")
+    parser.add_argument("--no-hedge", action="store_true",
+                        help="never send a duplicate of a slow page request (works in-process)")
+    
+    commands = parser.add_subparsers(dest="command")
+    download = commands.add_parser("download", help="download a range of episodes without the menus")
+    download.add_argument("anime", help="search query (first result is used) or anime page URL")
+    download.add_argument("-e", "--episodes", default="all", help="episode range, e.g. 1-24 or 3,5,7-9 (default: all)")
+    download.add_argument("-q", "--quality", choices=QUALITY_ORDER, default="720p",
+                          help="preferred quality; the next lower one is used when missing")
+    download.add_argument("-o", "--output", help="output directory (default: ./<anime title>)")
+    download.add_argument("-c", "--connections", type=int, default=DOWNLOAD_CONNECTIONS,
+                          help="maximum parallel connections across all files")
+    download.add_argument("-s", "--segments", type=int, default=DOWNLOAD_SEGMENTS, help="range segments per file")
+    download.add_argument("--limit-rate", type=parse_rate, metavar="RATE",
+                          help="total bandwidth cap, e.g. 800K or 5M (bytes per second)")
+    
+    resolve = commands.add_parser("resolve", help="resolve titles and episodes without the menus, printing NDJSON")
+    resolve.add_argument("input", nargs="?", default="-",
+                         help="file with one search query or anime URL per line (default: stdin)")
+    resolve.add_argument("-e", "--episodes", default="all", help="episode range per title, e.g. 1-24 or 3,5,7-9 (default: all)")
+    resolve.add_argument("-q", "--quality", choices=QUALITY_ORDER,
+                         help="only report this quality; the next lower one is used when missing")
+    resolve.add_argument("--stream", action="store_true", help="also resolve the streaming URL (best quality unless -q)")
+    resolve.add_argument("-w", "--workers", type=int, default=RESOLVE_WORKERS, help="inputs and episodes resolved at once")
+    resolve.add_argument("--rate", type=float, default=RESOLVE_HOST_RATE, metavar="N",
+                         help="maximum requests per second to one host, 0 for no limit")
+    resolve.add_argument("-o", "--output", help="write NDJSON to this file instead of stdout")
+    
+    index = commands.add_parser("index", help="build the offline title catalog from cached search pages")
+    index.add_argument("queries", nargs="*", help="also crawl every result page of these searches")
+    
+    daemon = commands.add_parser("daemon", help="keep the session, caches and resolvers warm for later runs (Unix only)")
+    daemon.add_argument("--idle", type=int, default=DAEMON_IDLE_TIMEOUT, metavar="SECONDS",
+                        help="exit after this long without a request, 0 to stay up (default: %(default)s)")
+    daemon.add_argument("--stop", action="store_true", help="stop the running daemon and exit")
+    return parser.parse_args(argv)
+
+def run_download(app, args):
+    """`download` subcommand: resolve the anime, then batch-download the requested episodes"""
+    if args.anime.startswith(("http://", "https://")):
+        anime = {"title": urlsplit(args.anime).path.rstrip("/").rpartition("/")[2] or "Anime", "url": args.anime}
+    else:
+        if not app.search_anime(args.anime):
+            app.console.print("[red]No results found.[/red]")
+            return 1
+        anime = app.anime_choices[0]
+        app.console.print(f"[bold green]Selected:[/bold green] {app.display_title(anime, 100)}")
+    
+    # Downloads need the whole list, so skip the first-screen early return
+    if not app.fetch_episodes(anime["url"], first_screen=None):
+        app.console.print("[red]No episodes found for this anime.[/red]")
+        return 1
+    numbers = parse_episode_range(args.episodes, max(ep['num'] for ep in app.episodes))
+    output_dir = args.output or os.path.join(os.getcwd(), safe_filename(anime["title"]))
+    ok = app.batch_download(anime["title"], app.episodes, numbers, args.quality, output_dir,
+                            connections=args.connections, segments=args.segments, rate_limit=args.limit_rate)
+    return 0 if ok else 1
+
+def run_resolve(app, args):
+    """`resolve` subcommand: one NDJSON line per resolved episode, written as soon as it is ready"""
+    app.console = Console(stderr=True)  # stdout carries only NDJSON
+    app.rate_limiter = HostRateLimiter(args.rate)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    lock = threading.Lock()
+    
+    def emit(record):
+        line = json.dumps(record, ensure_ascii=False)
+        with lock:
+            output.write(line + "\n")
+            output.flush()
+    
+    try:
+        failures = app.resolve_batch(source, emit, episodes=args.episodes, quality=args.quality,
+                                     stream=args.stream, workers=args.workers)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    if failures:
+        app.console.print(f"[yellow]⚠️ {failures} record(s) failed[/yellow]")
+    return 1 if failures else 0
+
+def run_index(app, args):
+    """`index` subcommand: add titles from cached search pages and crawled searches to the catalog"""
+    if app.catalog is None:
+        app.console.print("[red]The offline catalog is disabled (--no-catalog).[/red]")
+        return 1
+    before = len(app.catalog)
+    if app.cache:
+        for _, content in app.cache.entries("search"):
+            app.catalog.add(parse_search_results(content, app.parser_backend))
+    for query in args.queries:
+        if app.search_anime(query):
+            while app.search_status:  # Wait for the remaining result pages
+                time.sleep(0.1)
+    app.console.print(f"[green]📚 Catalog: {len(app.catalog)} title(s), {len(app.catalog) - before} new[/green]")
+    return 0
+
+def run_daemon(app, args):
+    """`daemon` subcommand: serve searches, episode lists, links and streaming URLs to later invocations"""
+    if not MpvPlayer.supported():
+        app.console.print("[red]The daemon needs Unix domain sockets, which this platform lacks.[/red]")
+        return 1
+    if args.stop:
+        try:
+            pid = DaemonClient(timeout=5).call("shutdown")["pid"]
+        except (OSError, ValueError, RuntimeError):
+            app.console.print("[yellow]No daemon is running.[/yellow]")
+            return 1
+        app.console.print(f"[green]✓ Stopped the daemon (pid {pid})[/green]")
+        return 0
+    
+    import signal
+    daemon = ResolverDaemon(app, idle_timeout=args.idle)
+    try:
+        daemon.bind()
+    except RuntimeError as e:
+        app.console.print(f"[red]{e}[/red]")
+        return 1
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.shutdown())
+    # Build everything now so the first client already finds the daemon warm
+    app.http
+    app.cache
+    app.parser_backend
+    if app.resolver_backend != "subprocess":
+        app.resolver.warm()
+    app.console.print(f"[green]🛰️ Daemon for {app.site_url} listening on {daemon.path} (pid {os.getpid()})[/green]")
+    daemon.serve()
+    return 0
+
+def print_trace_summary(console):
+    """Per-stage timing table for --trace"""
+    from rich.table import Table
+    table = Table(title="Stage timings", header_style="bold cyan")
+    table.add_column("Stage", style="bold white")
+    for column in ("Count", "Total ms", "p50 ms", "Max ms"):
+        table.add_column(column, justify="right")
+    for name, count, total, p50, slowest in TRACER.summary():
+        table.add_row(name, str(count), f"{total:.1f}", f"{p50:.1f}", f"{slowest:.1f}")
+    console.print(table)
 
 def main():
+    args = parse_args()
+    if args.trace:
+        TRACER.enabled = True
+    app = None
     try:
-        app = AnimeScraperUI()
+        # --no-cache asks for fresh pages, which the daemon's memory would not give; --no-hedge
+        # requests, which a daemon that hedges would not make
+        use_daemon = not (args.no_daemon or args.no_cache or args.no_hedge) and args.command != "daemon"
+        app = AnimeScraperUI(use_cache=not args.no_cache, stream_ttl=args.stream_ttl, resolver=args.resolver,
+                             parser=args.parser, use_catalog=not args.no_catalog, site_url=args.site,
+                             use_daemon=use_daemon, hedge=not args.no_hedge)
+        if args.clear_cache:
+            app.remote("clear_cache")  # Including the pages a running daemon has parsed
+            if app.cache:
+                app.cache.clear()
+        if args.command == "download":
+            sys.exit(run_download(app, args))
+        if args.command == "resolve":
+            sys.exit(run_resolve(app, args))
+        if args.command == "index":
+            sys.exit(run_index(app, args))
+        if args.command == "daemon":
+            sys.exit(run_daemon(app, args))
         app.run()
     except KeyboardInterrupt:
         print("\n\n[yellow]👋 Goodbye![/yellow]")
@@ -682,6 +4469,12 @@ def main():
         console = Console()
         console.print(f"[red]💥 Unexpected error: {e}[/red]")
         sys.exit(1)
+    finally:
+        if app is not None:
+            app.close()
+        if args.trace:
+            TRACER.export(args.trace)
+            print_trace_summary(Console(stderr=True))
 
 if __name__ == "__main__":
     main()